@@ -0,0 +1,211 @@
+"""
+Load-testing and latency benchmark: replays queries from data/prep/output.csv
+  1. directly through the RAG pipeline (--mode rag), or
+  2. against a running API's /chat endpoint (--mode api)
+at each configured concurrency level, and reports QPS, end-to-end latency and
+p50/p95/p99 per pipeline stage, LLM token speed and memory.
+
+With --stub (or benchmark.stub_models) a hashing embedder and a stub LLM replace the
+models, so retrieval and serving paths are measured without downloading anything.
+Indexes must exist and be built with the same embedder (see README).
+
+Usage: PYTHONPATH=. .venv/bin/python benchmark.py --mode rag --stub --concurrency 1 8
+"""
+
+import os
+import json
+import time
+import argparse
+import threading
+import traceback
+import yaml
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+os.chdir(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    from src.main import RAG
+    from src.timings import Timings
+except ImportError:
+    from main import RAG
+    from timings import Timings
+
+PERCENTILES = (50, 95, 99)
+
+
+def load_queries(path: str) -> list[str]:
+    df = pd.read_csv(path, header=None, names=["query"])
+    return df["query"].dropna().tolist()
+
+
+def memory_mb(pid: int | str = "self") -> dict | None:
+    """Current and peak resident memory of a local process, None if it can't be read."""
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            status = dict(line.split(":", 1) for line in f if ":" in line)
+    except OSError:
+        return None
+    return {"rss_mb": int(status["VmRSS"].split()[0]) / 1024, "peak_rss_mb": int(status["VmHWM"].split()[0]) / 1024}
+
+
+class RAGClient:
+    """Runs queries in this process; stages come from the pipeline's Timings."""
+    def __init__(self, stub: bool, use_cache: bool):
+        self.rag = RAG(lazy=False, stub=stub)
+        self.use_cache = use_cache
+
+    def query(self, query: str) -> dict:
+        timings = Timings()
+        self.rag.process_query(query, use_cache=self.use_cache, timings=timings)
+        return timings.as_dict()
+
+    def memory(self) -> dict | None:
+        return memory_mb()
+
+
+class APIClient:
+    """Posts queries to /chat; stages come from the server's timings, latency is measured client-side."""
+    def __init__(self, url: str, use_cache: bool, timeout: float):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.use_cache = use_cache
+        self.timeout = timeout
+        self._local = threading.local()
+        self._requests = requests
+        health = requests.get(f"{self.url}/health", timeout=timeout).json()
+        # Memory is only available when the API runs on this machine
+        self.pid = health.get("pid")
+
+    def query(self, query: str) -> dict:
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = self._requests.Session()
+        response = session.post(f"{self.url}/chat", json={"query": query, "use_cache": self.use_cache, "timings": True},
+                                timeout=self.timeout)
+        response.raise_for_status()
+        return response.json().get("timings") or {}
+
+    def memory(self) -> dict | None:
+        return memory_mb(self.pid) if self.pid else None
+
+
+def _percentiles(values: list[float]) -> dict:
+    if not values:
+        return {f"p{p}": None for p in PERCENTILES}
+    return {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+
+def run_level(client, queries: list[str], n: int, concurrency: int) -> dict:
+    """Replays n queries (cycling through the corpus) with `concurrency` requests in flight."""
+    batch = [queries[i % len(queries)] for i in range(n)]
+    records = []
+
+    def run_one(query: str) -> dict:
+        start = time.perf_counter()
+        try:
+            timings = client.query(query)
+            error = None
+        except Exception as e:
+            timings, error = {}, f"{type(e).__name__}: {e}"
+        return {"latency_ms": (time.perf_counter() - start) * 1000, "timings": timings, "error": error}
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in pool.map(run_one, batch):
+            records.append(record)
+    wall = time.perf_counter() - start
+
+    ok = [r for r in records if r["error"] is None]
+    stages = {}
+    for r in ok:
+        for stage, ms in r["timings"].get("stages_ms", {}).items():
+            stages.setdefault(stage, []).append(ms)
+    llm = [call for r in ok for call in r["timings"].get("llm", [])]
+    errors = [r["error"] for r in records if r["error"] is not None]
+
+    return {
+        "concurrency": concurrency,
+        "requests": n,
+        "errors": len(errors),
+        "first_errors": errors[:3],
+        "wall_seconds": wall,
+        "qps": len(ok) / wall if wall > 0 else 0.0,
+        "latency_ms": _percentiles([r["latency_ms"] for r in ok]),
+        "stages_ms": {stage: _percentiles(values) for stage, values in sorted(stages.items())},
+        "cache_hits": sum(bool(r["timings"].get("cache_hit")) for r in ok),
+        "search_types": pd.Series([r["timings"].get("search_type", "none") for r in ok]).value_counts().to_dict(),
+        "llm_tokens_per_second": _percentiles([c["tokens_per_second"] for c in llm if c.get("completion_tokens")]),
+        "memory": client.memory(),
+    }
+
+
+def _fmt(value) -> str:
+    return f"{value:9.1f}" if value is not None else f"{'-':>9}"
+
+def print_report(result: dict):
+    print("=" * 65)
+    print(f"Concurrency {result['concurrency']}: {result['requests']} requests, {result['errors']} errors, "
+          f"{result['wall_seconds']:.1f}s, {result['qps']:.2f} QPS")
+    if result["first_errors"]:
+        print(f"  first errors: {result['first_errors']}")
+    print(f"  search types: {result['search_types']}, cache hits: {result['cache_hits']}")
+    print(f"  {'stage (ms)':<22}" + "".join(f"{f'p{p}':>9}" for p in PERCENTILES))
+    rows = [("end-to-end", result["latency_ms"]), *result["stages_ms"].items(),
+            ("llm tokens/s", result["llm_tokens_per_second"])]
+    for name, values in rows:
+        print(f"  {name:<22}" + "".join(_fmt(values[f'p{p}']) for p in PERCENTILES))
+    if result["memory"]:
+        print(f"  memory: {result['memory']['rss_mb']:.0f} MB RSS, {result['memory']['peak_rss_mb']:.0f} MB peak")
+
+
+def main():
+    with open("config/config.yaml", "r") as f:
+        config = yaml.safe_load(f)["benchmark"]
+
+    parser = argparse.ArgumentParser(description="RAG load test and latency benchmark")
+    parser.add_argument("--mode", choices=["rag", "api"], default="rag", help="Run the pipeline in-process or call a running API")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL (--mode api)")
+    parser.add_argument("--queries", default=config["queries"], help="CSV with one query per line")
+    parser.add_argument("--n", type=int, default=config["n_queries"], help="Requests per concurrency level")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=config["concurrency"], help="Concurrency levels to sweep")
+    parser.add_argument("--warmup", type=int, default=config["warmup_queries"], help="Unmeasured queries sent first")
+    parser.add_argument("--use-cache", action="store_true", help="Let replays hit the response cache (off: every request runs the pipeline)")
+    parser.add_argument("--stub", action="store_true", help="Use the stub embedder and LLM (--mode rag; for the API set benchmark.stub_models)")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Request timeout, seconds (--mode api)")
+    parser.add_argument("--output", default=config["output"], help="Where to save results as JSON")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    if not queries:
+        print(f"ERROR: No queries in {args.queries}")
+        return
+    print(f"Loaded {len(queries)} queries from {args.queries}")
+
+    if args.mode == "rag":
+        client = RAGClient(stub=args.stub or config["stub_models"], use_cache=args.use_cache)
+    else:
+        client = APIClient(args.url, use_cache=args.use_cache, timeout=args.timeout)
+
+    for query in queries[:args.warmup]:
+        try:
+            client.query(query)
+        except Exception:
+            traceback.print_exc()
+
+    results = []
+    for concurrency in args.concurrency:
+        result = run_level(client, queries, args.n, concurrency)
+        print_report(result)
+        results.append(result)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump({"mode": args.mode, "stub": args.mode == "rag" and (args.stub or config["stub_models"]),
+                   "use_cache": args.use_cache, "levels": results}, f, indent=2)
+    print(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
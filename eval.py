@@ -3,14 +3,24 @@ Evaluation script: runs queries from data/prep/output.csv through:
   1. Plain LLM (no retrieval)
   2. Full RAG pipeline (classify → search → generate)
 
-Saves results incrementally to data/prep/eval_results.csv
-Usage: PYTHONPATH=. .venv/bin/python eval.py
+Retrieval runs as one batched pass: all queries are encoded together and unfiltered
+searches of one type share an index call. LLM work (meta rewrites, RAG answers and
+plain answers) is spread over a pool of evaluation.llm_instances llama.cpp instances.
+
+Saves results incrementally and in input order to data/prep/eval_results.csv;
+queries already saved there are skipped, so an interrupted run can be resumed.
+Usage: PYTHONPATH=. .venv/bin/python eval.py [--llm-instances N]
 """
 
 import os
 import csv
+import queue
+import argparse
 import traceback
+import yaml
 import pandas as pd
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 
 os.chdir(os.path.dirname(os.path.abspath(__file__)))
 
@@ -58,26 +68,67 @@ def already_done(path: str) -> set[str]:
     return done
 
 
-def run_rag(rag: RAG, query: str) -> dict:
-    search_type = rag.classify_query(query)
+class LLMPool:
+    """
+    llama.cpp instances shared by worker threads, every call takes a free one.
+    llama.cpp releases the GIL while evaluating, so the instances generate in parallel.
+    """
+    def __init__(self, llm_cls: type[BaseLLMModel], size: int, n_threads: int):
+        self.instances = [llm_cls(n_threads=n_threads) for _ in range(size)]
+        self._free = queue.Queue()
+        for llm in self.instances:
+            self._free.put(llm)
+
+    @contextmanager
+    def instance(self):
+        llm = self._free.get()
+        try:
+            yield llm
+        finally:
+            self._free.put(llm)
+
+
+def plan_query(rag: RAG, pool: LLMPool, query: str, query_emb) -> dict:
+    # Only meta queries the parser can't handle call the LLM, the rest plan instantly
+    with pool.instance() as llm:
+        return rag._plan_search(query, query_emb=query_emb, llm=llm)
 
-    if search_type == "meta":
-        rewritten = rag.llm.rewrite_query(query)
-        search_query = rewritten
-    else:
-        rewritten = ""
-        search_query = query
 
-    candidates = rag.index.search(type=search_type, query=search_query, top_k=20)
-    results = rag._filter_results(candidates, top_k=5)
-    top5_titles = " | ".join(r["title"] for r in results)
-    rag_response = rag.llm.generate_with_context(query, results)
+def retrieve_all(rag: RAG, pool: LLMPool, executor: ThreadPoolExecutor, queries: list[str]) -> list[dict]:
+    """Plans and searches all queries. Returns per query {"plan", "results"} or {"error"}."""
+    print(f"Encoding {len(queries)} queries...")
+    query_embs = rag.index.encode_queries(queries)
 
+    items = []
+    for query, future in zip(queries, [executor.submit(plan_query, rag, pool, q, e) for q, e in zip(queries, query_embs)]):
+        try:
+            items.append({"plan": future.result()})
+        except Exception:
+            print(f"  RAG ERROR ({query[:80]}):\n{traceback.format_exc()}")
+            items.append({"error": True})
+
+    planned = [item for item in items if "plan" in item]
+    print(f"Searching {len(planned)} queries...")
+    try:
+        for item, results in zip(planned, rag._search_batch([item["plan"] for item in planned])):
+            item["results"] = results
+    except Exception:
+        print(f"  Batched search failed, searching one by one:\n{traceback.format_exc()}")
+        for item in planned:
+            try:
+                item["results"] = rag._search(item["plan"])
+            except Exception:
+                print(f"  RAG ERROR:\n{traceback.format_exc()}")
+                item["error"] = True
+    return items
+
+
+def run_rag(llm: BaseLLMModel, query: str, plan: dict, results: list) -> dict:
     return {
-        "search_type": search_type,
-        "rewritten_query": rewritten,
-        "top5_titles": top5_titles,
-        "rag_response": rag_response,
+        "search_type": plan["search_type"],
+        "rewritten_query": plan["rewritten"],
+        "top5_titles": " | ".join(r["title"] for r in results),
+        "rag_response": llm.generate_with_context(query, results),
     }
 
 
@@ -85,7 +136,34 @@ def run_plain_llm(llm: BaseLLMModel, query: str) -> str:
     return llm.generate(query, system_prompt=PLAIN_LLM_PROMPT, temperature=0.2)
 
 
+def generate_row(pool: LLMPool, query: str, item: dict) -> dict:
+    row = {"query": query}
+    with pool.instance() as llm:
+        try:
+            if item.get("error"):
+                raise RuntimeError("retrieval failed")
+            row.update(run_rag(llm, query, item["plan"], item["results"]))
+        except Exception:
+            print(f"  RAG ERROR ({query[:80]}):\n{traceback.format_exc()}")
+            row.update({"search_type": "ERROR", "rewritten_query": "", "top5_titles": "", "rag_response": ""})
+
+        try:
+            row["plain_llm_response"] = run_plain_llm(llm, query)
+        except Exception:
+            print(f"  LLM ERROR ({query[:80]}):\n{traceback.format_exc()}")
+            row["plain_llm_response"] = ""
+    return row
+
+
 def main():
+    with open("config/config.yaml", "r") as f:
+        config = yaml.safe_load(f)
+
+    parser = argparse.ArgumentParser(description="RAG vs plain LLM evaluation")
+    parser.add_argument("--llm-instances", type=int, default=config["evaluation"]["llm_instances"],
+                        help="llama.cpp instances generating in parallel (they split llm_params.n_threads)")
+    args = parser.parse_args()
+
     queries = load_queries(INPUT_PATH)
     done = already_done(OUTPUT_PATH)
     remaining = [q for q in queries if q not in done]
@@ -97,7 +175,12 @@ def main():
         return
 
     print("Initializing RAG system...")
-    rag = RAG()
+    # RAG's own LLM stays unloaded: rewrites and generation go through the pool
+    rag = RAG(lazy=True)
+    n_instances = max(1, args.llm_instances)
+    n_threads = max(1, rag.llm.n_threads // n_instances)
+    print(f"Loading {n_instances} LLM instances ({n_threads} threads each)...")
+    pool = LLMPool(type(rag.llm), n_instances, n_threads)
 
     write_header = not os.path.exists(OUTPUT_PATH)
     out_file = open(OUTPUT_PATH, "a", newline="", encoding="utf-8")
@@ -105,26 +188,16 @@ def main():
     if write_header:
         writer.writeheader()
 
-    for i, query in enumerate(remaining, 1):
-        print(f"\n[{i}/{len(remaining)}] Query: {query[:80]}...")
-        row = {"query": query}
-        try:
-            rag_data = run_rag(rag, query)
-            row.update(rag_data)
-            print(f"  search_type={rag_data['search_type']}  top5={rag_data['top5_titles'][:80]}")
-        except Exception:
-            print(f"  RAG ERROR:\n{traceback.format_exc()}")
-            row.update({"search_type": "ERROR", "rewritten_query": "", "top5_titles": "", "rag_response": ""})
-
-        try:
-            row["plain_llm_response"] = run_plain_llm(rag.llm, query)
-        except Exception:
-            print(f"  LLM ERROR:\n{traceback.format_exc()}")
-            row["plain_llm_response"] = ""
+    with ThreadPoolExecutor(max_workers=n_instances) as executor:
+        items = retrieve_all(rag, pool, executor, remaining)
 
-        writer.writerow(row)
-        out_file.flush()
-        print(f"  Saved row {i}.")
+        futures = [executor.submit(generate_row, pool, query, item) for query, item in zip(remaining, items)]
+        # Rows are written in input order as soon as all earlier ones are done
+        for i, (query, future) in enumerate(zip(remaining, futures), 1):
+            row = future.result()
+            writer.writerow(row)
+            out_file.flush()
+            print(f"[{i}/{len(remaining)}] search_type={row['search_type']}  top5={row['top5_titles'][:80]}  Query: {query[:80]}")
 
     out_file.close()
     print(f"\nDone! Results saved to {OUTPUT_PATH}")
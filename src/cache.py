@@ -0,0 +1,115 @@
+import re
+import time
+import threading
+import numpy as np
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    Two-level cache for per-query results.
+
+    1. Exact level: LRU keyed by the normalized query text.
+    2. Semantic level: if there is no exact entry, the cached query whose embedding has
+       the highest cosine with the new query is used when it is above semantic_threshold.
+
+    Entries expire after ttl_seconds, the least recently used one is evicted above max_size.
+    """
+    def __init__(self, max_size: int = 1024, ttl_seconds: float = 3600, semantic: bool = True,
+                 semantic_threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.semantic = semantic
+        self.semantic_threshold = semantic_threshold
+
+        self._entries = OrderedDict()  # key -> (value, query_emb, created_at)
+        self._lock = threading.Lock()
+        # Stacked embeddings for the semantic level, rebuilt lazily after the cache changes
+        self._emb_keys = None
+        self._emb_matrix = None
+
+        self.hits_exact = 0
+        self.hits_semantic = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        query = (query or "").lower().strip()
+        query = re.sub(r"[\s]+", " ", query)
+        return query.strip(" .!?")
+
+    def _expired(self, created_at: float, now: float) -> bool:
+        return now - created_at > self.ttl_seconds
+
+    def _remove(self, key: str):
+        del self._entries[key]
+        self._emb_keys = None
+
+    def _semantic_lookup(self, query_emb: np.ndarray, now: float):
+        if self._emb_keys is None:
+            for key in [k for k, (_, _, created_at) in self._entries.items() if self._expired(created_at, now)]:
+                self._remove(key)
+            self._emb_keys = [k for k, (_, emb, _) in self._entries.items() if emb is not None]
+            self._emb_matrix = np.stack([self._entries[k][1] for k in self._emb_keys]) if self._emb_keys else None
+
+        if self._emb_matrix is None:
+            return None
+        sims = self._emb_matrix @ query_emb
+        best = int(np.argmax(sims))
+        if sims[best] < self.semantic_threshold:
+            return None
+
+        key = self._emb_keys[best]
+        value, _, created_at = self._entries.get(key, (None, None, 0.0))
+        if value is None or self._expired(created_at, now):
+            return None
+        return key
+
+    def get(self, query: str, query_emb: np.ndarray | None = None):
+        """Returns cached value or None. query_emb must be normalized for the semantic level."""
+        key = self.normalize(query)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[2], now):
+                    self._entries.move_to_end(key)
+                    self.hits_exact += 1
+                    return entry[0]
+                self._remove(key)
+
+            if self.semantic and query_emb is not None:
+                match = self._semantic_lookup(np.asarray(query_emb, dtype="float32"), now)
+                if match is not None:
+                    self._entries.move_to_end(match)
+                    self.hits_semantic += 1
+                    return self._entries[match][0]
+
+            self.misses += 1
+            return None
+
+    def put(self, query: str, value, query_emb: np.ndarray | None = None):
+        key = self.normalize(query)
+        emb = None if query_emb is None else np.asarray(query_emb, dtype="float32")
+        with self._lock:
+            self._entries[key] = (value, emb, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+            self._emb_keys = None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._emb_keys = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits_exact + self.hits_semantic + self.misses
+            return {
+                "size": len(self._entries),
+                "hits_exact": self.hits_exact,
+                "hits_semantic": self.hits_semantic,
+                "misses": self.misses,
+                "hit_rate": (self.hits_exact + self.hits_semantic) / lookups if lookups else 0.0,
+            }
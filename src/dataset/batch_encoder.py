@@ -0,0 +1,97 @@
+import time
+import queue
+import threading
+import numpy as np
+from concurrent.futures import Future
+
+
+class BatchEncoder:
+    """
+    Request-coalescing wrapper around a SentenceTransformer.
+
+    Callers from different threads put their sentences into a queue; a single worker
+    thread gathers everything that arrives within max_wait_ms (up to max_batch_size
+    sentences; a request is never split), runs one forward pass and hands each caller back its own rows.
+    """
+    def __init__(self, embed_model, max_batch_size: int = 32, max_wait_ms: float = 5.0):
+        self.embed_model = embed_model
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._n_requests = 0
+        self._n_batches = 0
+        self._n_sentences = 0
+        self._encode_seconds = 0.0
+
+        self._worker = threading.Thread(target=self._run, name="batch-encoder", daemon=True)
+        self._worker.start()
+
+    def encode(self, sentences: list[str]) -> np.ndarray:
+        """Encodes sentences (normalized float32), blocking until their batch is processed."""
+        future = Future()
+        self._queue.put((list(sentences), future))
+        return future.result()
+
+    def _run(self):
+        pending = None
+        while True:
+            items = [pending if pending is not None else self._queue.get()]
+            pending = None
+            n_sentences = len(items[0][0])
+
+            #Collecting more requests until the batch is full or the wait window closes
+            deadline = time.perf_counter() + self.max_wait
+            while n_sentences < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                #A request that doesn't fit starts the next batch (a single oversized request runs alone)
+                if n_sentences + len(item[0]) > self.max_batch_size:
+                    pending = item
+                    break
+                items.append(item)
+                n_sentences += len(item[0])
+
+            self._encode_batch(items)
+
+    def _encode_batch(self, items: list[tuple[list[str], Future]]):
+        batch = [s for sentences, _ in items for s in sentences]
+        start = time.perf_counter()
+        try:
+            embeddings = self.embed_model.encode(batch, batch_size=len(batch), precision="float32",
+                                                 normalize_embeddings=True, show_progress_bar=False)
+        except Exception as e:
+            for _, future in items:
+                future.set_exception(e)
+            return
+        elapsed = time.perf_counter() - start
+
+        offset = 0
+        for sentences, future in items:
+            future.set_result(embeddings[offset:offset + len(sentences)])
+            offset += len(sentences)
+
+        with self._stats_lock:
+            self._n_requests += len(items)
+            self._n_batches += 1
+            self._n_sentences += len(batch)
+            self._encode_seconds += elapsed
+
+    def stats(self) -> dict:
+        """Throughput counters since start."""
+        with self._stats_lock:
+            return {
+                "requests": self._n_requests,
+                "batches": self._n_batches,
+                "sentences": self._n_sentences,
+                "avg_batch_size": self._n_sentences / self._n_batches if self._n_batches else 0.0,
+                "encode_seconds": self._encode_seconds,
+                "sentences_per_sec": self._n_sentences / self._encode_seconds if self._encode_seconds else 0.0,
+                "queue_size": self._queue.qsize(),
+            }
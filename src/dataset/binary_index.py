@@ -0,0 +1,139 @@
+import os
+import faiss
+import numpy as np
+
+
+class BinarySearchParameters:
+    """
+    Search parameters of BinaryRescoreIndex. Unlike faiss.SearchParameters, which hands back a new
+    SWIG proxy of the selector, it keeps the selector object itself (with its bitmap_array).
+    """
+    def __init__(self, sel=None):
+        self.sel = sel
+
+
+class BinaryRescoreIndex:
+    """
+    Two-stage plot index: Hamming search over sign-bit codes (d / 8 bytes per vector),
+    then exact inner-product rescoring of the candidates with float16 vectors.
+
+    Only binary codes and IDs live in RAM; float16 vectors are memory-mapped, so just
+    the rows of the candidates are paged in. Mirrors the faiss `search(x, k, params=)` API.
+    """
+    def __init__(self, d: int, rescore_factor: int = 10):
+        self.d = d
+        self.rescore_factor = rescore_factor
+        self.codes = faiss.IndexBinaryFlat(d)
+        self.ids = np.empty(0, dtype=np.int64)
+        self.vectors = np.empty((0, d), dtype=np.float16)
+
+    @property
+    def ntotal(self) -> int:
+        return self.codes.ntotal
+
+    @staticmethod
+    def binarize(x: np.ndarray) -> np.ndarray:
+        return np.packbits(x > 0, axis=1)
+
+    def add_with_ids(self, x: np.ndarray, ids: np.ndarray):
+        x = np.asarray(x, dtype=np.float32)
+        self.codes.add(self.binarize(x))
+        self.ids = np.concatenate([self.ids, np.asarray(ids, dtype=np.int64)])
+        self.vectors = np.concatenate([self.vectors, x.astype(np.float16)])
+
+    @staticmethod
+    def _members(sel, ids: np.ndarray) -> np.ndarray:
+        """sel.is_member for an array of IDs, vectorized over the bitmap of an IDSelectorBitmap (see FaissIndex)."""
+        bitmap = getattr(sel, "bitmap_array", None)
+        if bitmap is None:
+            return np.fromiter((sel.is_member(int(i)) for i in ids), dtype=bool, count=len(ids))
+        # Little bit order; IDs past the end of the bitmap are not members
+        inside = ids < len(bitmap) * 8
+        members = np.zeros(len(ids), dtype=bool)
+        ids_inside = ids[inside]
+        members[inside] = (bitmap[ids_inside >> 3] >> (ids_inside & 7).astype(np.uint8)) & 1
+        return members
+
+    def _rescore(self, q: np.ndarray, positions: np.ndarray, k: int, scores: np.ndarray, labels: np.ndarray):
+        """Exact inner products of q with the float16 vectors at positions, top k written into scores/labels."""
+        if len(positions) == 0:
+            return
+        # Sorted positions keep memory-mapped reads sequential
+        positions = np.sort(positions)
+        q_scores = self.vectors[positions].astype(np.float32) @ q
+        top = np.argsort(-q_scores)[:k]
+        scores[:len(top)] = q_scores[top]
+        labels[:len(top)] = self.ids[positions[top]]
+
+    def search(self, x: np.ndarray, k: int, params=None) -> tuple[np.ndarray, np.ndarray]:
+        x = np.asarray(x, dtype=np.float32)
+        sel = getattr(params, "sel", None) if params is not None else None
+        scores = np.full((len(x), k), -np.inf, dtype=np.float32)
+        labels = np.full((len(x), k), -1, dtype=np.int64)
+
+        n_candidates = min(self.ntotal, k * self.rescore_factor)
+        if sel is not None:
+            # With an ID selector candidates are filtered after the Hamming stage, so fetch more of them
+            n_candidates = min(self.ntotal, n_candidates * 10)
+            bitmap = getattr(sel, "bitmap_array", None)
+            if bitmap is not None and int(np.unpackbits(bitmap).sum()) <= n_candidates:
+                # Selective filter: rescoring every allowed row is exact and no more work than the shortlist
+                allowed = np.flatnonzero(self._members(sel, self.ids))
+                for i, q in enumerate(x):
+                    self._rescore(q, allowed, k, scores[i], labels[i])
+                return scores, labels
+
+        _, candidates = self.codes.search(self.binarize(x), n_candidates)
+        for i, (q, cand) in enumerate(zip(x, candidates)):
+            cand = cand[cand != -1]
+            if sel is not None:
+                cand = cand[self._members(sel, self.ids[cand])]
+            self._rescore(q, cand, k, scores[i], labels[i])
+        return scores, labels
+
+    def write(self, path: str):
+        """Writes all files next to their targets first and replaces them (rescoring vectors last)."""
+        faiss.write_index_binary(self.codes, path + ".tmp")
+        for suffix, array in ((".ids.npy", self.ids), (".f16.npy", self.vectors)):
+            with open(path + suffix + ".tmp", "wb") as f:
+                np.save(f, array)
+        for file in self.files(path):
+            os.replace(file + ".tmp", file)
+
+    @classmethod
+    def read(cls, path: str, rescore_factor: int = 10, mmap: bool = True) -> "BinaryRescoreIndex":
+        codes = faiss.read_index_binary(path)
+        index = cls(codes.d, rescore_factor=rescore_factor)
+        index.codes = codes
+        index.ids = np.load(path + ".ids.npy")
+        index.vectors = np.load(path + ".f16.npy", mmap_mode="r" if mmap else None)
+        return index
+
+    @staticmethod
+    def files(path: str) -> list[str]:
+        return [path, path + ".ids.npy", path + ".f16.npy"]
+
+    @staticmethod
+    def ram_files(path: str) -> list[str]:
+        """Files loaded into RAM (float16 vectors stay on disk)."""
+        return [path, path + ".ids.npy"]
+
+    @classmethod
+    def build(cls, path: str, d: int, n_total: int, batches, rescore_factor: int = 10) -> "BinaryRescoreIndex":
+        """Builds the index from (embeddings, ids) batches writing float16 vectors straight to disk."""
+        index = cls(d, rescore_factor=rescore_factor)
+        vectors = np.lib.format.open_memmap(path + ".f16.npy", mode="w+", dtype=np.float16, shape=(n_total, d))
+        ids, offset = [], 0
+        for batch_emb, batch_ids in batches:
+            index.codes.add(cls.binarize(batch_emb))
+            vectors[offset:offset + len(batch_emb)] = batch_emb.astype(np.float16)
+            ids.append(np.asarray(batch_ids, dtype=np.int64))
+            offset += len(batch_emb)
+        vectors.flush()
+        assert offset == n_total, f"Expected {n_total} vectors, got {offset}"
+
+        index.ids = np.concatenate(ids) if ids else np.empty(0, dtype=np.int64)
+        index.vectors = np.load(path + ".f16.npy", mmap_mode="r")
+        faiss.write_index_binary(index.codes, path)
+        np.save(path + ".ids.npy", index.ids)
+        return index
@@ -1,10 +1,39 @@
-import os
+import os, re, sys, glob
 import unicodedata
-import yaml, json
+import yaml
 import kagglehub
 import shutil, requests
 import argparse
 import pandas as pd
+from tqdm import tqdm
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from .film_data import write_film_data_part
+except ImportError:
+    from film_data import write_film_data_part
+
+TMDB_COLUMNS = ["title", "vote_average", "vote_count", "popularity", "release_date", "status", "runtime", "adult", "overview", "genres", "production_companies", "production_countries", "keywords"]
+LB_COLUMNS = ["title", "year", "synopsis", "genres", "directors", "cast"]
+
+#Letters (Ll, Lu) and digits (Nd) of Latin-1
+LATIN_PATTERN = r"[A-Za-z0-9\u00b5\u00c0-\u00d6\u00d8-\u00f6\u00f8-\u00ff]"
+
+def _junk_pattern() -> re.Pattern:
+    """Character class of symbols (So: emojis, pictographs), CJK ideographs and kana."""
+    ranges, start = [], None
+    for code in range(sys.maxunicode + 2):
+        is_symbol = code <= sys.maxunicode and unicodedata.category(chr(code)) == "So"
+        if is_symbol and start is None:
+            start = code
+        elif not is_symbol and start is not None:
+            ranges.append((start, code - 1))
+            start = None
+    ranges += [(0x4E00, 0x9FFF), (0x3040, 0x30FF)]
+    return re.compile("[" + "".join(f"{re.escape(chr(a))}-{re.escape(chr(b))}" for a, b in ranges) + "]")
+
+#Built once at import (workers inherit it) instead of walking all code points per partition
+JUNK_PATTERN = _junk_pattern()
     
 class Dataset_proc:
     def __init__(self):
@@ -18,45 +47,36 @@ class Dataset_proc:
         self.TMDB_RAW_PATH = self.config["paths"]["tmdb_raw"]
         self.LB_RAW_PATH = self.config["paths"]["lb_raw"]
         self.FILM_PREP_PATH = self.config["paths"]["film_data"]
+        self.CHUNK_SIZE = self.config["data_preprocessing"]["chunk_size"]
+        self.PARTITIONS = self.config["data_preprocessing"]["partitions"]
+        self.WORKERS = self.config["data_preprocessing"]["workers"] or os.cpu_count()
+        self.PARTITIONS_PATH = os.path.join(os.path.dirname(self.FILM_PREP_PATH), "partitions")
         
         
-    def _normalize_title(self, title:str | None):
-        if pd.isna(title):
-            return ""
-        title = str(title).lower().strip()
-        title = title.replace("the ", "").replace("a ", "").replace("an ", "")
-        title = "".join(c for c in title if c.isalnum() or c.isspace())
-        return " ".join(title.split())
+    def _normalize_titles(self, titles: pd.Series) -> pd.Series:
+        titles = titles.fillna("").astype(str).str.lower().str.strip()
+        for article in ("the ", "a ", "an "):
+            titles = titles.str.replace(article, "", regex=False)
+        titles = titles.str.replace(r"[^\w\s]|_", "", regex=True)
+        return titles.str.replace(r"\s+", " ", regex=True).str.strip()
     
-    def _truncate_overview(self, text: str) -> str:
-        words = text.split()
-        if len(words) > self.MAX_OVERVIEW_WORDS:
-            return " ".join(words[:self.MAX_OVERVIEW_WORDS]) + "..."
-        return text
+    def _truncate_overviews(self, overviews: pd.Series, lengths: pd.Series) -> pd.Series:
+        too_long = lengths > self.MAX_OVERVIEW_WORDS
+        truncated = overviews[too_long].str.split().str[:self.MAX_OVERVIEW_WORDS].str.join(" ") + "..."
+        return overviews.mask(too_long, truncated)
     
-    def _genres_to_list(self, genres:list | str | float):
-        if type(genres) == str:
-            genres = genres.split(", ")
-        
-        return genres
+    def _genres_to_list(self, genres: pd.Series) -> pd.Series:
+        is_str = genres.map(lambda g: isinstance(g, str))
+        return genres.mask(is_str, genres[is_str].str.split(", "))
     
-    def _clear_title(self, title: str):
-        return title if any(c.isalpha() for c in title) else ""
-
-    def _is_junk_title(self, title: str) -> bool:
-        if not title:
-            return True
-        has_latin = any(
-            unicodedata.category(c) in ('Ll', 'Lu', 'Nd') and ord(c) < 256
-            for c in title
-        )
-        has_junk = any(
-            unicodedata.category(c).startswith('So') or
-            (0x4E00 <= ord(c) <= 0x9FFF) or   # CJK
-            (0x3040 <= ord(c) <= 0x30FF)      # hiragana/katakana
-            for c in title
-        )
-        return not has_latin or has_junk
+    def _clear_titles(self, titles: pd.Series) -> pd.Series:
+        return titles.where(titles.str.contains(r"[^\W\d_]", regex=True), "")
+
+    def _is_junk_title(self, titles: pd.Series) -> pd.Series:
+        #Junk: no Latin-1 letters/digits, or symbols (emojis), CJK, kana
+        has_latin = titles.str.contains(LATIN_PATTERN, regex=True)
+        has_junk = titles.str.contains(JUNK_PATTERN, regex=True)
+        return (titles == "") | ~has_latin | has_junk
     
     def _process_meta_info(self, row):
         meta_parts = []
@@ -152,26 +172,40 @@ class Dataset_proc:
         
         print("All datasets are downloaded!!!")
         
-    def preprocess_film_data(self):
-               
-        #Getting the datasets
-        print("Reading the datasets...")
-        tmdb = pd.read_csv(self.TMDB_RAW_PATH, usecols=["title", "vote_average", "vote_count", "popularity", "release_date", "status", "runtime", "adult", "overview", "genres", "production_companies", "production_countries", "keywords"])
-        letterbox_ = []
-        for line in open(self.LB_RAW_PATH, "r"):
-            letterbox_.append(json.loads(line))
-        letterbox = pd.DataFrame(letterbox_)
-        letterbox.drop(["url", "reviews", "poster_url", "rating"], axis=1, inplace=True)
-        
+    def _partition(self, chunks, source: str) -> int:
+        """Streams chunks of a raw dataset into partition files by hash of the normalized title."""
+        n_rows = 0
+        for chunk_idx, chunk in enumerate(chunks):
+            chunk = chunk.drop(columns=["url", "reviews", "poster_url", "rating"], errors="ignore")
+            chunk["title_norm"] = self._normalize_titles(chunk["title"])
+            part_ids = pd.util.hash_pandas_object(chunk["title_norm"], index=False).to_numpy() % self.PARTITIONS
+            for part_id, part in chunk.groupby(part_ids):
+                part.to_pickle(os.path.join(self.PARTITIONS_PATH, f"{source}_{part_id:04d}_{chunk_idx:05d}.pkl"))
+            n_rows += len(chunk)
+        return n_rows
+
+    def _read_partition(self, source: str, part_id: int, columns: list[str]) -> pd.DataFrame:
+        #Chunk files are sorted, so rows keep the order of the raw file
+        files = sorted(glob.glob(os.path.join(self.PARTITIONS_PATH, f"{source}_{part_id:04d}_*.pkl")))
+        if not files:
+            return pd.DataFrame(columns=columns + ["title_norm"])
+        return pd.concat([pd.read_pickle(f) for f in files], ignore_index=True)
+
+    def _process_partition(self, part_id: int) -> int:
+        """Merges and cleans one partition and writes it as a Parquet part (runs in a worker process)."""
+        tmdb = self._read_partition("tmdb", part_id, TMDB_COLUMNS)
+        letterbox = self._read_partition("lb", part_id, LB_COLUMNS)
+        merged = self._merge_and_clean(tmdb, letterbox)
+        if len(merged):
+            write_film_data_part(merged, os.path.join(self.FILM_PREP_PATH + ".tmp", f"part-{part_id:04d}.parquet"))
+        return len(merged)
+
+    def _merge_and_clean(self, tmdb: pd.DataFrame, letterbox: pd.DataFrame) -> pd.DataFrame:
         #Merging the datasets
-        print("Merging the datasets...")
         letterbox.drop_duplicates(subset=["title"], inplace=True, ignore_index=True)
 
-        tmdb["title_norm"] = tmdb["title"].apply(self._normalize_title)
-        letterbox["title_norm"] = letterbox["title"].apply(self._normalize_title)
-
         tmdb["year"] = pd.to_datetime(tmdb["release_date"], errors="coerce").dt.year.astype("Int64")
-        letterbox["year"] = letterbox["year"].astype("Int64")
+        letterbox["year"] = pd.to_numeric(letterbox["year"], errors="coerce").astype("Int64")
 
         #Full outer join on normalized title and year
         merged = pd.merge(
@@ -197,10 +231,8 @@ class Dataset_proc:
                          "keywords"]]
         
         del(tmdb)
-        del(letterbox_)
         del(letterbox)
         
-        print("Preprocessing data...")
         #Merging titles
         merged["title"] = merged["title_tmdb"].combine_first(merged["title_lb"])
         merged.drop(columns=["title_tmdb", "title_lb"], inplace=True)
@@ -222,7 +254,7 @@ class Dataset_proc:
         #Merging genres
         merged["genres"] = merged["genres_tmdb"].combine_first(merged["genres_lb"])
         merged.drop(columns=["genres_tmdb", "genres_lb"], inplace=True)
-        merged["genres"] = merged["genres"].apply(self._genres_to_list)
+        merged["genres"] = self._genres_to_list(merged["genres"])
         
         #Cleaning column names, indexes
         merged = merged[["title", "release_info", "overview_new", "vote_average", "vote_count", "popularity", "runtime", "genres", "adult","directors", "cast", "production_countries", "production_companies", "keywords"]]
@@ -231,20 +263,19 @@ class Dataset_proc:
         
         #Dropping missing titles
         merged.dropna(subset=["title"], inplace=True)
-        merged["title"] = merged["title"].apply(self._clear_title)
-        merged.drop(merged[merged["title"].isin([" ", ""])].index, inplace=True)
+        merged["title"] = self._clear_titles(merged["title"].astype(str))
 
-        #Dropping junk titles (emojis, hieroglyphs, no Latin characters)
-        merged = merged[~merged["title"].apply(self._is_junk_title)]
+        #Dropping empty and junk titles (emojis, hieroglyphs, no Latin characters)
+        merged = merged[~self._is_junk_title(merged["title"])]
 
         #Dropping nans and too small/too big overviews
-        merged.dropna(subset=["overview"], inplace=True, ignore_index=True)
+        merged = merged.dropna(subset=["overview"], ignore_index=True)
 
-        merged["overview_length"] = merged["overview"].apply(lambda x: len(x.split()))
+        merged["overview_length"] = merged["overview"].str.split().str.len()
         merged.drop(merged[merged["overview_length"] < self.MIN_OVERVIEW_WORDS].index, inplace=True)
         merged.reset_index(drop=True, inplace=True)
 
-        merged["overview"] = merged["overview"].apply(self._truncate_overview)
+        merged["overview"] = self._truncate_overviews(merged["overview"], merged["overview_length"])
 
         #Dropping adult titles
         merged.drop(merged[merged["adult"] == True].index, inplace=True)
@@ -265,21 +296,53 @@ class Dataset_proc:
         )
         merged = merged[~mask_weak]
 
-        merged.drop("overview_length", axis=1, inplace=True)
+        merged = merged.drop("overview_length", axis=1)
 
-        #Deduplicating by title and release info
-        merged.drop_duplicates(subset=["title", "release_info"], inplace=True)
+        #Deduplicating by title and release info (same title -> same partition, so it is global)
+        merged = merged.drop_duplicates(subset=["title", "release_info"])
         merged.reset_index(drop=True, inplace=True)
         
         #Creating descriptions for embeddings
-        print("Creating descriptions...")
-        merged["title_plot"] = merged.apply(lambda row: f"{row["title"]} | Plot: {row["overview"]}", axis=1)        
-        merged["title_meta"] = merged.apply(self._process_meta_info, axis=1)
+        merged["title_plot"] = merged["title"] + " | Plot: " + merged["overview"]
+        merged["title_meta"] = merged.apply(self._process_meta_info, axis=1) if len(merged) else pd.Series(dtype=str)
+        return merged
+
+    def preprocess_film_data(self):
+        """
+        Chunked preprocessing with bounded memory:
+        1. raw TMDB/Letterboxd files are streamed in chunks of `chunk_size` rows and split into
+           `partitions` files by hash of the normalized title (merge/dedup keys never cross partitions);
+        2. a process pool merges and cleans partitions independently (peak memory ~ workers x partition);
+        3. every cleaned partition is written as a Parquet part of the output dataset
+           (typed list columns, dictionary-encoded low-cardinality strings).
+        """
+        shutil.rmtree(self.PARTITIONS_PATH, ignore_errors=True)
+        os.makedirs(self.PARTITIONS_PATH)
+        #Parquet parts are written next to the output and moved in place at the end
+        tmp_path = self.FILM_PREP_PATH + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+
+        print(f"Partitioning the datasets ({self.PARTITIONS} partitions, chunks of {self.CHUNK_SIZE:,} rows)...")
+        tmdb_chunks = pd.read_csv(self.TMDB_RAW_PATH, usecols=TMDB_COLUMNS, chunksize=self.CHUNK_SIZE)
+        print(f"\tTMDB: {self._partition(tmdb_chunks, 'tmdb'):,} rows")
+        #No dtype/date inference: columns are typed during cleaning, and inferring them per chunk is slow and can differ between chunks
+        lb_chunks = pd.read_json(self.LB_RAW_PATH, lines=True, chunksize=self.CHUNK_SIZE, dtype=False, convert_dates=False)
+        print(f"\tLetterboxd: {self._partition(lb_chunks, 'lb'):,} rows")
+
+        print(f"Merging and preprocessing partitions ({self.WORKERS} workers)...")
+        part_ids = list(range(self.PARTITIONS))
+        if self.WORKERS > 1:
+            with ProcessPoolExecutor(max_workers=self.WORKERS) as pool:
+                results = list(tqdm(pool.map(self._process_partition, part_ids), total=len(part_ids)))
+        else:
+            results = [self._process_partition(part_id) for part_id in tqdm(part_ids)]
 
         #Saving preprocessed dataset
-        os.makedirs(os.path.dirname(self.FILM_PREP_PATH), exist_ok=True)
-        merged.to_csv(self.FILM_PREP_PATH)
-        print(f"Preprocessed dataset saved to: {self.FILM_PREP_PATH}")
+        shutil.rmtree(self.FILM_PREP_PATH, ignore_errors=True)
+        os.replace(tmp_path, self.FILM_PREP_PATH)
+        shutil.rmtree(self.PARTITIONS_PATH, ignore_errors=True)
+        print(f"Preprocessed dataset saved to: {self.FILM_PREP_PATH} ({sum(results):,} films)")
         
 if __name__ == "__main__":
     dataset_proc = Dataset_proc()
@@ -0,0 +1,81 @@
+import os
+import ast
+import glob
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+#Columns holding lists of values (typed list<string> in Parquet, stringified as "['A', 'B']" in legacy CSV)
+LIST_COLUMNS = ("genres", "directors", "cast")
+
+#Low-cardinality string columns kept dictionary-encoded in Parquet
+DICTIONARY_COLUMNS = ("release_info", "production_countries", "production_companies")
+
+FILM_SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("release_info", pa.string()),
+    ("overview", pa.string()),
+    ("vote_average", pa.float64()),
+    ("vote_count", pa.float64()),
+    ("popularity", pa.float64()),
+    ("runtime", pa.float64()),
+    ("genres", pa.list_(pa.string())),
+    ("directors", pa.list_(pa.string())),
+    ("cast", pa.list_(pa.string())),
+    ("production_countries", pa.string()),
+    ("production_companies", pa.string()),
+    ("keywords", pa.string()),
+    ("title_plot", pa.string()),
+    ("title_meta", pa.string()),
+])
+
+def _parse_list(value) -> list:
+    if isinstance(value, list):
+        return value
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if not isinstance(value, str) or not value:
+        return []
+    if value.startswith("["):
+        try:
+            return list(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            pass
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+def _part_files(path: str) -> list[str]:
+    return sorted(glob.glob(os.path.join(path, "part-*.parquet")))
+
+def write_film_data_part(data: pd.DataFrame, path: str):
+    """Writes one partition of prepared film data as Parquet with typed list columns."""
+    data = data.copy()
+    for column in LIST_COLUMNS:
+        data[column] = [list(v) if isinstance(v, (list, np.ndarray)) else None for v in data[column]]
+    for column in ("release_info", "production_countries", "production_companies", "keywords"):
+        data[column] = data[column].astype("string")
+    table = pa.Table.from_pandas(data[FILM_SCHEMA.names], schema=FILM_SCHEMA, preserve_index=False)
+    pq.write_table(table, path, compression="zstd", use_dictionary=list(DICTIONARY_COLUMNS))
+
+def read_film_data(path: str, columns: list[str] | None = None) -> pd.DataFrame:
+    """
+    Reads prepared film data (row order = row_idx). List-valued columns are returned as Python lists.
+
+    path is a directory of Parquet parts (only the requested columns are read) or a legacy CSV.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"ERROR: No preprocessed data found at {path}!\n  Run src/dataset/data_proc.py auto firstly.")
+
+    if os.path.isdir(path):
+        #Parts are read in name order, which is the order they were written in
+        tables = [pq.read_table(f, columns=columns, read_dictionary=[c for c in DICTIONARY_COLUMNS if columns is None or c in columns])
+                  for f in _part_files(path)]
+        data = pa.concat_tables(tables).to_pandas() if tables else FILM_SCHEMA.empty_table().to_pandas()[columns or FILM_SCHEMA.names]
+    else:
+        data = pd.read_csv(path, usecols=columns)
+
+    for column in LIST_COLUMNS:
+        if column in data.columns:
+            data[column] = data[column].apply(_parse_list)
+    data.reset_index(drop=True, inplace=True)
+    return data
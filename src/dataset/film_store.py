@@ -0,0 +1,108 @@
+import os
+import json
+import numpy as np
+
+
+class FilmStore:
+    """
+    Columnar store of per-film texts (read-only at query time, append-only on updates).
+
+    Every column is kept as two files: `{column}.bin` with all UTF-8 strings concatenated
+    and `{column}_offsets.npy` with n_rows + 1 int64 offsets. Both are memory-mapped, so
+    opening the store is instant and strings are sliced out lazily; worker processes
+    opening the same store share its pages through the OS cache.
+    """
+    COLUMNS = ("title", "plot_text", "meta_text")
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "info.json"), "r") as f:
+            self.info = json.load(f)
+
+        self._offsets = {}
+        self._data = {}
+        for column in self.info["columns"]:
+            self._offsets[column] = np.load(os.path.join(path, f"{column}_offsets.npy"), mmap_mode="r")
+            data_path = os.path.join(path, f"{column}.bin")
+            if os.path.getsize(data_path) > 0:
+                self._data[column] = np.memmap(data_path, dtype=np.uint8, mode="r")
+            else:
+                self._data[column] = np.empty(0, dtype=np.uint8)
+
+    def __len__(self) -> int:
+        return self.info["n_rows"]
+
+    def get(self, column: str, row_idx: int) -> str:
+        offsets = self._offsets[column]
+        start, end = int(offsets[row_idx]), int(offsets[row_idx + 1])
+        return self._data[column][start:end].tobytes().decode("utf-8")
+
+    def row(self, row_idx: int) -> tuple[str, str, str]:
+        """Returns (title, plot_text, meta_text) for a given film row_idx."""
+        return tuple(self.get(column, row_idx) for column in self.COLUMNS)
+
+    def column(self, column: str) -> list[str]:
+        """Decodes the whole column (used by index builds, not at query time)."""
+        return [self.get(column, i) for i in range(len(self))]
+
+    @staticmethod
+    def write(path: str, columns: dict[str, list[str]]):
+        """Writes equally sized string columns to path. Every file is replaced atomically."""
+        n_rows = {len(values) for values in columns.values()}
+        assert len(n_rows) == 1, "All film store columns must have the same length"
+
+        os.makedirs(path, exist_ok=True)
+        for column, values in columns.items():
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            data_path = os.path.join(path, f"{column}.bin")
+            with open(data_path + ".tmp", "wb") as f:
+                for i, value in enumerate(values):
+                    encoded = ("" if value is None else str(value)).encode("utf-8")
+                    f.write(encoded)
+                    offsets[i + 1] = offsets[i] + len(encoded)
+
+            offsets_path = os.path.join(path, f"{column}_offsets.npy")
+            with open(offsets_path + ".tmp", "wb") as f:
+                np.save(f, offsets)
+            os.replace(data_path + ".tmp", data_path)
+            os.replace(offsets_path + ".tmp", offsets_path)
+
+        info_path = os.path.join(path, "info.json")
+        with open(info_path + ".tmp", "w") as f:
+            json.dump({"n_rows": n_rows.pop(), "columns": list(columns.keys())}, f, indent=2)
+        os.replace(info_path + ".tmp", info_path)
+
+    @staticmethod
+    def append(path: str, columns: dict[str, list[str]]):
+        """
+        Appends rows to an existing store. Strings are appended to `.bin` files in place
+        (readers never see bytes past their offsets), offsets and info are replaced atomically.
+        """
+        with open(os.path.join(path, "info.json"), "r") as f:
+            info = json.load(f)
+        assert set(columns) == set(info["columns"]), "Appended rows must have all film store columns"
+        n_rows = {len(values) for values in columns.values()}
+        assert len(n_rows) == 1, "All film store columns must have the same length"
+
+        for column, values in columns.items():
+            offsets_path = os.path.join(path, f"{column}_offsets.npy")
+            old_offsets = np.load(offsets_path)
+            offsets = np.zeros(len(values) + 1, dtype=np.int64)
+            offsets[0] = old_offsets[-1]
+            with open(os.path.join(path, f"{column}.bin"), "r+b") as f:
+                # Drops bytes of a previously interrupted append
+                f.truncate(int(old_offsets[-1]))
+                f.seek(0, os.SEEK_END)
+                for i, value in enumerate(values):
+                    encoded = ("" if value is None else str(value)).encode("utf-8")
+                    f.write(encoded)
+                    offsets[i + 1] = offsets[i] + len(encoded)
+
+            with open(offsets_path + ".tmp", "wb") as f:
+                np.save(f, np.concatenate([old_offsets, offsets[1:]]))
+            os.replace(offsets_path + ".tmp", offsets_path)
+
+        info_path = os.path.join(path, "info.json")
+        with open(info_path + ".tmp", "w") as f:
+            json.dump({"n_rows": info["n_rows"] + n_rows.pop(), "columns": info["columns"]}, f, indent=2)
+        os.replace(info_path + ".tmp", info_path)
@@ -0,0 +1,219 @@
+import os, re
+import json, pickle
+import datetime
+import numpy as np
+import pandas as pd
+
+try:
+    from .film_data import read_film_data
+    from .meta_parser import GENRES
+except ImportError:
+    from film_data import read_film_data
+    from meta_parser import GENRES
+
+#Bit flags for genres are stored in uint64, so only the most frequent genres are kept
+MAX_GENRES = 64
+
+def _build_inverted(lists: list[list[str]]) -> tuple[dict, np.ndarray, np.ndarray]:
+    """{lowercase name: id}, offsets and row ids (CSR) of rows each name appears in."""
+    postings = {}
+    for row_idx, names in enumerate(lists):
+        for name in names:
+            postings.setdefault(name.lower(), []).append(row_idx)
+
+    vocab, offsets, rows = {}, [0], []
+    for i, (name, name_rows) in enumerate(postings.items()):
+        vocab[name] = i
+        rows.extend(sorted(set(name_rows)))
+        offsets.append(len(rows))
+    return vocab, np.asarray(offsets, dtype=np.int64), np.asarray(rows, dtype=np.int32)
+
+
+class FilterStore:
+    """
+    Compact typed columns for structured filtering, aligned with film store row_idx.
+
+    Numeric columns (year, vote_average, vote_count, genre bit flags) are plain arrays;
+    directors and cast are inverted lists (person -> rows). Everything is memory-mapped.
+    """
+    ARRAYS = ("year", "vote_average", "vote_count", "genre_bits",
+              "director_offsets", "director_rows", "cast_offsets", "cast_rows")
+    #Film data columns filters are extracted from
+    COLUMNS = ["release_info", "genres", "directors", "cast", "vote_average", "vote_count"]
+
+    def __init__(self, path: str):
+        self.path = path
+        self._arrays = {name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r") for name in self.ARRAYS}
+        with open(os.path.join(path, "vocab.pkl"), "rb") as f:
+            vocab = pickle.load(f)
+        self.genre_vocab = vocab["genres"]
+        self.director_vocab = vocab["directors"]
+        self.cast_vocab = vocab["cast"]
+
+        with open(os.path.join(path, "params.json"), "r") as f:
+            params = json.load(f)
+        self.high_rating = params["high_rating"]
+        self.low_rating = params["low_rating"]
+        self.min_votes = params["min_votes"]
+
+    def __len__(self) -> int:
+        return len(self._arrays["year"])
+
+    @staticmethod
+    def build(film_data_path: str, path: str, high_rating: float = 7.0, low_rating: float = 5.0, min_votes: int = 50):
+        """Extracts filter columns from prepared film data and saves them to path."""
+        print("Building filter store...")
+        data = read_film_data(film_data_path, columns=FilterStore.COLUMNS)
+        FilterStore.build_from_data(data, path, high_rating=high_rating, low_rating=low_rating, min_votes=min_votes)
+
+    @staticmethod
+    def build_from_data(data: pd.DataFrame, path: str, high_rating: float = 7.0, low_rating: float = 5.0, min_votes: int = 50):
+        """Saves filter columns of data (one row per row_idx) to path."""
+        year = data["release_info"].astype(str).str.extract(r"^((?:18|19|20)\d{2})")[0]
+        arrays = {
+            "year": pd.to_numeric(year, errors="coerce").fillna(0).astype(np.int16).to_numpy(),
+            "vote_average": data["vote_average"].fillna(0).astype(np.float32).to_numpy(),
+            "vote_count": data["vote_count"].fillna(0).astype(np.int32).to_numpy(),
+        }
+
+        genre_counts = data["genres"].explode().dropna().value_counts()
+        genre_vocab = {genre.lower(): i for i, genre in enumerate(genre_counts.index[:MAX_GENRES])}
+        arrays["genre_bits"] = np.asarray(
+            [sum(1 << genre_vocab[g.lower()] for g in set(genres) if g.lower() in genre_vocab) for genres in data["genres"]],
+            dtype=np.uint64,
+        )
+
+        director_vocab, arrays["director_offsets"], arrays["director_rows"] = _build_inverted(data["directors"])
+        cast_vocab, arrays["cast_offsets"], arrays["cast_rows"] = _build_inverted(data["cast"])
+
+        os.makedirs(path, exist_ok=True)
+        for name, array in arrays.items():
+            array_path = os.path.join(path, f"{name}.npy")
+            with open(array_path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(array_path + ".tmp", array_path)
+        vocab_path, params_path = os.path.join(path, "vocab.pkl"), os.path.join(path, "params.json")
+        with open(vocab_path + ".tmp", "wb") as f:
+            pickle.dump({"genres": genre_vocab, "directors": director_vocab, "cast": cast_vocab}, f)
+        with open(params_path + ".tmp", "w") as f:
+            json.dump({"high_rating": high_rating, "low_rating": low_rating, "min_votes": min_votes}, f, indent=2)
+        os.replace(vocab_path + ".tmp", vocab_path)
+        os.replace(params_path + ".tmp", params_path)
+        print(f"Filter store saved to {path} ({len(data):,} films, {len(genre_vocab)} genres, "
+              f"{len(director_vocab):,} directors, {len(cast_vocab):,} cast)")
+
+    @staticmethod
+    def _parse_years(value: str) -> tuple[int | None, int | None] | None:
+        """Release_info value -> (year_min, year_max), None if it is not understood."""
+        value = value.lower().strip()
+        this_year = datetime.date.today().year
+        if m := re.fullmatch(r"between\s+(\d{4})\s*(?:and|-|to)\s*(\d{4})", value):
+            return int(m[1]), int(m[2])
+        if m := re.fullmatch(r"(?:after|since|post)\s+(\d{4})", value):
+            return int(m[1]) + 1, None
+        if m := re.fullmatch(r"(?:before|prior to|pre)\s+(\d{4})", value):
+            return None, int(m[1]) - 1
+        if m := re.fullmatch(r"(\d{3})0s", value):
+            return int(m[1]) * 10, int(m[1]) * 10 + 9
+        if m := re.fullmatch(r"(?:in\s+)?(\d{4})", value):
+            return int(m[1]), int(m[1])
+        if re.fullmatch(r"(?:the\s+)?last decade", value):
+            return this_year - 10, this_year
+        if re.fullmatch(r"recent(?:ly)?|new|latest", value):
+            return this_year - 3, this_year
+        return None
+
+    def parse(self, rewritten: str) -> tuple[dict, str]:
+        """
+        Splits a rewritten query ("Cast: X | Release_info: after 2010 | Rating: high") into
+        structured filters and the residual text for lexical search. Fields that can't be
+        mapped exactly (unknown names, free-form values) stay in the residual text.
+        """
+        filters, residual = {}, []
+        for part in (rewritten or "").split(" | "):
+            key, sep, value = part.partition(":")
+            key, value = key.strip().lower(), value.strip()
+            if not sep or not value:
+                residual.append(part)
+                continue
+
+            if key == "release_info" and (years := self._parse_years(value)) is not None:
+                filters["year_min"], filters["year_max"] = years
+
+            elif key == "rating" and value.lower() in ("high", "low"):
+                if value.lower() == "high":
+                    filters["min_rating"] = self.high_rating
+                else:
+                    filters["max_rating"] = self.low_rating
+                filters["min_votes"] = self.min_votes
+
+            elif key == "genres":
+                known, unknown = [], []
+                for genre in value.split(","):
+                    genre = GENRES.get(genre.strip().lower(), genre.strip())
+                    (known if genre.lower() in self.genre_vocab else unknown).append(genre)
+                if known:
+                    filters["genres"] = known
+                if unknown:
+                    residual.append(f"Genres: {', '.join(unknown)}")
+
+            elif key in ("directors", "cast"):
+                vocab = self.director_vocab if key == "directors" else self.cast_vocab
+                names = [name.strip() for name in value.split(",") if name.strip()]
+                known = [name for name in names if name.lower() in vocab]
+                if known:
+                    filters[key] = known
+                if len(known) < len(names):
+                    residual.append(f"{key.capitalize()}: {', '.join(n for n in names if n not in known)}")
+
+            else:
+                residual.append(part)
+
+        return filters, " | ".join(residual)
+
+    def _person_rows(self, field: str, name: str) -> np.ndarray:
+        vocab = self.director_vocab if field == "directors" else self.cast_vocab
+        person_id = vocab.get(name.lower())
+        if person_id is None:
+            return np.empty(0, dtype=np.int32)
+        prefix = "director" if field == "directors" else "cast"
+        offsets, rows = self._arrays[f"{prefix}_offsets"], self._arrays[f"{prefix}_rows"]
+        return rows[offsets[person_id]:offsets[person_id + 1]]
+
+    def mask(self, filters: dict) -> np.ndarray:
+        """Boolean mask over row_idx of films matching all filters."""
+        mask = np.ones(len(self), dtype=bool)
+        year = self._arrays["year"]
+        if filters.get("year_min") is not None:
+            mask &= year >= filters["year_min"]
+        if filters.get("year_max") is not None:
+            mask &= (year <= filters["year_max"]) & (year > 0)
+
+        vote_average = self._arrays["vote_average"]
+        if filters.get("min_rating") is not None:
+            mask &= vote_average >= filters["min_rating"]
+        if filters.get("max_rating") is not None:
+            mask &= (vote_average <= filters["max_rating"]) & (vote_average > 0)
+        if filters.get("min_votes") is not None:
+            mask &= self._arrays["vote_count"] >= filters["min_votes"]
+
+        if filters.get("genres"):
+            bits = 0
+            for genre in filters["genres"]:
+                bits |= 1 << self.genre_vocab[genre.lower()]
+            mask &= (self._arrays["genre_bits"] & np.uint64(bits)) == np.uint64(bits)
+
+        for field in ("directors", "cast"):
+            for name in filters.get(field) or []:
+                person_mask = np.zeros(len(self), dtype=bool)
+                person_mask[self._person_rows(field, name)] = True
+                mask &= person_mask
+
+        return mask
+
+    def top_rows(self, mask: np.ndarray, top_k: int) -> tuple[np.ndarray, np.ndarray]:
+        """Best known films among the masked rows (used when no text is left to rank by)."""
+        rows = np.flatnonzero(mask)
+        scores = self._arrays["vote_average"][rows] * np.log1p(self._arrays["vote_count"][rows])
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        return rows[order], scores[order]
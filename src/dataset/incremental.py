@@ -0,0 +1,101 @@
+import os
+import hashlib
+import pickle
+import numpy as np
+import pandas as pd
+
+
+def film_keys(titles: list[str], release_infos: list[str]) -> list[str]:
+    """
+    Stable film keys: normalized title + release info. Repeated keys get an occurrence
+    suffix ("#1", "#2"...) so every row of the film data has a unique key.
+    """
+    keys = [f"{str(t).strip().lower()}|{'' if pd.isna(r) else str(r).strip().lower()}"
+            for t, r in zip(titles, release_infos)]
+    seen = {}
+    unique = []
+    for key in keys:
+        n = seen.get(key, 0)
+        seen[key] = n + 1
+        unique.append(key if n == 0 else f"{key}#{n}")
+    return unique
+
+def text_hashes(plot_texts: list[str], meta_texts: list[str]) -> list[str]:
+    """Hashes of the embedded/indexed texts: a row is re-embedded only when its hash changes."""
+    return [hashlib.blake2b(f"{p}\x00{m}".encode("utf-8"), digest_size=8).hexdigest()
+            for p, m in zip(plot_texts, meta_texts)]
+
+
+class IndexManifest:
+    """
+    Key and text hash of every indexed row_idx plus deletion tombstones.
+
+    Rows are append-only: changed films are tombstoned and appended as new rows, so
+    row_idx of existing films (and their FAISS IDs) never move between updates.
+    """
+    def __init__(self, keys: list[str], hashes: list[str], deleted: np.ndarray):
+        self.keys = keys
+        self.hashes = hashes
+        self.deleted = deleted
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @staticmethod
+    def exists(path: str) -> bool:
+        return os.path.exists(os.path.join(path, "keys.pkl"))
+
+    @classmethod
+    def load(cls, path: str) -> "IndexManifest":
+        with open(os.path.join(path, "keys.pkl"), "rb") as f:
+            keys, hashes = pickle.load(f)
+        return cls(keys, hashes, np.load(os.path.join(path, "deleted.npy")))
+
+    @staticmethod
+    def load_deleted(path: str) -> np.ndarray | None:
+        """Tombstones only (the part needed at query time), None if there is no manifest."""
+        deleted_path = os.path.join(path, "deleted.npy")
+        return np.load(deleted_path, mmap_mode="r") if os.path.exists(deleted_path) else None
+
+    def save(self, path: str):
+        os.makedirs(path, exist_ok=True)
+        keys_path = os.path.join(path, "keys.pkl")
+        with open(keys_path + ".tmp", "wb") as f:
+            pickle.dump((self.keys, self.hashes), f)
+        deleted_path = os.path.join(path, "deleted.npy")
+        with open(deleted_path + ".tmp", "wb") as f:
+            np.save(f, np.asarray(self.deleted, dtype=bool))
+        os.replace(keys_path + ".tmp", keys_path)
+        os.replace(deleted_path + ".tmp", deleted_path)
+
+    def diff(self, keys: list[str], hashes: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Compares new film data (keys, hashes) with the indexed rows.
+
+        Returns (data_rows, new_positions, deleted_rows): row_idx every new data row maps to
+        (-1 for rows to append), positions of new/changed data rows and row_idx to tombstone.
+        """
+        live = {key: row for row, key in enumerate(self.keys) if not self.deleted[row]}
+        data_rows = np.full(len(keys), -1, dtype=np.int64)
+        for i, (key, text_hash) in enumerate(zip(keys, hashes)):
+            row = live.get(key)
+            if row is not None and self.hashes[row] == text_hash:
+                data_rows[i] = row
+
+        kept = set(data_rows[data_rows >= 0].tolist())
+        deleted_rows = np.asarray(sorted(set(live.values()) - kept), dtype=np.int64)
+        new_positions = np.flatnonzero(data_rows == -1)
+        return data_rows, new_positions, deleted_rows
+
+    def apply(self, data_rows: np.ndarray, new_positions: np.ndarray, deleted_rows: np.ndarray,
+              keys: list[str], hashes: list[str]) -> np.ndarray:
+        """Tombstones deleted_rows, appends new rows and fills their row_idx into data_rows."""
+        start = len(self.keys)
+        data_rows[new_positions] = np.arange(start, start + len(new_positions))
+        self.keys.extend(keys[i] for i in new_positions)
+        self.hashes.extend(hashes[i] for i in new_positions)
+        deleted = np.zeros(len(self.keys), dtype=bool)
+        deleted[:start] = self.deleted
+        deleted[deleted_rows] = True
+        self.deleted = deleted
+        return data_rows
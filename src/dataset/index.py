@@ -1,5 +1,4 @@
-import os, re, argparse
-import torch
+import os, re, copy, json, time, shutil, hashlib, argparse, threading
 import h5py
 import faiss
 import yaml, pickle
@@ -7,9 +6,30 @@ import numpy as np
 import pandas as pd
 from tqdm import tqdm
 from typing import Literal
-from sentence_transformers import SentenceTransformer
+from concurrent.futures import ThreadPoolExecutor
 import bm25s
 
+try:
+    from .batch_encoder import BatchEncoder
+    from .film_store import FilmStore
+    from .filter_store import FilterStore
+    from .meta_parser import build_gazetteer_from_data
+    from .binary_index import BinaryRescoreIndex, BinarySearchParameters
+    from .incremental import IndexManifest, film_keys, text_hashes
+    from .film_data import read_film_data
+    from .index_versions import IndexVersions, RWLock, fingerprint
+    from .query_encoder import QUERY_ENCODER_BACKENDS, StubEncoder, load_query_encoder
+except ImportError:
+    from batch_encoder import BatchEncoder
+    from film_store import FilmStore
+    from filter_store import FilterStore
+    from meta_parser import build_gazetteer_from_data
+    from binary_index import BinaryRescoreIndex, BinarySearchParameters
+    from incremental import IndexManifest, film_keys, text_hashes
+    from film_data import read_film_data
+    from index_versions import IndexVersions, RWLock, fingerprint
+    from query_encoder import QUERY_ENCODER_BACKENDS, StubEncoder, load_query_encoder
+
 def _load_config():
     if os.path.exists("config/config.yaml"):
         with open("config/config.yaml", "r") as f:
@@ -19,106 +39,550 @@ def _load_config():
         raise FileNotFoundError("ERROR: config not found at config/config.yaml .\n \
                                 ensure you run index.py from project's root directory")
 
-def _create_save_metadata() -> tuple[list, list]:
-    config = _load_config()
-    DATA_PREP_PATH = config["paths"]["film_data"]
-    METADATA_PATH = config["paths"]["faiss_metadata"]
-    
-    #Check if the preprocessed data is present
-    if not os.path.exists(DATA_PREP_PATH):
-        raise FileNotFoundError(f"ERROR: No preprocessed data found!\n  Run src/dataset/data_proc.py auto firstly.")
-        
-    data = pd.read_csv(DATA_PREP_PATH, usecols=["title", "title_plot", "title_meta"])
+PLOT_INDEX_TYPES = ("Flat", "IVFFlat", "IVFPQ", "HNSW", "SQfp16", "SQ8", "Binary")
+
+#File tags used in plot index names (Flat keeps the historical "FlatIP" name)
+PLOT_INDEX_TAGS = {"Flat": "FlatIP", "IVFFlat": "IVFFlat", "IVFPQ": "IVFPQ", "HNSW": "HNSW",
+                   "SQfp16": "SQfp16", "SQ8": "SQ8", "Binary": "Binary"}
+
+#Storage dtypes of the embeddings H5 file
+EMBED_DTYPES = ("float32", "float16", "int8")
+
+#Chunk types of a film that can be embedded (meta search uses BM25, so only plot chunks are indexed)
+CHUNK_TYPES = ("meta", "plot")
+
+def _chunk_types(config: dict) -> list[str]:
+    chunk_types = list(config["embeddings"]["chunk_types"])
+    unknown = [t for t in chunk_types if t not in CHUNK_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown chunk types: {unknown}. Choose from {CHUNK_TYPES}")
+    if "plot" not in chunk_types:
+        raise ValueError("embeddings.chunk_types must include \"plot\": the plot index is built from it")
+    return chunk_types
+
+def _rows_to_plot_ids(rows, id_scheme: str):
+    """
+    Plot index IDs of film rows. "row": the row_idx itself; "chunk": position of the plot
+    chunk in the legacy interleaved (meta, plot) embeddings layout, 2 * row_idx + 1.
+    """
+    return rows if id_scheme == "row" else rows * 2 + 1
+
+def _plot_ids_to_rows(plot_ids, id_scheme: str):
+    return plot_ids if id_scheme == "row" else plot_ids // 2
+
+def _plot_index_factory(index_type: str, params: dict) -> str:
+    """Returns faiss.index_factory description for the given plot index type."""
+    if index_type == "Flat":
+        return "Flat"
+    if index_type == "IVFFlat":
+        return f"IVF{params['nlist']},Flat"
+    if index_type == "IVFPQ":
+        return f"IVF{params['nlist']},PQ{params['pq_m']}x{params['pq_nbits']}"
+    if index_type == "HNSW":
+        return f"HNSW{params['hnsw_m']},Flat"
+    if index_type in ("SQfp16", "SQ8"):
+        return index_type
+    if index_type == "Binary":
+        #Not a faiss factory string: built by BinaryRescoreIndex (sign bits + float16 rescoring)
+        return f"BFlat,RescoreFP16x{params['rescore_factor']}"
+    raise ValueError(f"Unknown plot index type: {index_type}. Choose from {PLOT_INDEX_TYPES}")
+
+def _quantize_embeddings(batch: np.ndarray, dtype: str) -> tuple[np.ndarray, np.ndarray | None]:
+    """Converts float32 embeddings to the storage dtype. int8 uses symmetric per-vector scales."""
+    if dtype == "float32":
+        return batch.astype(np.float32), None
+    if dtype == "float16":
+        return batch.astype(np.float16), None
+    if dtype == "int8":
+        scales = np.abs(batch).max(axis=1) / 127.0
+        scales[scales == 0] = 1.0
+        return np.round(batch / scales[:, None]).astype(np.int8), scales.astype(np.float32)
+    raise ValueError(f"Unknown embeddings dtype: {dtype}. Choose from {EMBED_DTYPES}")
+
+def _n_embedded_rows(hf: h5py.File, chunk_type: str = "plot") -> int:
+    """Number of film rows with embeddings of chunk_type in the H5 file."""
+    if chunk_type in hf:
+        return hf[chunk_type].shape[0]
+    return hf["embeddings"].shape[0] // 2
+
+def _read_embeddings(hf: h5py.File, rows: slice, chunk_type: str = "plot") -> np.ndarray:
+    """
+    Reads embeddings of chunk_type for film rows [rows.start, rows.stop) as normalized float32
+    whatever the storage dtype is. Chunk types are separate datasets, so the read is contiguous;
+    files of the legacy layout (one "embeddings" dataset, meta and plot chunk per row) are read strided.
+    """
+    if chunk_type in hf:
+        dset, scales, sel = hf[chunk_type], hf.get(f"{chunk_type}_scales"), rows
+    else:
+        offset = CHUNK_TYPES.index(chunk_type)
+        dset, scales, sel = hf["embeddings"], hf.get("scales"), slice(2 * rows.start + offset, 2 * rows.stop, 2)
+    emb = dset[sel].astype(np.float32)
+    if scales is not None:
+        emb *= scales[sel][:, None]
+        faiss.normalize_L2(emb)
+    return emb
+
+def _sample_plot_embeddings(hf: h5py.File, n_samples: int, block_size: int = 100000, seed: int = 0) -> np.ndarray:
+    """Uniformly samples plot embeddings from the H5 file for index training."""
+    n_total = _n_embedded_rows(hf)
+    n_samples = min(n_samples, n_total)
+    rows = np.sort(np.random.default_rng(seed).choice(n_total, n_samples, replace=False))
+
+    #Reading by contiguous blocks is much faster than h5py point selection
+    samples = []
+    for start in range(0, n_total, block_size):
+        end = min(start + block_size, n_total)
+        sel = rows[(rows >= start) & (rows < end)] - start
+        if len(sel):
+            samples.append(_read_embeddings(hf, slice(start, end))[sel])
+    return np.concatenate(samples)
+
+def _create_save_metadata(FILM_STORE_PATH: str, MANIFEST_PATH: str, chunk_types: list[str] = ("plot",),
+                          data: pd.DataFrame | None = None) -> dict[str, list[str]]:
+    """
+    Writes the film store (title, plot and meta text per film) and the index manifest,
+    returns {chunk type: texts in row_idx order} for the chunk types to embed.
+
+    data is the prepared film data (read from paths.film_data if not given); its row order is row_idx.
+    """
+    if data is None:
+        config = _load_config()
+        DATA_PREP_PATH = config["paths"]["film_data"]
+
+        #Check if the preprocessed data is present
+        if not os.path.exists(DATA_PREP_PATH):
+            raise FileNotFoundError(f"ERROR: No preprocessed data found!\n  Run src/dataset/data_proc.py auto firstly.")
+
+        data = read_film_data(DATA_PREP_PATH, columns=["title", "release_info", "title_plot", "title_meta"])
     #data = data.iloc[:300] #XXX for test_embeddings_build
-    data.reset_index(drop=True, inplace=True)
-
-    #Creating text & metadata lists for index
-    texts = []
-    metadata = []
-    for idx, row in data.iterrows():
-        #Meta chunk
-        texts.append(row["title_meta"])
-        metadata.append({"row_idx": idx, "chunk_type": "meta", "title": row["title"], "chunk_text": row["title_meta"]})
-        
-        #Plot chunk
-        texts.append(row["title_plot"])
-        metadata.append({"row_idx": idx, "chunk_type": "plot", "title": row["title"], "chunk_text": row["title_plot"]})
 
-    #Saving metadata
-    with open(METADATA_PATH, 'wb') as f: 
-        pickle.dump(metadata, f)
-    print(f"Saved metadata {METADATA_PATH}")
+    titles = data["title"].astype(str).tolist()
+    plot_texts = data["title_plot"].astype(str).tolist()
+    meta_texts = data["title_meta"].astype(str).tolist()
 
-    return texts, metadata
+    #Saving columnar film store
+    FilmStore.write(FILM_STORE_PATH, {"title": titles, "plot_text": plot_texts, "meta_text": meta_texts})
+    print(f"Saved film store {FILM_STORE_PATH} ({len(titles):,} films)")
 
-def _create_embeddings(embed_model:SentenceTransformer):
+    #Stable keys and text hashes of indexed rows for incremental updates
+    keys = film_keys(titles, data["release_info"].tolist())
+    IndexManifest(keys, text_hashes(plot_texts, meta_texts), np.zeros(len(keys), dtype=bool)).save(MANIFEST_PATH)
+
+    #Chunk texts for embeddings, one dataset per chunk type
+    texts = {"meta": meta_texts, "plot": plot_texts}
+    return {chunk_type: texts[chunk_type] for chunk_type in chunk_types}
+
+def _texts_hash(texts: list[str]) -> str:
+    h = hashlib.blake2b(digest_size=16)
+    for text in texts:
+        h.update(text.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+#Config paths of index components, kept under paths.index_root
+INDEX_PATH_KEYS = ("index_root", "faiss_index", "film_store", "filter_store", "bm25_index", "person_gazetteer", "index_manifest")
+
+def _index_paths(config: dict, stub: bool = False) -> dict:
+    """Config paths; StubEncoder indexes move from paths.index_root to a sibling `{index_root}_stub`."""
+    paths = dict(config["paths"])
+    if not stub:
+        return paths
+    root = os.path.normpath(paths["index_root"])
+    for key in INDEX_PATH_KEYS:
+        rel_path = os.path.relpath(paths[key], root)
+        if not rel_path.startswith(os.pardir):
+            paths[key] = os.path.normpath(os.path.join(f"{root}_stub", rel_path))
+    return paths
+
+def _embeddings_path(config: dict, stub: bool = False) -> str:
+    """Embeddings file; StubEncoder embeddings are kept apart from the real ones."""
+    path = config["paths"]["embeddings"]
+    if not stub:
+        return path
+    root, ext = os.path.splitext(path)
+    return f"{root}_stub{ext}"
+
+def _create_embeddings(embed_model: "SentenceTransformer", chunk_texts: dict[str, list[str]], EMBED_PATH: str):
+    """
+    Encodes {chunk type: texts in row_idx order} into the H5 file block by block (block_size texts).
+
+    Every chunk type is a dataset of its own (row i = film row_idx i), so chunk types that
+    are not indexed are neither embedded nor stored. Inside a block texts are sorted by length,
+    so every batch pads to similar lengths, and encoded by a multi-process pool of `workers`
+    CPU processes. After each block `n_done` is stored on the dataset: an interrupted build
+    resumes from the last completed block (if the texts are still the same), unchanged
+    complete datasets are kept as they are.
+    """
     print("Creating embeddings:")
     
     config = _load_config()
-    EMBED_PATH = config["paths"]["embeddings"]
     EMBED_DIM = embed_model.get_sentence_embedding_dimension()
+    EMBED_DTYPE = config["embeddings"]["storage_dtype"]
+    if EMBED_DTYPE not in EMBED_DTYPES:
+        raise ValueError(f"Unknown embeddings dtype: {EMBED_DTYPE}. Choose from {EMBED_DTYPES}")
+    batch_size = config["embeddings"]["batch_size"]
+    block_size = config["embeddings"]["block_size"]
+    workers = config["embeddings"]["workers"] or os.cpu_count()
+    chunk_types = list(chunk_texts)
+
+    # Resuming only makes sense for the same texts and storage format; everything else is dropped
+    n_done = {}
+    with h5py.File(EMBED_PATH, 'a') as hf:
+        # Legacy interleaved layout
+        for name in ("embeddings", "scales"):
+            if name in hf:
+                del hf[name]
+        for attr in ("texts_hash", "n_done"):
+            if attr in hf.attrs:
+                del hf.attrs[attr]
+        for chunk_type in CHUNK_TYPES:
+            texts_hash = _texts_hash(chunk_texts[chunk_type]) if chunk_type in chunk_texts else None
+            if chunk_type in hf and (hf[chunk_type].attrs.get("texts_hash") != texts_hash or hf[chunk_type].dtype.name != EMBED_DTYPE):
+                del hf[chunk_type]
+                if f"{chunk_type}_scales" in hf:
+                    del hf[f"{chunk_type}_scales"]
+            if texts_hash is None:
+                continue
+            if chunk_type in hf:
+                n_done[chunk_type] = int(hf[chunk_type].attrs["n_done"])
+                print(f"Resuming {chunk_type} chunks from {n_done[chunk_type]:,}/{len(chunk_texts[chunk_type]):,}")
+                continue
+            # Resizable, so incremental updates can append chunks of new films
+            n_texts = len(chunk_texts[chunk_type])
+            dset = hf.create_dataset(chunk_type, shape=(n_texts, EMBED_DIM), maxshape=(None, EMBED_DIM), dtype=EMBED_DTYPE, chunks=True)
+            if EMBED_DTYPE == "int8":
+                hf.create_dataset(f"{chunk_type}_scales", shape=(n_texts,), maxshape=(None,), dtype='float32')
+            dset.attrs["texts_hash"] = texts_hash
+            dset.attrs["n_done"] = 0
+            n_done[chunk_type] = 0
+
+    n_left = sum(len(texts) - n_done[chunk_type] for chunk_type, texts in chunk_texts.items())
+    if not n_left:
+        print(f"Embeddings in {EMBED_PATH} are up to date")
+        return
+
+    # CPU worker processes (a single device when encoding on GPU)
+    pool = None
+    if workers > 1 and str(embed_model.device) == "cpu":
+        pool = embed_model.start_multi_process_pool(target_devices=["cpu"] * workers)
+    print(f"Encoding {n_left:,} {'+'.join(chunk_types)} chunks with {workers if pool else 1} process(es), batch_size={batch_size}")
+
+    try:
+        for chunk_type, texts in chunk_texts.items():
+            for start in tqdm(range(n_done[chunk_type], len(texts), block_size), desc=chunk_type):
+                block = texts[start:start + block_size]
+                order = np.argsort([len(text) for text in block], kind="stable")
+                sorted_block = [block[i] for i in order]
+                block_emb = np.empty((len(block), EMBED_DIM), dtype=np.float32)
+                block_emb[order] = embed_model.encode(sorted_block, batch_size=batch_size, pool=pool, show_progress_bar=False,
+                                                      precision='float32', normalize_embeddings=True)
+                block_emb, block_scales = _quantize_embeddings(block_emb, EMBED_DTYPE)
+
+                with h5py.File(EMBED_PATH, 'a') as hf:
+                    hf[chunk_type][start:start + len(block)] = block_emb
+                    if block_scales is not None:
+                        hf[f"{chunk_type}_scales"][start:start + len(block)] = block_scales
+                    hf[chunk_type].attrs["n_done"] = start + len(block)
+    finally:
+        if pool is not None:
+            embed_model.stop_multi_process_pool(pool)
     
-    texts, _ = _create_save_metadata()
-    
-    # Batch encode and append to H5
-    batch_size = 400
-    with h5py.File(EMBED_PATH, 'w') as hf:
-        dset = hf.create_dataset("embeddings", shape=(len(texts), EMBED_DIM), dtype='float32', chunks=True)
-        for i in tqdm(range(0, len(texts), batch_size)):
-            batch = texts[i:i + batch_size]
-            batch_emb = embed_model.encode(batch, batch_size=batch_size, show_progress_bar=False, precision='float32', normalize_embeddings=True)
-            dset[i:i + len(batch_emb)] = batch_emb
-            print(f"Batch {i//batch_size + 1} saved")
-    
-    print(f"Embeddings saved to {EMBED_PATH}")
+    print(f"Embeddings saved to {EMBED_PATH} ({EMBED_DTYPE})")
 
 class FaissIndex:
-    def __init__(self):
+    def __init__(self, version_dir: str | None = None, lazy: bool = False, stub: bool | None = None):
+        """
+        Loads indexes of version_dir (default: the current index version, or the flat layout if versions are off).
+
+        With lazy=True the query encoder and index components are loaded on first use (or by warm_up()).
+        With stub=True (default: benchmark.stub_models) a hashing StubEncoder replaces the embedding model.
+        """
         config = _load_config()
+        self.stub = config["benchmark"]["stub_models"] if stub is None else stub
+        self._stub_dim = config["benchmark"]["stub_embed_dim"]
         
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.embed_model = SentenceTransformer(config["models"]["embedding_model"], device=self.device)
-        self.embed_size = self.embed_model.get_sentence_embedding_dimension() #768
-        self.max_seq_length = self.embed_model.get_max_seq_length() #512
-        self.INDEX_NAME = config["paths"]["faiss_index"]
-        self.EMBED_PATH = config["paths"]["embeddings"]
-        self.METADATA_PATH = config["paths"]["faiss_metadata"]
+        # Queries are encoded by an exported int8 model if configured (torch is not imported then),
+        # the torch SentenceTransformer is loaded on first use (index builds and updates)
+        self._encoder_cfg = config["query_encoder"]
+        if self._encoder_cfg["backend"] not in QUERY_ENCODER_BACKENDS:
+            raise ValueError(f"Unknown query encoder backend: {self._encoder_cfg['backend']}. Choose from {QUERY_ENCODER_BACKENDS}")
+        self.embed_model_name = config["models"]["embedding_model"]
+        self._embed_model = None
+        self._query_model = None
+        self.query_backend = "stub" if self.stub else self._encoder_cfg["backend"]
+        # Coalesces concurrent query encodes into micro-batches (created with the query model)
+        self.query_encoder = None
+        self._load_lock = threading.RLock()
+        self._loaded = False
+        self.plot_params = config["plot_index"]
+        self.plot_index_type = self.plot_params["index_type"]
+        self.EMBED_PATH = _embeddings_path(config, self.stub)
+        self.embed_batch_size = config["embeddings"]["batch_size"]
+        self.chunk_types = _chunk_types(config)
+        self.FILM_PREP_PATH = config["paths"]["film_data"]
+        self.filter_params = config["filters"]
+        self.min_person_films = config["meta_parser"]["min_person_films"]
+        self.hybrid_params = config["hybrid"]
         self.plot_index = None
-        self.metadata = None
+        # How plot index IDs map to row_idx (read from the index build info)
+        self.plot_id_scheme = "row"
+        self.film_store = None
+        self.filter_store = None
         self.bm25_index = None
         self.bm25_row_ids = None
-        self.BM25_PATH = config["paths"]["bm25_index"]
-        
+        # Delta BM25 indexes over rows added by incremental updates: [(retriever, row_ids)]
+        self.bm25_segments = []
+        self.max_bm25_segments = config["incremental"]["max_bm25_segments"]
+        # Rows tombstoned by incremental updates are excluded from every search (None if there are none)
+        self.live_rows = None
+        # Read-only indexes are memory-mapped so several API workers share their pages
+        self.mmap_indexes = config["serving"]["mmap_indexes"]
+
+        # Index files live in versioned directories; searches hold the read side of the swap lock
+        versions_cfg = config["index_versions"]
+        self._paths_config = _index_paths(config, self.stub)
+        self.versions = IndexVersions(self._paths_config["index_root"], keep=versions_cfg["keep"]) if versions_cfg["enabled"] else None
+        self._set_paths(version_dir or (self.versions.current() if self.versions else None))
+        self._swap_lock = RWLock()
+        self._fingerprints = {}
+
+        # The FAISS leg of hybrid search runs here while the caller runs BM25 (both release the GIL
+        # in their heavy parts); one worker per serving thread so concurrent requests don't queue
+        self._hybrid_pool = ThreadPoolExecutor(max_workers=config["serving"]["threads"], thread_name_prefix="hybrid")
+
         print(
             "Created index instance:\n"
-            f"  embedding model: {config['models']['embedding_model']} on {self.device}\n"
-            f"  embedding size: {self.embed_size}\n"
-            f"  max sequence length: {self.max_seq_length}"
+            f"  embedding model: {config['models']['embedding_model']}\n"
+            f"  query encoder backend: {self.query_backend}\n"
+            f"  query batching: {self._encoder_cfg['batching']}\n"
+            f"  lazy loading: {lazy}"
         )
         
-        self._load()
+        if not lazy:
+            self._load_query_model()
+            self._load()
         
         print("_"*50)
 
+    def _load_query_model(self):
+        cfg = self._encoder_cfg
+        model = None
+        if not self.stub and cfg["backend"] != "torch":
+            model = load_query_encoder(self._paths_config["query_encoder"], cfg["backend"],
+                                       cfg["min_parity_cosine"], threads=cfg["threads"])
+        self.query_backend = "stub" if self.stub else (cfg["backend"] if model is not None else "torch")
+        model = model or self.embed_model
+        if cfg["batching"]:
+            self.query_encoder = BatchEncoder(model, max_batch_size=cfg["max_batch_size"], max_wait_ms=cfg["max_wait_ms"])
+        # Set last: other threads check it without the lock
+        self._query_model = model
+        print(f"Loaded query encoder: {self.query_backend} on {model.device} (embedding size {self.embed_size}, "
+              f"max sequence length {self.max_seq_length})")
+
+    @property
+    def query_model(self):
+        """Model encoding search queries (exported int8 or torch), loaded on first use."""
+        if self._query_model is None:
+            with self._load_lock:
+                if self._query_model is None:
+                    self._load_query_model()
+        return self._query_model
+
+    @property
+    def embed_size(self) -> int:
+        return self.query_model.get_sentence_embedding_dimension() #768
+
+    @property
+    def max_seq_length(self) -> int:
+        return self.query_model.get_max_seq_length() #512
+
+    def ensure_loaded(self):
+        """Loads index components if they are not loaded yet (thread-safe)."""
+        if not self._loaded:
+            with self._load_lock:
+                if not self._loaded:
+                    self._load()
+
+    def loaded_components(self) -> dict[str, bool]:
+        return {"query_encoder": self._query_model is not None, "indexes": self._loaded}
+
+    @property
+    def embed_model(self):
+        """Torch SentenceTransformer (film chunk embeddings), loaded on first use."""
+        if self._embed_model is None:
+            with self._load_lock:
+                if self._embed_model is None and self.stub:
+                    self._embed_model = StubEncoder(self._stub_dim)
+                elif self._embed_model is None:
+                    import torch
+                    from sentence_transformers import SentenceTransformer
+                    device = "cuda" if torch.cuda.is_available() else "cpu"
+                    self._embed_model = SentenceTransformer(self.embed_model_name, device=device)
+        return self._embed_model
+
+    def _set_paths(self, version_dir: str | None):
+        resolve = (lambda path: path) if self.versions is None else (lambda path: self.versions.resolve(path, version_dir))
+        self.version_dir = version_dir
+        self.INDEX_NAME = resolve(self._paths_config["faiss_index"])
+        self.FILM_STORE_PATH = resolve(self._paths_config["film_store"])
+        self.FILTER_STORE_PATH = resolve(self._paths_config["filter_store"])
+        self.BM25_PATH = resolve(self._paths_config["bm25_index"])
+        self.MANIFEST_PATH = resolve(self._paths_config["index_manifest"])
+        self.GAZETTEER_PATH = resolve(self._paths_config["person_gazetteer"])
+
+    def _plot_index_path(self, index_type: str | None = None) -> str:
+        index_type = index_type or self.plot_index_type
+        if index_type not in PLOT_INDEX_TAGS:
+            raise ValueError(f"Unknown plot index type: {index_type}. Choose from {PLOT_INDEX_TYPES}")
+        return f"{self.INDEX_NAME}_{PLOT_INDEX_TAGS[index_type]}_plot.ivf"
+
+    def load_plot_index(self, index_type: str | None = None):
+        """Reads plot index of the given type from disk. Returns (index, index_type) or (None, None)."""
+        index_path = self._plot_index_path(index_type)
+        if not os.path.exists(index_path):
+            print(f"No plot_index found by path {index_path}")
+            return None, None
+
+        # Index type is taken from build info (falls back to Flat for indexes built before it existed)
+        index_type = self._plot_index_info(index_type).get("index_type", index_type or self.plot_index_type)
+
+        if index_type == "Binary":
+            index = BinaryRescoreIndex.read(index_path, rescore_factor=self.plot_params["rescore_factor"], mmap=self.mmap_indexes)
+        elif self.mmap_indexes:
+            io_flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+            index = faiss.read_index(index_path, io_flags)
+        else:
+            index = faiss.read_index(index_path)
+        print(f"Loaded plot_index: {index_path} ({index_type}, {index.ntotal:,} vectors)")
+        return index, index_type
+
+    def _plot_index_info(self, index_type: str | None = None) -> dict:
+        """Build info written next to the plot index ({} for indexes built before it existed)."""
+        info_path = self._plot_index_path(index_type) + ".json"
+        if not os.path.exists(info_path):
+            return {}
+        with open(info_path, "r") as f:
+            return json.load(f)
+
+    def _plot_id_scheme(self, index_type: str | None = None) -> str:
+        """Plot index IDs are row_idx; indexes built before that use legacy chunk positions."""
+        return self._plot_index_info(index_type).get("id_scheme", "chunk")
+
+    def encode_queries(self, queries: list[str]) -> np.ndarray:
+        """Encodes search queries into normalized float32 vectors (micro-batched when enabled)."""
+        # Large offline batches are already batched, no need to queue them
+        query_model = self.query_model
+        if self.query_encoder is not None and len(queries) <= self.query_encoder.max_batch_size:
+            return self.query_encoder.encode(queries)
+        return query_model.encode(queries, precision="float32", normalize_embeddings=True)
+
     def _load(self):
         # Reading plot_index (meta search now uses BM25)
-        if os.path.exists(self.INDEX_NAME + "_plot.ivf"):
-            self.plot_index = faiss.read_index(self.INDEX_NAME + "_plot.ivf")
-            print(f"Loaded plot_index: {self.INDEX_NAME + '_plot.ivf'}")
-        else:
-            print(f"No plot_index found by path {self.INDEX_NAME + '_plot.ivf'}")
+        self._load_plot_index()
 
-        # Reading metadata (needed for plot search and BM25 result lookup)
-        if os.path.exists(self.METADATA_PATH):
-            with open(self.METADATA_PATH, "rb") as f:
-                self.metadata = pickle.load(f)
-            print(f"Loaded metadata: {self.METADATA_PATH}")
-        else:
-            print(f"No metadata found by path {self.METADATA_PATH}")
+        # Opening film store (needed for plot search and BM25 result lookup)
+        self._load_film_store()
+
+        # Opening filter store (structured year/genre/rating/person filters)
+        self._load_filter_store()
+
+        # Tombstones of films deleted by incremental updates
+        self._load_tombstones()
 
         # Loading BM25 meta index
         self._load_bm25()
 
+        self._fingerprints = {name: fingerprint(paths) for name, paths in self._component_files().items()}
+        self._loaded = True
+
+    # Swappable components: attributes they set and their loader
+    COMPONENTS = {
+        "plot_index": (("plot_index", "plot_index_type", "plot_id_scheme"), "_load_plot_index"),
+        "film_store": (("film_store",), "_load_film_store"),
+        "filter_store": (("filter_store",), "_load_filter_store"),
+        "bm25": (("bm25_index", "bm25_row_ids", "bm25_segments"), "_load_bm25"),
+        "tombstones": (("live_rows",), "_load_tombstones"),
+    }
+
+    def _component_files(self) -> dict[str, list[str]]:
+        plot_path = self._plot_index_path()
+        return {
+            "plot_index": [plot_path, plot_path + ".json", *BinaryRescoreIndex.files(plot_path)[1:]],
+            "film_store": [self.FILM_STORE_PATH],
+            "filter_store": [self.FILTER_STORE_PATH],
+            "bm25": [self.BM25_PATH],
+            "tombstones": [os.path.join(self.MANIFEST_PATH, "deleted.npy")],
+        }
+
+    def _load_plot_index(self):
+        self.plot_index, index_type = self.load_plot_index()
+        if index_type is not None:
+            self.plot_index_type = index_type
+            self.plot_id_scheme = self._plot_id_scheme()
+
+    def use_plot_index(self, index_type: str) -> bool:
+        """Switches searches to the built plot index of another type (e.g. to evaluate it). False if it is missing."""
+        self.ensure_loaded()
+        index, index_type = self.load_plot_index(index_type)
+        if index is None:
+            return False
+        with self._swap_lock.write():
+            self.plot_index, self.plot_index_type = index, index_type
+            self.plot_id_scheme = self._plot_id_scheme(index_type)
+        return True
+
+    def reload(self) -> list[str]:
+        """
+        Swaps in components whose files changed in the current index version (or in place).
+
+        Changed components are loaded aside while searches go on, then replaced together
+        under the write side of the swap lock; unchanged ones (hard-linked into the new
+        version) and the embedding model stay as they are. Returns names of swapped components.
+        """
+        version_dir = self.versions.current() if self.versions else self.version_dir
+        with self._load_lock:
+            if not self._loaded:
+                # Nothing loaded yet (lazy mode): components are read from the new version on first use
+                with self._swap_lock.write():
+                    self._set_paths(version_dir)
+                print(f"Switched to index version {version_dir} (not loaded yet)")
+                return []
+        staged = copy.copy(self)
+        staged._set_paths(version_dir)
+        new_fingerprints = {name: fingerprint(paths) for name, paths in staged._component_files().items()}
+        changed = [name for name, fp in new_fingerprints.items() if fp != self._fingerprints.get(name)]
+
+        for name in changed:
+            getattr(staged, self.COMPONENTS[name][1])()
+
+        with self._swap_lock.write():
+            self._set_paths(version_dir)
+            for name in changed:
+                for attr in self.COMPONENTS[name][0]:
+                    setattr(self, attr, getattr(staged, attr))
+            self._fingerprints = new_fingerprints
+        print(f"Reloaded index version {version_dir}: {changed or 'no changes'}")
+        return changed
+
+    def _load_film_store(self):
+        if os.path.exists(os.path.join(self.FILM_STORE_PATH, "info.json")):
+            self.film_store = FilmStore(self.FILM_STORE_PATH)
+            print(f"Loaded film store: {self.FILM_STORE_PATH} ({len(self.film_store):,} films)")
+        else:
+            print(f"No film store found by path {self.FILM_STORE_PATH}")
+
+    def _load_filter_store(self):
+        if os.path.exists(os.path.join(self.FILTER_STORE_PATH, "params.json")):
+            self.filter_store = FilterStore(self.FILTER_STORE_PATH)
+            print(f"Loaded filter store: {self.FILTER_STORE_PATH}")
+        else:
+            print(f"No filter store found by path {self.FILTER_STORE_PATH}")
+
+    def _load_tombstones(self):
+        deleted = IndexManifest.load_deleted(self.MANIFEST_PATH)
+        self.live_rows = None if deleted is None or not deleted.any() else ~np.asarray(deleted)
+        if self.live_rows is not None:
+            print(f"Loaded tombstones: {int((~self.live_rows).sum()):,} deleted films")
 
     @staticmethod
     def _tokenize(text: str) -> list[str]:
@@ -129,18 +593,14 @@ class FaissIndex:
 
     def _build_bm25(self):
         """Build BM25 index from meta chunks and save to disk."""
-        if not os.path.exists(self.METADATA_PATH):
-            _, _ = _create_save_metadata()
-
-        with open(self.METADATA_PATH, "rb") as f:
-            metadata = pickle.load(f)
+        if self.film_store is None:
+            if not os.path.exists(os.path.join(self.FILM_STORE_PATH, "info.json")):
+                _create_save_metadata(self.FILM_STORE_PATH, self.MANIFEST_PATH)
+            self._load_film_store()
 
-        corpus_texts = []
-        row_ids = []
-        for item in tqdm(metadata, desc="Collecting meta chunks"):
-            if item["chunk_type"] == "meta":
-                corpus_texts.append(item["chunk_text"])
-                row_ids.append(item["row_idx"])
+        print("Collecting meta chunks...")
+        row_ids = list(range(len(self.film_store))) if self.live_rows is None else np.flatnonzero(self.live_rows).tolist()
+        corpus_texts = [self.film_store.get("meta_text", row) for row in row_ids]
 
         print("Tokenizing corpus...")
         corpus_tokens = bm25s.tokenize(corpus_texts, stopwords="en", show_progress=True)
@@ -149,144 +609,578 @@ class FaissIndex:
         retriever = bm25s.BM25()
         retriever.index(corpus_tokens, show_progress=True)
 
-        os.makedirs(self.BM25_PATH, exist_ok=True)
-        retriever.save(self.BM25_PATH)
-        with open(os.path.join(self.BM25_PATH, "row_ids.pkl"), "wb") as f:
+        # Saved aside and moved in place: the full index covers every live row, so delta segments go away with the old one
+        tmp_path = self.BM25_PATH + ".tmp"
+        if os.path.exists(tmp_path):
+            shutil.rmtree(tmp_path)
+        retriever.save(tmp_path)
+        with open(os.path.join(tmp_path, "row_ids.pkl"), "wb") as f:
             pickle.dump(row_ids, f)
+        if os.path.exists(self.BM25_PATH):
+            shutil.rmtree(self.BM25_PATH)
+        os.replace(tmp_path, self.BM25_PATH)
         print(f"BM25 index saved to {self.BM25_PATH}")
 
         self.bm25_index = retriever
-        self.bm25_row_ids = row_ids
+        self.bm25_row_ids = np.asarray(row_ids, dtype=np.int64)
+        self.bm25_segments = []
+
+    def _build_bm25_segment(self, row_ids: list[int]):
+        """Builds a delta BM25 index over the given (newly appended) rows."""
+        segments_path = os.path.join(self.BM25_PATH, "segments")
+        segment_path = os.path.join(segments_path, f"{len(self._bm25_segment_paths()):04d}")
+        corpus_tokens = bm25s.tokenize([self.film_store.get("meta_text", row) for row in row_ids], stopwords="en", show_progress=False)
+        retriever = bm25s.BM25()
+        retriever.index(corpus_tokens, show_progress=False)
+
+        retriever.save(segment_path + ".tmp")
+        with open(os.path.join(segment_path + ".tmp", "row_ids.pkl"), "wb") as f:
+            pickle.dump(list(row_ids), f)
+        os.replace(segment_path + ".tmp", segment_path)
+        self.bm25_segments.append((retriever, np.asarray(row_ids, dtype=np.int64)))
+        print(f"BM25 segment saved to {segment_path} ({len(row_ids):,} docs)")
+
+    def _bm25_segment_paths(self) -> list[str]:
+        segments_path = os.path.join(self.BM25_PATH, "segments")
+        if not os.path.exists(segments_path):
+            return []
+        return [os.path.join(segments_path, name) for name in sorted(os.listdir(segments_path)) if not name.endswith(".tmp")]
 
     def _load_bm25(self):
-        """Load BM25 index from disk, or build it if missing."""
+        """Load BM25 index from disk (it is built by `index.py build`, never on load)."""
         if not os.path.exists(self.BM25_PATH):
-            print("BM25 index not found, building (this may take a few minutes)...")
-            self._build_bm25()
+            print(f"No BM25 index found by path {self.BM25_PATH}")
             return
 
-        self.bm25_index = bm25s.BM25.load(self.BM25_PATH, load_corpus=False)
+        self.bm25_index = bm25s.BM25.load(self.BM25_PATH, load_corpus=False, mmap=self.mmap_indexes)
         with open(os.path.join(self.BM25_PATH, "row_ids.pkl"), "rb") as f:
-            self.bm25_row_ids = pickle.load(f)
-        print(f"Loaded BM25 index: {self.BM25_PATH} ({len(self.bm25_row_ids):,} docs)")
+            self.bm25_row_ids = np.asarray(pickle.load(f), dtype=np.int64)
+
+        self.bm25_segments = []
+        for segment_path in self._bm25_segment_paths():
+            retriever = bm25s.BM25.load(segment_path, load_corpus=False, mmap=self.mmap_indexes)
+            with open(os.path.join(segment_path, "row_ids.pkl"), "rb") as f:
+                self.bm25_segments.append((retriever, np.asarray(pickle.load(f), dtype=np.int64)))
+        print(f"Loaded BM25 index: {self.BM25_PATH} ({len(self.bm25_row_ids):,} docs, {len(self.bm25_segments)} delta segments)")
+
+    def _format_result(self, row_idx: int, score: float) -> dict:
+        """Search result dict shared by BM25 and FAISS search."""
+        title, plot_text, meta_text = self._get_film_chunk_texts(row_idx)
+        return {
+            "row_idx": row_idx,
+            "score": float(score),
+            "title": title,
+            "plot_text": plot_text.split("Plot: ", 1)[-1],
+            "meta_text": " | ".join(meta_text.split(" | ")[1:]),
+        }
+
+    def _search_bm25_batch(self, queries: list[str], top_k: int, row_mask: np.ndarray | None = None,
+                           backfill: bool = False) -> list[list[dict]]:
+        """
+        BM25 search over meta corpus for all queries in one retrieve call per index segment.
+
+        With row_mask only the allowed films are scored; with backfill (structured filters)
+        queries with no text left or no lexical match get the best known allowed films instead.
+        Hits of delta segments are merged by score (their IDF is approximate until the next full build).
+        """
+        outputs = [[] for _ in queries]
+        text_ids = [i for i, q in enumerate(queries) if (q or "").strip()]
+
+        if text_ids:
+            query_tokens = bm25s.tokenize([queries[i] for i in text_ids], stopwords="en", show_progress=False)
+            hits = [[] for _ in text_ids]
+            for retriever, row_ids in [(self.bm25_index, self.bm25_row_ids), *self.bm25_segments]:
+                weight_mask = None if row_mask is None else row_mask[row_ids].astype(np.float32)
+                results, scores = retriever.retrieve(query_tokens, k=min(top_k, len(row_ids)), show_progress=False, weight_mask=weight_mask)
+                for q_hits, q_results, q_scores in zip(hits, results, scores):
+                    q_hits.extend((float(score), int(row_ids[int(pos)])) for pos, score in zip(q_results, q_scores) if float(score) != 0.0)
+
+            for i, q_hits in zip(text_ids, hits):
+                for score, row_idx in sorted(q_hits, key=lambda hit: -hit[0])[:top_k]:
+                    outputs[i].append(self._format_result(row_idx, score))
+
+        if backfill and row_mask is not None:
+            for output in outputs:
+                if not output:
+                    rows, scores = self.filter_store.top_rows(row_mask, top_k)
+                    output.extend(self._format_result(int(row), score) for row, score in zip(rows, scores))
+
+        return outputs
 
     def _search_bm25(self, query: str, top_k: int) -> list[dict]:
         """BM25 search over meta corpus. Returns same result format as FAISS search."""
-        query_tokens = bm25s.tokenize([query], stopwords="en", show_progress=False)
-        results, scores = self.bm25_index.retrieve(query_tokens, k=top_k)
+        return self._search_bm25_batch([query], top_k, row_mask=self.live_rows)[0]
 
-        output = []
-        for bm25_pos, score in zip(results[0], scores[0]):
-            if float(score) == 0.0:
-                continue
-            row_idx = self.bm25_row_ids[int(bm25_pos)]
-            title, plot_text, meta_text = self._get_film_chunk_texts(row_idx)
-            output.append({
-                "row_idx": row_idx,
-                "score": float(score),
-                "title": title,
-                "plot_text": plot_text.split("Plot: ", 1)[-1],
-                "meta_text": " | ".join(meta_text.split(" | ")[1:]),
-            })
+    def _plot_id_selector(self, row_mask: np.ndarray):
+        """faiss bitmap selector over plot index IDs of the allowed films."""
+        ids = self._row_to_plot_id(np.flatnonzero(row_mask))
+        bits = np.zeros(self._row_to_plot_id(len(row_mask)), dtype=bool)
+        bits[ids] = True
+        bitmap = np.packbits(bits, bitorder="little")
+        sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+        sel.referenced_objects = [bitmap]
+        # BinaryRescoreIndex checks membership of many IDs at once on the bitmap itself
+        sel.bitmap_array = bitmap
+        return sel
+
+    def _search_plot_batch(self, embed_queries: np.ndarray, top_k: int,
+                           nprobe: int | None = None, ef_search: int | None = None,
+                           row_mask: np.ndarray | None = None) -> list[list[dict]]:
+        """FAISS search over plot index for a (n_queries, embed_size) matrix in one call."""
+        sel = None if row_mask is None else self._plot_id_selector(row_mask)
+        params = self._plot_search_params(self.plot_index_type, nprobe=nprobe, ef_search=ef_search, sel=sel)
+        scores, indices = self.plot_index.search(embed_queries, top_k, params=params)
+
+        outputs = []
+        for q_scores, q_indices in zip(scores, indices):
+            output = []
+            for score, idx in zip(q_scores, q_indices):
+                if idx == -1:
+                    continue
+                output.append(self._format_result(self._plot_id_to_row(idx), score))
+            outputs.append(output)
 
-        return output
+        return outputs
 
     def _get_film_chunk_texts(self, row_idx: int) -> tuple[str, str, str]:
-        """
-        Returns (title, plot_text, meta_text) for a given film row_idx.
+        """Returns (title, plot_text, meta_text) for a given film row_idx, sliced lazily from the film store."""
+        return self.film_store.row(row_idx)
 
-        Assumption: metadata was created in _create_save_metadata() in order:
-        meta chunk first, then plot chunk, for each row_idx.
-        """
-        meta_i = row_idx * 2
-        plot_i = row_idx * 2 + 1
-        meta = self.metadata[meta_i]
-        plot = self.metadata[plot_i]
-        
-        # Prefer title from meta (same as plot), but keep robust.
-        title = meta.get("title") or plot.get("title") or ""
-        return title, plot.get("chunk_text", ""), meta.get("chunk_text", "")  
+    def _plot_id_to_row(self, plot_id: int) -> int:
+        return int(_plot_ids_to_rows(plot_id, self.plot_id_scheme))
+
+    def _row_to_plot_id(self, row_idx):
+        return _rows_to_plot_ids(row_idx, self.plot_id_scheme)
     
-    def _build_plot(self, index_path: str | None = None):
+    def _plot_search_params(self, index_type: str, nprobe: int | None = None, ef_search: int | None = None, sel=None):
+        """Search-time parameters for plot indexes (None for the exact Flat index without ID selector)."""
+        kwargs = {} if sel is None else {"sel": sel}
+        if index_type in ("IVFFlat", "IVFPQ"):
+            return faiss.SearchParametersIVF(nprobe=nprobe or self.plot_params["nprobe"], **kwargs)
+        if index_type == "HNSW":
+            return faiss.SearchParametersHNSW(efSearch=ef_search or self.plot_params["ef_search"], **kwargs)
+        if index_type == "Binary":
+            return BinarySearchParameters(**kwargs) if kwargs else None
+        # Flat and scalar quantized indexes
+        return faiss.SearchParameters(**kwargs) if kwargs else None
+
+    def _build_plot(self, index_path: str | None = None, index_type: str | None = None):
         
+        index_type = index_type or self.plot_index_type
         if index_path is None:
-            index_path = self.INDEX_NAME + "_plot.ivf"
+            index_path = self._plot_index_path(index_type)
 
-        # Ensure metadata exists in memory (full chunk list)
-        if not os.path.exists(self.METADATA_PATH):
-            _, _ = _create_save_metadata()
-    
-        # Reload metadata as well (for runtime consistency)
-        with open(self.METADATA_PATH, "rb") as f:
-            self.metadata = pickle.load(f)
+        # Ensure film store exists (needed to resolve search results)
+        if not os.path.exists(os.path.join(self.FILM_STORE_PATH, "info.json")):
+            _create_save_metadata(self.FILM_STORE_PATH, self.MANIFEST_PATH)
+        self._load_film_store()
     
         print("Loading embeddings (plot only)...")
+        factory = _plot_index_factory(index_type, self.plot_params)
+        batch_size = 50000
         with h5py.File(self.EMBED_PATH, "r") as hf:
-            emb_ds = hf["embeddings"]
-            n_total = emb_ds.shape[0]
+            n_total = _n_embedded_rows(hf)
+            if n_total != len(self.film_store):
+                print(f"WARNING: {self.EMBED_PATH} has plot embeddings of {n_total:,} films, film store {len(self.film_store):,}")
+
+            # Plot index IDs are row_idx
+            def plot_batches():
+                for i in tqdm(range(0, n_total, batch_size)):
+                    end = min(i + batch_size, n_total)
+                    yield _read_embeddings(hf, slice(i, end)), np.arange(i, end, dtype=np.int64)
+
+            if index_type == "Binary":
+                print(f"Adding plot embeddings as sign bits + float16 rescoring vectors (batch_size={batch_size})...")
+                index = BinaryRescoreIndex.build(index_path, self.embed_size, n_total, plot_batches(),
+                                                 rescore_factor=self.plot_params["rescore_factor"])
+                self._write_plot_info(index_path, index_type, factory, index.ntotal)
+                print(f"Successfully built plot-only index! vectors: {index.ntotal} (plot chunks)")
+                return
 
             # Creating base index
-            base_index = faiss.IndexFlatIP(self.embed_size)
+            base_index = faiss.index_factory(self.embed_size, factory, faiss.METRIC_INNER_PRODUCT)
+            if index_type == "HNSW":
+                faiss.downcast_index(base_index).hnsw.efConstruction = self.plot_params["ef_construction"]
             index = faiss.IndexIDMap2(base_index)
 
-            batch_size = 50000
+            # IVF indexes need coarse quantizer (and PQ codebooks) trained before adding, SQ8 needs value ranges
+            if not index.is_trained:
+                train_emb = _sample_plot_embeddings(hf, self.plot_params["train_size"])
+                print(f"Training {index_type} ({factory}) on {len(train_emb):,} plot vectors...")
+                index.train(train_emb)
 
             print(f"Adding plot embeddings with original IDs (batch_size={batch_size})...")
-
-            for i in tqdm(range(1, n_total, 2 * batch_size)):
-                end = min(i + batch_size * 2, n_total)
-                
-                batch_emb = emb_ds[i:end:2].astype("float32")
-                batch_ids = np.arange(i, end, 2, dtype=np.int64)
-
+            for batch_emb, batch_ids in plot_batches():
                 index.add_with_ids(batch_emb, batch_ids)
 
         print(f"Saving plot-only index to: {index_path}")
-        faiss.write_index(index, index_path)
+        faiss.write_index(index, index_path + ".tmp")
+        os.replace(index_path + ".tmp", index_path)
+        self._write_plot_info(index_path, index_type, factory, index.ntotal)
         print(f"Successfully built plot-only index! vectors: {index.ntotal} (plot chunks)")
     
-    def build(self):
+    def _write_plot_info(self, index_path: str, index_type: str, factory: str, ntotal: int, id_scheme: str = "row"):
+        with open(index_path + ".json.tmp", "w") as f:
+            json.dump({"index_type": index_type, "factory": factory, "params": self.plot_params, "ntotal": int(ntotal),
+                       "id_scheme": id_scheme, "stub": self.stub}, f, indent=2)
+        os.replace(index_path + ".json.tmp", index_path + ".json")
+
+    def _check_not_real_indexes(self):
+        """Refuses to write stub-embedder vectors over plot indexes built with the real embedding model."""
+        if not self.stub:
+            return
+        for index_type in PLOT_INDEX_TYPES:
+            info = self._plot_index_info(index_type)
+            # Indexes built before the flag was recorded are real ones
+            if os.path.exists(self._plot_index_path(index_type)) and not info.get("stub", False):
+                raise RuntimeError(f"ERROR: {self._plot_index_path(index_type)} was built with {self.embed_model_name}, "
+                                   "refusing to overwrite it with stub-model indexes.\n  Point paths.index_root and the "
+                                   "index paths under it at a scratch directory.")
+
+    def plot_index_memory(self, index_type: str) -> dict:
+        """Size of the plot index in RAM (when not memory-mapped) and on disk, MB."""
+        index_path = self._plot_index_path(index_type)
+        if index_type == "Binary":
+            ram_files, disk_files = BinaryRescoreIndex.ram_files(index_path), BinaryRescoreIndex.files(index_path)
+        else:
+            ram_files = disk_files = [index_path]
+        size_mb = lambda files: sum(os.path.getsize(f) for f in files) / 2**20
+        return {"ram_mb": size_mb(ram_files), "disk_mb": size_mb(disk_files)}
+
+    def _drop_components(self):
+        """
+        Removes all index components of this version (in a cloned version only its hard links,
+        the previous version keeps its files) and forgets the loaded ones.
+        """
+        paths = [self.FILM_STORE_PATH, self.MANIFEST_PATH, self.FILTER_STORE_PATH, self.BM25_PATH, self.GAZETTEER_PATH]
+        for index_type in PLOT_INDEX_TYPES:
+            plot_path = self._plot_index_path(index_type)
+            paths += [plot_path, plot_path + ".json", *BinaryRescoreIndex.files(plot_path)[1:]]
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            elif os.path.exists(path):
+                os.remove(path)
+
+        self.plot_index = None
+        self.film_store = None
+        self.filter_store = None
+        self.bm25_index, self.bm25_row_ids, self.bm25_segments = None, None, []
+        self.live_rows = None
+
+    def build(self, index_types: list[str] | None = None):
+        """
+        Full rebuild from the prepared film data. The film store, manifest, filter store, person
+        gazetteer, BM25 and the plot indexes of index_types (default: plot_index.index_type) all come from one
+        read of the data, so their row_idx agree. Existing components are dropped first, plot
+        indexes of other types included (their rows would no longer match). Embeddings are kept
+        where the texts are unchanged.
+        """
+        self._check_not_real_indexes()
+        self._drop_components()
+
+        print("Reading prepared film data...")
+        columns = list(dict.fromkeys(["title", "release_info", "title_plot", "title_meta", *FilterStore.COLUMNS]))
+        data = read_film_data(self.FILM_PREP_PATH, columns=columns)
+        chunk_texts = _create_save_metadata(self.FILM_STORE_PATH, self.MANIFEST_PATH, self.chunk_types, data=data)
+        self._load_film_store()
+
         print("Creating BM25 meta index...")
         self._build_bm25()
 
-        plot_path = self.INDEX_NAME + "_plot.ivf"
-        if os.path.exists(plot_path):
-            print(f"Plot index already exists at {plot_path}, skipping.")
-        else:
-            if not os.path.exists(self.EMBED_PATH):
-                _create_embeddings(self.embed_model)
-            print("Creating plot index...")
-            self._build_plot()
+        print("Creating filter store...")
+        FilterStore.build_from_data(data, self.FILTER_STORE_PATH, **self.filter_params)
+        self._load_filter_store()
+
+        print("Creating person gazetteer...")
+        build_gazetteer_from_data(data, self.GAZETTEER_PATH, self.min_person_films)
+
+        _create_embeddings(self.embed_model, chunk_texts, self.EMBED_PATH)
+        for index_type in index_types or [self.plot_index_type]:
+            print(f"Creating {index_type} plot index...")
+            self._build_plot(index_type=index_type)
+
+    def _append_embeddings(self, chunk_embs: dict[str, np.ndarray], n_rows: int):
+        """Appends {chunk type: embeddings} of new films to the H5 file, so later full index builds include them."""
+        with h5py.File(self.EMBED_PATH, "a") as hf:
+            if any(chunk_type not in hf or hf[chunk_type].maxshape[0] is not None or hf[chunk_type].shape[0] != n_rows
+                   for chunk_type in chunk_embs):
+                print(f"WARNING: {self.EMBED_PATH} has the legacy layout, is not extendable or out of sync with "
+                      "the film store, new embeddings are only added to plot indexes")
+                return
+            for chunk_type, embs in chunk_embs.items():
+                dset = hf[chunk_type]
+                stored, scales = _quantize_embeddings(embs, dset.dtype.name)
+                dset.resize(n_rows + len(stored), axis=0)
+                dset[n_rows:] = stored
+                if scales is not None:
+                    hf[f"{chunk_type}_scales"].resize(n_rows + len(scales), axis=0)
+                    hf[f"{chunk_type}_scales"][n_rows:] = scales
+                dset.attrs["n_done"] = n_rows + len(stored)
+
+    def _add_to_plot_indexes(self, plot_embs: np.ndarray, rows: np.ndarray):
+        """Adds plot vectors of rows to every built plot index type; each index file is replaced atomically."""
+        for index_type in PLOT_INDEX_TYPES:
+            index_path = self._plot_index_path(index_type)
+            if not os.path.exists(index_path):
+                continue
+            id_scheme = self._plot_id_scheme(index_type)
+            plot_ids = _rows_to_plot_ids(np.asarray(rows, dtype=np.int64), id_scheme)
+            print(f"Adding {len(plot_ids):,} vectors to {index_path}...")
+            if index_type == "Binary":
+                index = BinaryRescoreIndex.read(index_path, rescore_factor=self.plot_params["rescore_factor"], mmap=False)
+                index.add_with_ids(plot_embs, plot_ids)
+                index.write(index_path)
+            else:
+                index = faiss.read_index(index_path)
+                index.add_with_ids(plot_embs, plot_ids)
+                faiss.write_index(index, index_path + ".tmp")
+                os.replace(index_path + ".tmp", index_path)
+
+            info = self._plot_index_info(index_type)
+            if info:
+                self._write_plot_info(index_path, info["index_type"], info["factory"], index.ntotal, id_scheme=id_scheme)
+
+    def update(self, film_data_path: str | None = None):
+        """
+        Incrementally updates all indexes to new prepared film data.
+
+        Films are matched by stable key (title + release info): only new films and films
+        with changed texts are embedded and appended (new row_idx) to the film store, plot
+        indexes and a delta BM25 segment; deleted and changed films are tombstoned. Filter
+        columns and the person gazetteer are rewritten for all rows. Running servers pick the update up on /reload.
+        """
+        film_data_path = film_data_path or self.FILM_PREP_PATH
+        if not IndexManifest.exists(self.MANIFEST_PATH):
+            raise FileNotFoundError(f"ERROR: No index manifest at {self.MANIFEST_PATH}!\n  Run a full build firstly.")
+        self._check_not_real_indexes()
+        manifest = IndexManifest.load(self.MANIFEST_PATH)
+        self._load_film_store()
+        if len(self.film_store) != len(manifest):
+            raise RuntimeError(f"Film store has {len(self.film_store):,} rows, manifest {len(manifest):,}: "
+                               "a previous update was interrupted, run a full build.")
+
+        data = read_film_data(film_data_path, columns=["title", "title_plot", "title_meta", *FilterStore.COLUMNS])
+        titles = data["title"].astype(str).tolist()
+        plot_texts = data["title_plot"].astype(str).tolist()
+        meta_texts = data["title_meta"].astype(str).tolist()
+        keys = film_keys(titles, data["release_info"].tolist())
+        hashes = text_hashes(plot_texts, meta_texts)
+
+        data_rows, new_positions, deleted_rows = manifest.diff(keys, hashes)
+        print(f"Update: {len(new_positions):,} new or changed films, {len(deleted_rows):,} deleted, "
+              f"{len(data) - len(new_positions):,} unchanged")
+
+        n_rows = len(manifest)
+        data_rows = manifest.apply(data_rows, new_positions, deleted_rows, keys, hashes)
+        new_rows = data_rows[new_positions]
+
+        if len(new_positions):
+            FilmStore.append(self.FILM_STORE_PATH, {
+                "title": [titles[i] for i in new_positions],
+                "plot_text": [plot_texts[i] for i in new_positions],
+                "meta_text": [meta_texts[i] for i in new_positions],
+            })
+            self._load_film_store()
+
+            # Only the configured chunk types are embedded, plot chunks are indexed
+            texts = {"meta": meta_texts, "plot": plot_texts}
+            chunk_embs = {}
+            for chunk_type in self.chunk_types:
+                chunk_texts = [texts[chunk_type][i] for i in new_positions]
+                print(f"Embedding {len(chunk_texts):,} {chunk_type} chunks...")
+                chunk_embs[chunk_type] = self.embed_model.encode(chunk_texts, batch_size=self.embed_batch_size, show_progress_bar=True,
+                                                                 precision='float32', normalize_embeddings=True)
+            self._append_embeddings(chunk_embs, n_rows)
+            self._add_to_plot_indexes(chunk_embs["plot"], new_rows)
+
+        # Filter columns are cheap to rebuild: data rows placed at their row_idx, tombstoned rows left empty
+        positions = np.full(len(manifest), -1, dtype=np.int64)
+        positions[data_rows] = np.arange(len(data))
+        aligned = data.reindex(positions).reset_index(drop=True)
+        for column in ("genres", "directors", "cast"):
+            aligned[column] = aligned[column].apply(lambda v: v if isinstance(v, list) else [])
+        FilterStore.build_from_data(aligned, self.FILTER_STORE_PATH, **self.filter_params)
+        self._load_filter_store()
+        build_gazetteer_from_data(data, self.GAZETTEER_PATH, self.min_person_films)
+
+        self.live_rows = None if not manifest.deleted.any() else ~manifest.deleted
+        if self.bm25_index is None:
+            self._load_bm25()
+        if self.bm25_index is None or len(self._bm25_segment_paths()) >= self.max_bm25_segments:
+            print(f"Merging {len(self.bm25_segments)} BM25 segments into a full rebuild...")
+            self._build_bm25()
+        elif len(new_rows):
+            self._build_bm25_segment(new_rows.tolist())
+
+        # Manifest goes last: an interrupted update leaves the film store longer than it and is detected
+        manifest.save(self.MANIFEST_PATH)
+        self._load_plot_index()
+        print(f"Update done: {len(manifest):,} rows, {int(manifest.deleted.sum()):,} tombstoned")
+
+    def bench_plot(self, queries: list[str], index_type: str, k: int = 20,
+                   nprobe: int | None = None, ef_search: int | None = None) -> dict:
+        """Measures recall@k of the given plot index against the exact Flat index, per-query latency and memory."""
+        exact_index, _ = self.load_plot_index("Flat")
+        approx_index, approx_type = self.load_plot_index(index_type)
+        assert exact_index is not None and approx_index is not None, "Build both Flat and tested plot indexes first!"
+
+        embed_queries = self.encode_queries(queries)
+        params = self._plot_search_params(approx_type, nprobe=nprobe, ef_search=ef_search)
+        # Indexes built at different times may use different ID schemes, so results are compared as rows
+        exact_scheme, approx_scheme = self._plot_id_scheme("Flat"), self._plot_id_scheme(index_type)
+
+        recalls, latencies = [], []
+        for q in embed_queries:
+            _, exact_ids = exact_index.search(q[None, :], k)
+            start = time.perf_counter()
+            _, approx_ids = approx_index.search(q[None, :], k, params=params)
+            latencies.append(time.perf_counter() - start)
+            exact_set = set(_plot_ids_to_rows(exact_ids[0][exact_ids[0] != -1], exact_scheme).tolist())
+            approx_set = set(_plot_ids_to_rows(approx_ids[0][approx_ids[0] != -1], approx_scheme).tolist())
+            if exact_set:
+                recalls.append(len(exact_set & approx_set) / len(exact_set))
+
+        latencies_ms = np.array(latencies) * 1000
+        return {
+            "index_type": approx_type,
+            f"recall@{k}": float(np.mean(recalls)) if recalls else 0.0,
+            "latency_mean_ms": float(latencies_ms.mean()),
+            "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+            **self.plot_index_memory(approx_type),
+        }
     
-    def search(self, type: Literal["meta", "plot"], query: str, top_k: int):
+    def _fuse(self, bm25_results: list[dict], plot_results: list[dict], top_k: int) -> list[dict]:
+        """Fuses two result lists of one query by reciprocal rank or by weighted min-max normalized scores."""
+        weights = {"bm25": self.hybrid_params["bm25_weight"], "plot": self.hybrid_params["plot_weight"]}
+        fused, items = {}, {}
+        for leg, results in (("bm25", bm25_results), ("plot", plot_results)):
+            if not results:
+                continue
+            scores = [r["score"] for r in results]
+            lo, hi = min(scores), max(scores)
+            for rank, r in enumerate(results):
+                if self.hybrid_params["fusion"] == "rrf":
+                    contribution = weights[leg] / (self.hybrid_params["rrf_k"] + rank + 1)
+                else:
+                    contribution = weights[leg] * ((r["score"] - lo) / (hi - lo) if hi > lo else 1.0)
+                fused[r["row_idx"]] = fused.get(r["row_idx"], 0.0) + contribution
+                items.setdefault(r["row_idx"], r)
+
+        ranked = sorted(fused.items(), key=lambda kv: -kv[1])[:top_k]
+        return [{**items[row_idx], "score": score} for row_idx, score in ranked]
+
+    def _search_hybrid_batch(self, queries: list[str], embed_queries: np.ndarray | None, top_k: int,
+                             nprobe: int | None = None, ef_search: int | None = None,
+                             row_mask: np.ndarray | None = None, backfill: bool = False,
+                             timings: dict | None = None) -> list[list[dict]]:
+        """Runs the FAISS leg on the hybrid pool and BM25 on the calling thread, then fuses their results per query."""
+        n_candidates = max(top_k, self.hybrid_params["candidates"])
+
+        def timed(func, *args, **kwargs):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            return result, time.perf_counter() - start
+
+        def plot_leg():
+            # Encoding is part of the plot leg so it overlaps with BM25 as well
+            embs = embed_queries if embed_queries is not None else self.encode_queries(queries)
+            return self._search_plot_batch(embs, n_candidates, nprobe=nprobe, ef_search=ef_search, row_mask=row_mask)
+
+        plot_future = self._hybrid_pool.submit(timed, plot_leg)
+        bm25_outputs, bm25_seconds = timed(self._search_bm25_batch, queries, n_candidates, row_mask=row_mask, backfill=backfill)
+        plot_outputs, plot_seconds = plot_future.result()
+
+        start = time.perf_counter()
+        outputs = [self._fuse(b, p, top_k) for b, p in zip(bm25_outputs, plot_outputs)]
+        if timings is not None:
+            timings["bm25"] = bm25_seconds
+            timings["plot"] = plot_seconds
+            timings["fusion"] = time.perf_counter() - start
+        return outputs
+
+    def _filter_mask(self, filters: dict | None) -> np.ndarray | None:
+        if not filters:
+            return None
+        if self.filter_store is None:
+            print("WARNING: filters are ignored, no filter store loaded")
+            return None
+        return self.filter_store.mask(filters)
+
+    def _row_mask(self, filter_mask: np.ndarray | None) -> np.ndarray | None:
+        """Allowed rows: filter mask without tombstoned films."""
+        if self.live_rows is None:
+            return filter_mask
+        return self.live_rows if filter_mask is None else filter_mask & self.live_rows
+
+    def search_batch(self, type: Literal["meta", "plot", "hybrid"], queries: list[str] | None, top_k: int,
+                     nprobe: int | None = None, ef_search: int | None = None,
+                     query_embs: np.ndarray | None = None, filters: dict | None = None,
+                     timings: dict | None = None) -> list[list[dict]]:
+        """
+        Searches many queries at once: one BM25 retrieve call for meta, one encode
+        and one FAISS search call for plot. Returns a result list per query.
+
+        For plot search precomputed query_embs (n_queries, embed_size) can be passed instead of queries.
+        filters (as from FilterStore.parse) restrict results to matching films for every query.
+        Hybrid search runs both and fuses them; per-leg seconds are written into timings if given.
+        """
+        # Loaded before taking the read lock: reload() takes the swap lock inside the load lock,
+        # so the opposite order here could deadlock with it
+        self.ensure_loaded()
+        # Index components are swapped by reload() only between searches
+        with self._swap_lock.read():
+            return self._search_batch(type, queries, top_k, nprobe=nprobe, ef_search=ef_search,
+                                      query_embs=query_embs, filters=filters, timings=timings)
+
+    def _search_batch(self, type: Literal["meta", "plot", "hybrid"], queries: list[str] | None, top_k: int,
+                      nprobe: int | None = None, ef_search: int | None = None,
+                      query_embs: np.ndarray | None = None, filters: dict | None = None,
+                      timings: dict | None = None) -> list[list[dict]]:
+        filter_mask = self._filter_mask(filters)
+        row_mask = self._row_mask(filter_mask)
+
+        if type == "hybrid":
+            assert self.bm25_index is not None, "No BM25 index!"
+            assert self.plot_index is not None, "No plot_index file!"
+            if not queries:
+                return []
+            embed_queries = None if query_embs is None else np.asarray(query_embs, dtype="float32").reshape(-1, self.embed_size)
+            return self._search_hybrid_batch(queries, embed_queries, top_k, nprobe=nprobe, ef_search=ef_search,
+                                             row_mask=row_mask, backfill=filter_mask is not None, timings=timings)
+
         if type == "meta":
-            if self.bm25_index is None:
-                self._load_bm25()
-            return self._search_bm25(query, top_k)
+            assert self.bm25_index is not None, "No BM25 index!"
+            if not queries:
+                return []
+            return self._search_bm25_batch(queries, top_k, row_mask=row_mask, backfill=filter_mask is not None)
 
         elif type == "plot":
-            if self.plot_index is None:
-                self._load()
             assert self.plot_index is not None, "No plot_index file!"
 
-            embed_query = self.embed_model.encode([query], precision="float32", normalize_embeddings=True)
-            scores, indices = self.plot_index.search(embed_query, top_k)
+            if query_embs is not None:
+                embed_queries = np.asarray(query_embs, dtype="float32").reshape(-1, self.embed_size)
+            elif queries:
+                embed_queries = self.encode_queries(queries)
+            else:
+                return []
+            return self._search_plot_batch(embed_queries, top_k, nprobe=nprobe, ef_search=ef_search, row_mask=row_mask)
 
-            results = []
-            for score, idx in zip(scores[0], indices[0]):
-                if idx == -1:
-                    continue
-                item = self.metadata[idx]
-                title, plot_text, meta_text = self._get_film_chunk_texts(item["row_idx"])
-                results.append({
-                    "row_idx": item["row_idx"],
-                    "score": float(score),
-                    "title": title,
-                    "plot_text": plot_text.split("Plot: ", 1)[-1],
-                    "meta_text": " | ".join(meta_text.split(" | ")[1:]),
-                })
-
-            return results
+        raise ValueError(f"Unknown search type: {type}")
+
+    def search(self, type: Literal["meta", "plot", "hybrid"], query: str | None, top_k: int,
+               nprobe: int | None = None, ef_search: int | None = None,
+               query_emb: np.ndarray | None = None, filters: dict | None = None,
+               timings: dict | None = None):
+        """
+        Searches meta (BM25), plot (FAISS) or both (hybrid) indexes.
+
+        For plot search a precomputed query_emb (normalized, as from encode_queries)
+        can be passed to skip encoding the query again.
+        """
+        query_embs = None if query_emb is None else np.asarray(query_emb).reshape(1, -1)
+        return self.search_batch(type, [query], top_k, nprobe=nprobe, ef_search=ef_search,
+                                 query_embs=query_embs, filters=filters, timings=timings)[0]
 
 if __name__ == "__main__":
     #Adding parser for different index functions
@@ -295,15 +1189,60 @@ if __name__ == "__main__":
     
     #Subparser for "build"
     build_parser = func_subparsers.add_parser("build", help="Builds FAISS search index")
+    build_parser.add_argument("--index-type", choices=PLOT_INDEX_TYPES, nargs="+", default=None,
+                              help="Plot index types to build (default: plot_index.index_type from config)")
+
+    #Subparser for "update"
+    update_parser = func_subparsers.add_parser("update", help="Incrementally updates built indexes to new prepared film data")
+    update_parser.add_argument("--film-data", default=None, help="Prepared film data (default: paths.film_data from config)")
     
     #Subparser for "search"
     search_parser = func_subparsers.add_parser("search", help="Run in CLI mode to search for some queries")
+    search_parser.add_argument("--nprobe", type=int, default=None, help="IVF lists to visit (IVFFlat/IVFPQ)")
+    search_parser.add_argument("--ef-search", type=int, default=None, help="HNSW search depth")
+
+    #Subparser for "bench"
+    bench_parser = func_subparsers.add_parser("bench", help="Compares recall@k, latency and memory of a plot index against the Flat one")
+    bench_parser.add_argument("--index-type", choices=PLOT_INDEX_TYPES, required=True)
+    bench_parser.add_argument("--queries", default="data/prep/output.csv", help="CSV with one query per line")
+    bench_parser.add_argument("--k", type=int, default=20)
+    bench_parser.add_argument("--nprobe", type=int, nargs="*", default=[None], help="nprobe values to sweep")
+    bench_parser.add_argument("--ef-search", type=int, nargs="*", default=[None], help="efSearch values to sweep")
     
     args = parser.parse_args()
     
-    if args.func == "build":
+    if args.func in ("build", "update"):
+        #Builds and updates go into a new index version, published only once it is complete
+        config = _load_config()
+        versions = None
+        if config["index_versions"]["enabled"]:
+            index_root = _index_paths(config, config["benchmark"]["stub_models"])["index_root"]
+            versions = IndexVersions(index_root, keep=config["index_versions"]["keep"])
+        version_dir = versions.create() if versions else None
+
+        # A full build drops everything cloned into the new version, so nothing is loaded up front
+        faiss_index = FaissIndex(version_dir=version_dir, lazy=args.func == "build")
+        if args.func == "build":
+            faiss_index.build(index_types=args.index_type)
+        else:
+            faiss_index.update(film_data_path=args.film_data)
+
+        if versions:
+            versions.publish(version_dir)
+
+    elif args.func == "bench":
         faiss_index = FaissIndex()
-        faiss_index.build()
+        queries = pd.read_csv(args.queries, header=None, names=["query"])["query"].dropna().tolist()
+        with h5py.File(faiss_index.EMBED_PATH, "r") as hf:
+            chunk_types = [t for t in CHUNK_TYPES if t in hf] or ["embeddings"]
+            print(f"Embeddings: {', '.join(f'{t} {hf[t].dtype}' for t in chunk_types)}, "
+                  f"{os.path.getsize(faiss_index.EMBED_PATH) / 2**20:.1f} MB")
+        print('='*65)
+        for nprobe in args.nprobe:
+            for ef_search in args.ef_search:
+                res = faiss_index.bench_plot(queries, args.index_type, k=args.k, nprobe=nprobe, ef_search=ef_search)
+                print(f"nprobe={nprobe} efSearch={ef_search}: {res}")
+        print('='*65)
     
     elif args.func == "search":
         faiss_index = FaissIndex()
@@ -311,7 +1250,7 @@ if __name__ == "__main__":
         while not quit:
             type_ = input("Type: ")
             query = input("Query: ")
-            res = faiss_index.search(type_, query, top_k=10)
+            res = faiss_index.search(type_, query, top_k=10, nprobe=args.nprobe, ef_search=args.ef_search)
             
             print('='*65)
             for item in res:
@@ -0,0 +1,141 @@
+import os
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+
+
+class IndexVersions:
+    """
+    Versioned index directories: `{root}/versions/{version}/` hold complete index sets,
+    `{root}/current` is a relative symlink to the active one and is switched atomically.
+
+    Config paths under root (e.g. "indexes/film_store") are resolved inside a version.
+    A new version starts as a clone of the current one: files are hard-linked (writers
+    replace files instead of rewriting them), the append-only film store is copied.
+    """
+    COPIED_DIRS = ("film_store",)
+
+    def __init__(self, root: str, keep: int = 3):
+        self.root = root
+        self.keep = keep
+        self.versions_path = os.path.join(root, "versions")
+        self.current_path = os.path.join(root, "current")
+
+    def current(self) -> str | None:
+        """Directory of the active version, None for the legacy flat layout."""
+        if not os.path.islink(self.current_path):
+            return None
+        return os.path.join(self.root, os.readlink(self.current_path))
+
+    def resolve(self, path: str, version_dir: str | None) -> str:
+        """Relocates a config path under root into version_dir (unchanged for other paths)."""
+        if version_dir is None:
+            return path
+        rel_path = os.path.relpath(path, self.root)
+        if rel_path.startswith(os.pardir):
+            return path
+        return os.path.join(version_dir, rel_path)
+
+    def create(self) -> str:
+        """Creates a new version cloned from the current one (or from the legacy layout in root)."""
+        source = self.current()
+        if source is None:
+            source = self.root
+            entries = [e for e in os.listdir(source) if e not in ("versions", "current")] if os.path.exists(source) else []
+        else:
+            entries = os.listdir(source)
+
+        version_dir = os.path.join(self.versions_path, time.strftime("%Y%m%d-%H%M%S"))
+        while os.path.exists(version_dir):
+            version_dir += "_"
+        os.makedirs(version_dir)
+        for entry in entries:
+            src, dst = os.path.join(source, entry), os.path.join(version_dir, entry)
+            copy_function = shutil.copy2 if entry in self.COPIED_DIRS else os.link
+            if os.path.isdir(src):
+                shutil.copytree(src, dst, copy_function=copy_function)
+            else:
+                copy_function(src, dst)
+        print(f"Created index version {version_dir} (cloned from {source})")
+        return version_dir
+
+    def publish(self, version_dir: str):
+        """Atomically points `current` to version_dir and prunes old versions."""
+        tmp_path = self.current_path + ".tmp"
+        if os.path.lexists(tmp_path):
+            os.remove(tmp_path)
+        os.symlink(os.path.relpath(version_dir, self.root), tmp_path)
+        os.replace(tmp_path, self.current_path)
+        print(f"Published index version {version_dir}")
+        self.prune()
+
+    def prune(self):
+        """Removes all but the newest `keep` versions (never the current one)."""
+        if not os.path.exists(self.versions_path):
+            return
+        current = self.current()
+        versions = sorted(os.listdir(self.versions_path))
+        for version in versions[:-self.keep] if self.keep else versions:
+            version_dir = os.path.join(self.versions_path, version)
+            if current is None or not os.path.samefile(version_dir, current):
+                shutil.rmtree(version_dir)
+
+
+def resolve_current(config: dict, path: str) -> str:
+    """Resolves a config path inside the current index version (if index versions are enabled)."""
+    if not config["index_versions"]["enabled"]:
+        return path
+    versions = IndexVersions(config["paths"]["index_root"])
+    return versions.resolve(path, versions.current())
+
+def fingerprint(paths: list[str]) -> tuple:
+    """Identity of files under paths (inode, size, mtime): equal for hard-linked, unchanged files."""
+    entries = []
+    for path in paths:
+        if os.path.isdir(path):
+            files = [os.path.join(d, f) for d, _, names in os.walk(path) for f in names]
+        else:
+            files = [path] if os.path.exists(path) else []
+        for file in sorted(files):
+            stat = os.stat(file)
+            entries.append((os.path.relpath(file, os.path.dirname(path)), stat.st_ino, stat.st_size, stat.st_mtime_ns))
+    return tuple(entries)
+
+
+class RWLock:
+    """Reader/writer lock: searches share it, index swaps take it exclusively (waiting writers go first)."""
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._writers_waiting = 0
+
+    @contextmanager
+    def read(self):
+        with self._cond:
+            while self._writer or self._writers_waiting:
+                self._cond.wait()
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._readers -= 1
+                if not self._readers:
+                    self._cond.notify_all()
+
+    @contextmanager
+    def write(self):
+        with self._cond:
+            self._writers_waiting += 1
+            while self._writer or self._readers:
+                self._cond.wait()
+            self._writers_waiting -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._writer = False
+                self._cond.notify_all()
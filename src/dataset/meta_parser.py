@@ -0,0 +1,232 @@
+import os, re, argparse
+import yaml, pickle
+import pandas as pd
+from collections import Counter
+
+try:
+    from .film_data import read_film_data
+    from .index_versions import resolve_current
+except ImportError:
+    from film_data import read_film_data
+    from index_versions import resolve_current
+
+#Genre aliases -> genre names used in film meta texts
+GENRES = {
+    "action": "Action", "adventure": "Adventure", "adventures": "Adventure",
+    "animation": "Animation", "animated": "Animation", "cartoon": "Animation", "cartoons": "Animation", "anime": "Animation",
+    "comedy": "Comedy", "comedies": "Comedy", "crime": "Crime",
+    "documentary": "Documentary", "documentaries": "Documentary",
+    "drama": "Drama", "dramas": "Drama", "family": "Family", "fantasy": "Fantasy",
+    "history": "History", "historical": "History", "horror": "Horror",
+    "music": "Music", "musical": "Music", "musicals": "Music",
+    "mystery": "Mystery", "mysteries": "Mystery", "romance": "Romance", "romantic": "Romance",
+    "science fiction": "Science Fiction", "sci-fi": "Science Fiction", "scifi": "Science Fiction", "sci fi": "Science Fiction",
+    "thriller": "Thriller", "thrillers": "Thriller", "war": "War",
+    "western": "Western", "westerns": "Western", "tv movie": "TV Movie",
+}
+
+RATING_WORDS = {
+    "best": "high", "greatest": "high", "top rated": "high", "top-rated": "high", "highly rated": "high",
+    "high rating": "high", "high ratings": "high", "well rated": "high", "acclaimed": "high",
+    "oscar winning": "high", "oscar-winning": "high", "award winning": "high", "award-winning": "high",
+    "worst": "low", "low rated": "low", "low rating": "low", "badly rated": "low",
+}
+
+DIRECTOR_CUES = ("directed by", "director", "directors", "by")
+CAST_CUES = ("starring", "with", "featuring", "actor", "actress", "stars", "cast")
+
+#Words that carry no meta information of their own
+FILLER_WORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "from", "for", "to", "with", "by", "about", "all",
+    "i", "i'm", "im", "me", "my", "we", "you", "your", "is", "are", "was", "any", "some", "that", "which", "what",
+    "movie", "movies", "film", "films", "show", "shows", "recommend", "recommendation", "recommendations",
+    "suggest", "suggestions", "want", "watch", "looking", "find", "give", "list", "please", "can", "could",
+    "released", "release", "directed", "director", "directors", "starring", "featuring", "made", "year", "years",
+    "actor", "actress", "stars", "cast", "rated", "rating", "ratings", "good", "great", "genre", "decade",
+}
+
+YEAR = r"((?:19|20)\d{2})"
+RELEASE_PATTERNS = [
+    (re.compile(rf"\bbetween\s+{YEAR}\s*(?:and|-|to)\s*{YEAR}\b"), lambda m: f"between {m[1]} and {m[2]}"),
+    (re.compile(rf"\b(?:after|since|post)\s+{YEAR}\b"), lambda m: f"after {m[1]}"),
+    (re.compile(rf"\b(?:before|prior to|pre)\s+{YEAR}\b"), lambda m: f"before {m[1]}"),
+    (re.compile(rf"\b{YEAR}s\b"), lambda m: f"{m[1]}s"),
+    (re.compile(r"(?<![\w])'?([0-9])0s\b"), lambda m: f"{'20' if m[1] in '012' else '19'}{m[1]}0s"),
+    (re.compile(rf"\b{YEAR}\b"), lambda m: m[1]),
+]
+
+def _words(text: str) -> list[str]:
+    return re.findall(r"[\w'\-]+", text.lower())
+
+def build_gazetteer(film_data_path: str, gazetteer_path: str, min_person_films: int = 2) -> dict:
+    """Builds the person gazetteer from prepared film data (see build_gazetteer_from_data)."""
+    print("Building person gazetteer...")
+    data = read_film_data(film_data_path, columns=["directors", "cast"])
+    return build_gazetteer_from_data(data, gazetteer_path, min_person_films)
+
+def build_gazetteer_from_data(data: pd.DataFrame, gazetteer_path: str, min_person_films: int = 2) -> dict:
+    """
+    Builds {lowercase name: (name, role)} for directors/cast credited in at least
+    min_person_films films of data; role is the one the person has more credits for.
+    """
+    directed = Counter(name for names in data["directors"] for name in names)
+    acted = Counter(name for names in data["cast"] for name in names)
+
+    gazetteer = {}
+    for name in set(directed) | set(acted):
+        n_directed, n_acted = directed.get(name, 0), acted.get(name, 0)
+        # Single-word names collide with ordinary words too often
+        if n_directed + n_acted < min_person_films or len(name.split()) < 2:
+            continue
+        role = "Directors" if n_directed >= n_acted else "Cast"
+        gazetteer[" ".join(_words(name))] = (name, role, n_directed, n_acted)
+
+    os.makedirs(os.path.dirname(gazetteer_path), exist_ok=True)
+    with open(gazetteer_path + ".tmp", "wb") as f:
+        pickle.dump(gazetteer, f)
+    os.replace(gazetteer_path + ".tmp", gazetteer_path)
+    print(f"Person gazetteer saved to {gazetteer_path} ({len(gazetteer):,} names)")
+    return gazetteer
+
+
+class MetaQueryParser:
+    """
+    Deterministic parser turning meta queries into the rewrite format
+    ("Directors: X | Genres: Y | Release_info: after 2010 | Rating: high").
+
+    Confidence is the share of informative query words explained by the extracted
+    fields; callers fall back to the LLM rewrite when it is below min_confidence.
+    """
+    MAX_NAME_WORDS = 4
+
+    def __init__(self, gazetteer_path: str | None = None):
+        with open("config/config.yaml", "r") as f:
+            config = yaml.safe_load(f)
+
+        self.min_confidence = config["meta_parser"]["min_confidence"]
+        self.min_person_films = config["meta_parser"]["min_person_films"]
+        self.GAZETTEER_PATH = gazetteer_path or resolve_current(config, config["paths"]["person_gazetteer"])
+        self.FILM_PREP_PATH = config["paths"]["film_data"]
+
+        if os.path.exists(self.GAZETTEER_PATH):
+            with open(self.GAZETTEER_PATH, "rb") as f:
+                self.gazetteer = pickle.load(f)
+        else:
+            self.gazetteer = build_gazetteer(self.FILM_PREP_PATH, self.GAZETTEER_PATH, self.min_person_films)
+        print(f"Loaded person gazetteer: {self.GAZETTEER_PATH} ({len(self.gazetteer):,} names)")
+
+        self.n_queries = 0
+        self.n_bypassed = 0
+
+    def _match_people(self, words: list[str]) -> tuple[list[tuple[str, str]], set[int]]:
+        """Greedy longest-first n-gram lookup. Returns [(name, role)] and covered word positions."""
+        people, covered = [], set()
+        for n in range(self.MAX_NAME_WORDS, 1, -1):
+            for i in range(len(words) - n + 1):
+                if any(j in covered for j in range(i, i + n)):
+                    continue
+                gram = " ".join(words[i:i + n])
+                entry = self.gazetteer.get(gram) or self.gazetteer.get(re.sub(r"'s$", "", gram))
+                if entry is None:
+                    continue
+                name, role, n_directed, n_acted = entry
+                # Explicit cue right before the name overrides the dominant role
+                before = " ".join(words[max(0, i - 2):i])
+                if n_directed and any(before.endswith(cue) for cue in DIRECTOR_CUES):
+                    role = "Directors"
+                elif n_acted and any(before.endswith(cue) for cue in CAST_CUES):
+                    role = "Cast"
+                people.append((name, role))
+                covered.update(range(i, i + n))
+        return people, covered
+
+    def parse(self, query: str) -> tuple[str, float]:
+        """Returns (rewritten query, confidence in [0, 1])."""
+        text = (query or "").lower()
+        # "something like X" asks for similar plots: leave it to the LLM / plot search
+        if not text.strip() or re.search(r"\b(like|similar to)\b", text):
+            return "", 0.0
+
+        fields = {}
+        spans = []
+
+        for pattern, fmt in RELEASE_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                fields["Release_info"] = fmt(match)
+                spans.append(match.group(0))
+                break
+
+        for phrase, level in sorted(RATING_WORDS.items(), key=lambda kv: -len(kv[0])):
+            if re.search(rf"\b{re.escape(phrase)}\b", text):
+                fields["Rating"] = level
+                spans.append(phrase)
+                break
+
+        genres = []
+        for alias, genre in sorted(GENRES.items(), key=lambda kv: -len(kv[0])):
+            if re.search(rf"\b{re.escape(alias)}\b", text) and genre not in genres:
+                genres.append(genre)
+                spans.append(alias)
+                text = re.sub(rf"\b{re.escape(alias)}\b", " ", text)
+        if genres:
+            fields["Genres"] = ", ".join(genres)
+
+        words = _words(query)
+        people, covered = self._match_people(words)
+        for role in ("Directors", "Cast"):
+            names = [name for name, r in people if r == role]
+            if names:
+                fields[role] = ", ".join(names)
+
+        if not fields:
+            return "", 0.0
+
+        #Confidence: informative words explained by the extracted fields
+        span_words = set(w for span in spans for w in _words(span))
+        informative = [i for i, w in enumerate(words) if w not in FILLER_WORDS]
+        explained = [i for i in informative if i in covered or words[i] in span_words]
+        confidence = len(explained) / len(informative) if informative else 1.0
+
+        order = ("Directors", "Cast", "Genres", "Release_info", "Rating")
+        rewritten = " | ".join(f"{key}: {fields[key]}" for key in order if key in fields)
+        return rewritten, confidence
+
+    def rewrite(self, query: str) -> str | None:
+        """Returns parsed rewrite if confident enough, otherwise None (LLM rewrite is needed)."""
+        rewritten, confidence = self.parse(query)
+        bypass = bool(rewritten) and confidence >= self.min_confidence
+        self.n_queries += 1
+        self.n_bypassed += int(bypass)
+        return rewritten if bypass else None
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.n_queries,
+            "bypassed": self.n_bypassed,
+            "bypass_rate": self.n_bypassed / self.n_queries if self.n_queries else 0.0,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rule-based meta query parser")
+    func_subparsers = parser.add_subparsers(dest="func", required=True, help="Choose function: build/parse")
+    func_subparsers.add_parser("build", help="Rebuilds person gazetteer from prepared film data")
+    func_subparsers.add_parser("parse", help="Run in CLI mode to parse some queries")
+    args = parser.parse_args()
+
+    if args.func == "build":
+        with open("config/config.yaml", "r") as f:
+            config = yaml.safe_load(f)
+        build_gazetteer(config["paths"]["film_data"], resolve_current(config, config["paths"]["person_gazetteer"]),
+                        config["meta_parser"]["min_person_films"])
+
+    elif args.func == "parse":
+        meta_parser = MetaQueryParser()
+        quit = False
+        while not quit:
+            query = input("Query: ")
+            rewritten, confidence = meta_parser.parse(query)
+            print(f"{rewritten!r} (confidence {confidence:.2f})")
+            choice = input("Quit?(y/n): ")
+            if choice == "y": quit = True
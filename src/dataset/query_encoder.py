@@ -0,0 +1,299 @@
+import os, re, sys, json, time, hashlib, argparse, resource, subprocess
+import yaml
+import numpy as np
+from functools import lru_cache
+
+QUERY_ENCODER_BACKENDS = ("torch", "onnx", "openvino")
+#pip packages of the exported backends' runtimes (openvino is an optional extra in requirements.txt)
+RUNTIME_PACKAGES = {"onnx": "onnxruntime", "openvino": "openvino"}
+
+#Written next to an exported model: backend, model file, tokenizer/pooling settings and parity results
+EXPORT_INFO = "export.json"
+
+def _load_config():
+    if os.path.exists("config/config.yaml"):
+        with open("config/config.yaml", "r") as f:
+            return yaml.safe_load(f)
+
+    else:
+        raise FileNotFoundError("ERROR: config not found at config/config.yaml .\n \
+                                ensure you run query_encoder.py from project's root directory")
+
+def export_dir(path: str, backend: str) -> str:
+    return os.path.join(path, backend)
+
+
+class ExportedQueryEncoder:
+    """
+    Torch-free query encoder over an exported int8 model (ONNX Runtime or OpenVINO).
+
+    Mirrors the part of the SentenceTransformer API used for queries: tokenization with the
+    saved fast tokenizer, one forward pass, CLS or mean pooling and L2 normalization.
+    """
+    def __init__(self, path: str, threads: int = 0):
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(path, EXPORT_INFO), "r") as f:
+            self.info = json.load(f)
+        self.backend = self.info["backend"]
+        self.pooling = self.info["pooling"]
+        self.max_seq_length = self.info["max_seq_length"]
+        self.device = "cpu"
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(path, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.max_seq_length)
+        self.tokenizer.enable_padding(pad_id=self.info["pad_token_id"], pad_token=self.info["pad_token"])
+
+        model_path = os.path.join(path, self.info["model_file"])
+        if self.backend == "onnx":
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads
+            self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+            self.input_names = [i.name for i in self.session.get_inputs()]
+        elif self.backend == "openvino":
+            import openvino as ov
+            core = ov.Core()
+            config = {"INFERENCE_NUM_THREADS": threads} if threads else {}
+            self.session = core.compile_model(core.read_model(model_path), "CPU", config)
+            self.input_names = [i.get_any_name() for i in self.session.inputs]
+        else:
+            raise ValueError(f"Unknown exported backend: {self.backend}. Choose from {QUERY_ENCODER_BACKENDS[1:]}")
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.info["dimension"]
+
+    def get_max_seq_length(self) -> int:
+        return self.max_seq_length
+
+    def _forward(self, inputs: dict) -> np.ndarray:
+        inputs = {name: value for name, value in inputs.items() if name in self.input_names}
+        if self.backend == "onnx":
+            return self.session.run(None, inputs)[0]
+        return self.session(inputs)[0]
+
+    def encode(self, sentences: list[str], batch_size: int = 32, precision: str = "float32",
+               normalize_embeddings: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        """Encodes sentences into (n, dimension) float32 embeddings."""
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        outputs = []
+        for start in range(0, len(sentences), batch_size):
+            encodings = self.tokenizer.encode_batch(sentences[start:start + batch_size])
+            mask = np.asarray([e.attention_mask for e in encodings], dtype=np.int64)
+            hidden = self._forward({
+                "input_ids": np.asarray([e.ids for e in encodings], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.asarray([e.type_ids for e in encodings], dtype=np.int64),
+            })
+            if self.pooling == "cls":
+                pooled = hidden[:, 0]
+            else:
+                pooled = (hidden * mask[..., None]).sum(axis=1) / np.maximum(mask.sum(axis=1, keepdims=True), 1)
+            outputs.append(np.asarray(pooled, dtype=np.float32))
+
+        embeddings = np.concatenate(outputs) if outputs else np.empty((0, self.info["dimension"]), dtype=np.float32)
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+class StubEncoder:
+    """
+    Model-free stand-in for the embedding model (benchmarks and CI without model downloads):
+    lowercase word unigrams and bigrams are feature-hashed into `dimension` signed buckets.
+    Deterministic and purely lexical; usable for film chunks and queries alike.
+    """
+    device = "cpu"
+
+    def __init__(self, dimension: int = 768, max_seq_length: int = 512):
+        self.dimension = dimension
+        self.max_seq_length = max_seq_length
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimension
+
+    def get_max_seq_length(self) -> int:
+        return self.max_seq_length
+
+    def start_multi_process_pool(self, target_devices=None):
+        return None
+
+    def stop_multi_process_pool(self, pool):
+        pass
+
+    @staticmethod
+    @lru_cache(maxsize=1 << 20)
+    def _bucket(feature: str) -> int:
+        return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+    def encode(self, sentences: list[str], batch_size: int = 32, precision: str = "float32",
+               normalize_embeddings: bool = True, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        embeddings = np.zeros((len(sentences), self.dimension), dtype=np.float32)
+        for i, sentence in enumerate(sentences):
+            words = re.findall(r"\w+", sentence.lower())[:self.max_seq_length]
+            for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+                h = self._bucket(feature)
+                embeddings[i, h % self.dimension] += 1.0 if h >> 63 else -1.0
+        if normalize_embeddings:
+            embeddings /= np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings
+
+
+def parity(encoder, reference, queries: list[str]) -> dict:
+    """Cosine similarity of encoder embeddings to the reference (torch) ones for the same queries."""
+    a = encoder.encode(queries, normalize_embeddings=True)
+    b = reference.encode(queries, precision="float32", normalize_embeddings=True, show_progress_bar=False)
+    cosine = (a * b).sum(axis=1)
+    return {"n_queries": len(queries), "mean_cosine": float(cosine.mean()), "min_cosine": float(cosine.min())}
+
+def export_query_encoder(model_name: str, path: str, backend: str, queries: list[str],
+                         quantization: str = "avx512_vnni", min_cosine: float = 0.98) -> dict:
+    """
+    Exports model_name to ONNX (dynamic int8 quantization for the `quantization` CPU target)
+    or OpenVINO (static int8 quantization), then checks parity against the torch model on queries.
+    Needs sentence-transformers with the onnx/openvino extras; serving needs only the runtime.
+    """
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model, export_static_quantized_openvino_model
+
+    path = export_dir(path, backend)
+    print(f"Exporting {model_name} to {backend} in {path}...")
+    model = SentenceTransformer(model_name, device="cpu", backend=backend)
+    model.save_pretrained(path)
+    if backend == "onnx":
+        export_dynamic_quantized_onnx_model(model, quantization, path)
+        model_file = f"onnx/model_qint8_{quantization}.onnx"
+    elif backend == "openvino":
+        export_static_quantized_openvino_model(model, None, path)
+        model_file = "openvino/openvino_model_qint8_quantized.xml"
+    else:
+        raise ValueError(f"Unknown exported backend: {backend}. Choose from {QUERY_ENCODER_BACKENDS[1:]}")
+
+    info = {
+        "model": model_name,
+        "backend": backend,
+        "model_file": model_file,
+        "quantization": quantization if backend == "onnx" else "static_qint8",
+        "pooling": "cls" if model[1].get_pooling_mode_str() == "cls" else "mean",
+        "dimension": model.get_sentence_embedding_dimension(),
+        "max_seq_length": model.get_max_seq_length(),
+        "pad_token": model.tokenizer.pad_token,
+        "pad_token_id": model.tokenizer.pad_token_id,
+    }
+    with open(os.path.join(path, EXPORT_INFO), "w") as f:
+        json.dump(info, f, indent=2)
+
+    reference = SentenceTransformer(model_name, device="cpu")
+    info["parity"] = {**parity(ExportedQueryEncoder(path), reference, queries), "threshold": min_cosine}
+    info["parity"]["passed"] = info["parity"]["min_cosine"] >= min_cosine
+    with open(os.path.join(path, EXPORT_INFO), "w") as f:
+        json.dump(info, f, indent=2)
+    print(f"Parity with torch: {info['parity']}")
+    return info
+
+def load_query_encoder(path: str, backend: str, min_cosine: float, threads: int = 0) -> ExportedQueryEncoder | None:
+    """Exported query encoder, None if it is missing or failed the parity check (torch is used then)."""
+    info_path = os.path.join(export_dir(path, backend), EXPORT_INFO)
+    if not os.path.exists(info_path):
+        print(f"WARNING: no exported {backend} query encoder at {info_path}, using torch.\n"
+              f"  Run src/dataset/query_encoder.py export --backend {backend} firstly.")
+        return None
+    with open(info_path, "r") as f:
+        check = json.load(f).get("parity")
+    if check is None or check["min_cosine"] < min_cosine:
+        print(f"WARNING: {backend} query encoder failed the parity check ({check}, need min cosine {min_cosine}), using torch")
+        return None
+    try:
+        return ExportedQueryEncoder(export_dir(path, backend), threads=threads)
+    except ImportError as e:
+        print(f"WARNING: {backend} runtime is not installed ({e}), using torch.\n"
+              f"  Install it with: pip install {RUNTIME_PACKAGES[backend]}")
+        return None
+
+
+def _rss_mb() -> float:
+    """Current resident set size of this process, MB (peak RSS where /proc is not available)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _bench_backend(backend: str, queries: list[str], config: dict) -> dict:
+    """Loads one backend in this process and measures load time, per-query encode latency and RSS."""
+    encoder_cfg = config["query_encoder"]
+    start = time.perf_counter()
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        encoder = SentenceTransformer(config["models"]["embedding_model"], device="cpu")
+    else:
+        encoder = ExportedQueryEncoder(export_dir(config["paths"]["query_encoder"], backend), threads=encoder_cfg["threads"])
+    load_seconds = time.perf_counter() - start
+
+    encoder.encode(queries[:8], normalize_embeddings=True)
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        encoder.encode([query], normalize_embeddings=True)
+        latencies.append(time.perf_counter() - start)
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "backend": backend,
+        "load_seconds": load_seconds,
+        "latency_mean_ms": float(latencies_ms.mean()),
+        "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+        "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+        "rss_mb": _rss_mb(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "torch_imported": "torch" in sys.modules,
+    }
+
+def _read_queries(path: str, n: int | None = None) -> list[str]:
+    import pandas as pd
+    queries = pd.read_csv(path, header=None, names=["query"])["query"].dropna().astype(str).tolist()
+    return queries[:n] if n else queries
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exports and benchmarks quantized query encoders")
+    func_subparsers = parser.add_subparsers(dest="func", required=True, help="Choose function: export/bench")
+
+    #Subparser for "export"
+    export_parser = func_subparsers.add_parser("export", help="Exports an int8 ONNX/OpenVINO query encoder and checks parity with torch")
+    export_parser.add_argument("--backend", choices=QUERY_ENCODER_BACKENDS[1:], required=True)
+    export_parser.add_argument("--queries", default="data/prep/output.csv", help="CSV with one query per line (parity check)")
+    export_parser.add_argument("--n", type=int, default=1000, help="Queries used for the parity check")
+
+    #Subparser for "bench"
+    bench_parser = func_subparsers.add_parser("bench", help="Compares load time, per-query encode latency and RSS of backends")
+    bench_parser.add_argument("--backends", choices=QUERY_ENCODER_BACKENDS, nargs="*", default=list(QUERY_ENCODER_BACKENDS))
+    bench_parser.add_argument("--queries", default="data/prep/output.csv", help="CSV with one query per line")
+    bench_parser.add_argument("--n", type=int, default=500)
+    bench_parser.add_argument("--single", choices=QUERY_ENCODER_BACKENDS, default=None, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    config = _load_config()
+
+    if args.func == "export":
+        encoder_cfg = config["query_encoder"]
+        export_query_encoder(config["models"]["embedding_model"], config["paths"]["query_encoder"], args.backend,
+                             _read_queries(args.queries, args.n), quantization=encoder_cfg["quantization"],
+                             min_cosine=encoder_cfg["min_parity_cosine"])
+
+    elif args.func == "bench":
+        queries = _read_queries(args.queries, args.n)
+        if args.single:
+            print(json.dumps(_bench_backend(args.single, queries, config)))
+        else:
+            #Every backend runs in a fresh process, so RSS is not inflated by libraries of the others
+            print('='*65)
+            for backend in args.backends:
+                cmd = [sys.executable, __file__, "bench", "--queries", args.queries, "--n", str(args.n), "--single", backend]
+                result = subprocess.run(cmd, capture_output=True, text=True)
+                if result.returncode != 0:
+                    print(f"{backend}: failed\n{result.stderr.strip().splitlines()[-1] if result.stderr.strip() else ''}")
+                    continue
+                print(f"{backend}: {result.stdout.strip().splitlines()[-1]}")
+            print('='*65)
@@ -0,0 +1,190 @@
+import os, time, argparse
+import yaml
+import numpy as np
+import pandas as pd
+
+try:
+    from .index import FaissIndex, PLOT_INDEX_TYPES
+except ImportError:
+    from index import FaissIndex, PLOT_INDEX_TYPES
+
+SEARCH_TYPES = ("meta", "plot", "hybrid")
+#Keys of a configuration that override the hybrid section of the config
+HYBRID_KEYS = ("fusion", "rrf_k", "bm25_weight", "plot_weight", "candidates")
+
+def _load_config():
+    if os.path.exists("config/config.yaml"):
+        with open("config/config.yaml", "r") as f:
+            return yaml.safe_load(f)
+
+    else:
+        raise FileNotFoundError("ERROR: config not found at config/config.yaml .\n \
+                                ensure you run retrieval_eval.py from project's root directory")
+
+def load_labelled_queries(path: str, search_type: str) -> pd.DataFrame:
+    """
+    Query set as a DataFrame with query, search_type and gold (list of titles, empty if unlabelled).
+
+    path is a CSV with a header (query, optional search_type, optional gold with titles
+    separated by "|") or a headerless one-query-per-line CSV like data/prep/output.csv.
+    """
+    data = pd.read_csv(path)
+    if "query" not in data.columns:
+        data = pd.read_csv(path, header=None, names=["query"])
+    data = data.dropna(subset=["query"]).reset_index(drop=True)
+
+    data["search_type"] = data["search_type"].fillna(search_type) if "search_type" in data.columns else search_type
+    unknown = set(data["search_type"]) - set(SEARCH_TYPES)
+    if unknown:
+        raise ValueError(f"Unknown search types in {path}: {unknown}. Choose from {SEARCH_TYPES}")
+    gold = data["gold"] if "gold" in data.columns else pd.Series([None] * len(data))
+    data["gold"] = [[t.strip() for t in g.split("|") if t.strip()] if isinstance(g, str) else [] for g in gold]
+    return data[["query", "search_type", "gold"]]
+
+
+def _normalize_title(title: str) -> str:
+    return " ".join(str(title).lower().split())
+
+def ranking_metrics(ranked: list, relevant: set, k: int) -> dict:
+    """recall@k, reciprocal rank and nDCG@k (binary gains) of ranked keys against the relevant ones."""
+    ranked = ranked[:k]
+    hits = [key in relevant for key in ranked]
+    found = len(relevant & set(ranked))
+    first = next((i for i, hit in enumerate(hits) if hit), None)
+    dcg = sum(1.0 / np.log2(i + 2) for i, hit in enumerate(hits) if hit)
+    idcg = sum(1.0 / np.log2(i + 2) for i in range(min(len(relevant), k)))
+    return {
+        "recall": found / len(relevant),
+        "mrr": 0.0 if first is None else 1.0 / (first + 1),
+        "ndcg": dcg / idcg if idcg > 0 else 0.0,
+    }
+
+
+class RetrievalEvaluator:
+    """
+    Runs a labelled query set through FaissIndex.search for several configurations.
+
+    A configuration is a dict with a name and any of: index_type, nprobe, ef_search,
+    search_type (overrides the query's) and hybrid params (fusion, rrf_k, weights, candidates).
+    Queries with gold titles are scored against them, the others against the top-k of the
+    exact Flat index (for meta search: plain BM25) with the config's hybrid params.
+    Queries are encoded once, so latency covers the search alone.
+    """
+    def __init__(self, index: FaissIndex, queries: pd.DataFrame, k: int = 10):
+        self.index = index
+        self.queries = queries
+        self.k = k
+        self.default_hybrid = dict(index.hybrid_params)
+        self.default_index_type = index.plot_index_type
+        print(f"Encoding {len(queries)} queries...")
+        self.query_embs = index.encode_queries(queries["query"].tolist())
+        self._exact_cache = {}
+
+    def _search(self, i: int, search_type: str, config: dict) -> list[dict]:
+        return self.index.search(search_type, self.queries.at[i, "query"], top_k=self.k,
+                                 nprobe=config.get("nprobe"), ef_search=config.get("ef_search"),
+                                 query_emb=self.query_embs[i] if search_type != "meta" else None)
+
+    def _apply(self, config: dict) -> bool:
+        index_type = config.get("index_type", self.default_index_type)
+        if index_type != self.index.plot_index_type and not self.index.use_plot_index(index_type):
+            print(f"WARNING: {index_type} plot index is not built, skipping {config['name']}")
+            return False
+        self.index.hybrid_params = {**self.default_hybrid, **{key: config[key] for key in HYBRID_KEYS if key in config}}
+        return True
+
+    def _exact_rows(self, search_type: str, config: dict) -> list[set]:
+        """Top-k rows of every query from the exact Flat index (cached per search type and hybrid params)."""
+        hybrid = tuple((key, self.index.hybrid_params[key]) for key in HYBRID_KEYS) if search_type == "hybrid" else ()
+        cache_key = (search_type, hybrid)
+        if cache_key not in self._exact_cache:
+            if search_type != "meta" and self.index.plot_index_type != "Flat":
+                if not self.index.use_plot_index("Flat"):
+                    raise FileNotFoundError("ERROR: Queries without gold titles are scored against the Flat plot index, build it first!")
+            self._exact_cache[cache_key] = [{r["row_idx"] for r in self._search(i, search_type, config)}
+                                            for i in range(len(self.queries))]
+        return self._exact_cache[cache_key]
+
+    def evaluate(self, config: dict) -> dict | None:
+        """Metrics (means over queries), latency and plot index memory of one configuration."""
+        if not self._apply(config):
+            return None
+        index_type = self.index.plot_index_type
+        search_types = [config.get("search_type") or t for t in self.queries["search_type"]]
+        # Exact references are computed before switching to the evaluated index
+        exact = {} if all(self.queries["gold"]) else {t: self._exact_rows(t, config) for t in set(search_types)}
+        if self.index.plot_index_type != index_type:
+            self.index.use_plot_index(index_type)
+
+        metrics, latencies = [], []
+        for i, search_type in enumerate(search_types):
+            start = time.perf_counter()
+            results = self._search(i, search_type, config)
+            latencies.append(time.perf_counter() - start)
+
+            gold = self.queries.at[i, "gold"]
+            if gold:
+                ranked, relevant = [_normalize_title(r["title"]) for r in results], {_normalize_title(t) for t in gold}
+            else:
+                ranked, relevant = [r["row_idx"] for r in results], exact[search_type][i]
+            if relevant:
+                metrics.append(ranking_metrics(ranked, relevant, self.k))
+
+        latencies_ms = np.array(latencies) * 1000
+        uses_plot = any(t != "meta" for t in search_types)
+        return {
+            "config": config["name"],
+            "index_type": index_type if uses_plot else "-",
+            "search_types": ",".join(sorted(set(search_types))),
+            f"recall@{self.k}": float(np.mean([m["recall"] for m in metrics])) if metrics else 0.0,
+            "mrr": float(np.mean([m["mrr"] for m in metrics])) if metrics else 0.0,
+            f"ndcg@{self.k}": float(np.mean([m["ndcg"] for m in metrics])) if metrics else 0.0,
+            "scored_queries": len(metrics),
+            "latency_mean_ms": float(latencies_ms.mean()),
+            "latency_p50_ms": float(np.percentile(latencies_ms, 50)),
+            "latency_p95_ms": float(np.percentile(latencies_ms, 95)),
+            "latency_p99_ms": float(np.percentile(latencies_ms, 99)),
+            **(self.index.plot_index_memory(index_type) if uses_plot else {"ram_mb": 0.0, "disk_mb": 0.0}),
+        }
+
+    def run(self, configs: list[dict]) -> pd.DataFrame:
+        rows = []
+        for config in configs:
+            print(f"Evaluating {config['name']}...")
+            if (row := self.evaluate(config)) is not None:
+                rows.append(row)
+        self.index.hybrid_params = dict(self.default_hybrid)
+        return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    config = _load_config()
+    eval_config = config["retrieval_eval"]
+
+    parser = argparse.ArgumentParser(description="Compares retrieval quality and speed of index configurations")
+    parser.add_argument("--queries", default=eval_config["queries"], help="Labelled query CSV (query, search_type, gold) or one query per line")
+    parser.add_argument("--search-type", choices=SEARCH_TYPES, default=eval_config["search_type"], help="Search type of queries that don't specify one")
+    parser.add_argument("--k", type=int, default=eval_config["k"])
+    parser.add_argument("--configs", nargs="*", default=None, help="Names of configurations from retrieval_eval.configs (default: all)")
+    parser.add_argument("--index-type", choices=PLOT_INDEX_TYPES, nargs="*", default=None, help="Evaluate these plot index types instead of configured ones")
+    parser.add_argument("--output", default=eval_config["output"], help="Where to save the comparison table as CSV")
+    args = parser.parse_args()
+
+    configs = eval_config["configs"]
+    if args.index_type:
+        configs = [{"name": index_type, "index_type": index_type} for index_type in args.index_type]
+    elif args.configs:
+        configs = [c for c in configs if c["name"] in args.configs]
+
+    queries = load_labelled_queries(args.queries, args.search_type)
+    print(f"Loaded {len(queries)} queries from {args.queries} ({sum(map(bool, queries['gold']))} with gold titles)")
+    evaluator = RetrievalEvaluator(FaissIndex(), queries, k=args.k)
+    table = evaluator.run(configs)
+
+    print('='*65)
+    with pd.option_context("display.max_columns", None, "display.width", 200, "display.float_format", "{:.3f}".format):
+        print(table.to_string(index=False))
+    print('='*65)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    table.to_csv(args.output, index=False)
+    print(f"Comparison table saved to {args.output}")
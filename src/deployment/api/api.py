@@ -1,13 +1,23 @@
 from __future__ import annotations
 
 import os
+import time
+import asyncio
+import threading
 from pathlib import Path
 from typing import Optional
+from contextlib import asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
 
+import yaml
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.responses import Response as HTTPResponse
 from pydantic import BaseModel
 
 from src.main import RAG
+from src.timings import Timings
+from src.deployment.api import metrics
 
 def _project_root() -> Path:
     # api.py -> src/deployment/api/api.py -> go up 4 levels to project root
@@ -20,48 +30,214 @@ PROJECT_ROOT = _project_root()
 # from src/deployment/api or elsewhere.
 os.chdir(PROJECT_ROOT)
 
-app = FastAPI(title="RAG API")
+with open("config/config.yaml", "r") as f:
+    _config = yaml.safe_load(f)
+    SERVING_CONFIG = _config["serving"]
+    VERSIONS_CONFIG = _config["index_versions"]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup returns at once; requests arriving earlier load what they need themselves
+    if SERVING_CONFIG["warmup"]:
+        threading.Thread(target=_warm_up, name="warmup", daemon=True).start()
+    if VERSIONS_CONFIG["enabled"] and VERSIONS_CONFIG["watch_seconds"]:
+        threading.Thread(target=_watch_index_versions, name="index-version-watcher", daemon=True).start()
+    yield
+    # Queued blocking calls are dropped, running ones finish in their threads
+    _executor.shutdown(wait=False, cancel_futures=True)
+    metrics.mark_process_dead()
+
+app = FastAPI(title="RAG API", lifespan=lifespan)
 
 rag: Optional[RAG] = None
+_rag_lock = threading.Lock()
+# Only one index reload at a time; its outcome is reported by /health
+_reload_lock = threading.Lock()
+_reload_state = {"status": "idle", "changed": None, "error": None, "finished_at": None}
+# Background loading of all components at startup (serving.warmup)
+_warmup_state = {"status": "idle", "error": None, "seconds": None}
+
+# Blocking work (model loading, retrieval, llama.cpp generation) runs here, off the event loop
+_executor = ThreadPoolExecutor(max_workers=SERVING_CONFIG["threads"], thread_name_prefix="rag")
+
+
+async def _run_blocking(func, *args):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+def _close_when_idle(tokens, pending):
+    """
+    Closes a token generator in the executor once its pending next() call has returned.
+    On client disconnect that call may still be running, and closing a running generator raises ValueError.
+    """
+    close = lambda *_: _executor.submit(tokens.close)
+    if pending is None:
+        close()
+    else:
+        pending.add_done_callback(close)
 
 class Request(BaseModel):
     query: str
+    use_cache: bool = True
+    # Return the per-stage timing breakdown and LLM token usage with the answer
+    timings: bool = False
 
 class Response(BaseModel):
     recommendation: str
+    timings: Optional[dict] = None
+
+def _components() -> dict | None:
+    return rag.components() if rag is not None else None
+
 
 @app.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "rag_initialized": rag is not None,
+        "ready": rag is not None and rag.ready(),
+        "components": _components(),
+        "warmup": _warmup_state,
+        "query_encoder": rag.index.query_encoder.stats() if rag is not None and rag.index.query_encoder else None,
+        "query_encoder_backend": rag.index.query_backend if rag is not None else None,
+        "cache": rag.cache_stats() if rag is not None else None,
+        "meta_parser": rag.meta_parser_stats() if rag is not None else None,
+        "index_version": rag.index.version_dir if rag is not None else None,
+        "reload": _reload_state,
         "project_root": str(PROJECT_ROOT),
+        "pid": os.getpid(),
     }
 
 
+@app.get("/health/live")
+async def liveness():
+    """The process is up and serving requests (components may still be loading)."""
+    return {"status": "alive", "pid": os.getpid()}
+
+
+@app.get("/health/ready")
+async def readiness():
+    """200 once every component is loaded, 503 while they are still loading."""
+    if rag is not None and rag.ready():
+        return {"status": "ready", "components": _components()}
+    return JSONResponse(status_code=503, content={"status": "loading", "components": _components(), "warmup": _warmup_state})
+
+
 def _get_rag() -> RAG:
     global rag
     if rag is None:
-        rag = RAG()
+        # Concurrent first requests must not build several RAG instances
+        with _rag_lock:
+            if rag is None:
+                rag = RAG()
     return rag
 
 
+def _reload_indexes() -> list[str] | None:
+    """Swaps changed index components into the running RAG. Returns None if a reload is already running."""
+    if not _reload_lock.acquire(blocking=False):
+        return None
+    try:
+        _reload_state.update(status="reloading", error=None)
+        changed = _get_rag().reload_indexes()
+        _reload_state.update(status="idle", changed=changed, finished_at=time.time())
+        return changed
+    except Exception as e:
+        _reload_state.update(status="failed", error=str(e), finished_at=time.time())
+        raise
+    finally:
+        _reload_lock.release()
+
+
 @app.post("/reload")
-async def reload_rag():
-    global rag
-    rag = RAG()
-    return {"status": "reloaded"}
+async def reload_rag(wait: bool = False):
+    """Reloads indexes of the current index version in the background (wait=true to block until done)."""
+    if _reload_lock.locked():
+        return {"status": "already reloading"}
+    if not wait:
+        asyncio.get_running_loop().run_in_executor(_executor, _reload_indexes)
+        return {"status": "reloading"}
+    try:
+        changed = await _run_blocking(_reload_indexes)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"ERROR while reloading indexes: {e}")
+    return {"status": "reloaded", "changed": changed}
+
+
+def _watch_index_versions():
+    """Reloads when `current` points to a new index version, so every worker process follows publishes."""
+    while True:
+        time.sleep(VERSIONS_CONFIG["watch_seconds"])
+        rag_ = rag
+        if rag_ is None or rag_.index.versions is None:
+            continue
+        if rag_.index.versions.current() != rag_.index.version_dir:
+            try:
+                _reload_indexes()
+            except Exception as e:
+                print(f"ERROR while reloading indexes: {e}")
+
+
+def _warm_up():
+    start = time.perf_counter()
+    _warmup_state.update(status="loading")
+    try:
+        _get_rag().warm_up()
+        _warmup_state.update(status="done", seconds=time.perf_counter() - start)
+    except Exception as e:
+        _warmup_state.update(status="failed", error=str(e), seconds=time.perf_counter() - start)
+        print(f"ERROR while warming up: {e}")
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    """Prometheus histograms of stage latencies and LLM token usage."""
+    content, content_type = metrics.render()
+    return HTTPResponse(content=content, media_type=content_type)
+
 
 @app.post("/chat")
 async def process_query(query: Request) -> Response:
+    timings = Timings()
     try:
-        recommendation = _get_rag().process_query(query.query)
+        recommendation = await _run_blocking(lambda: _get_rag().process_query(query.query, use_cache=query.use_cache, timings=timings))
         if recommendation is None:
             raise RuntimeError("RAG returned empty response")
-        return Response(recommendation=recommendation)
+        metrics.observe(timings, endpoint="chat")
+        return Response(recommendation=recommendation, timings=timings.as_dict() if query.timings else None)
     except Exception as e:
+        metrics.observe(timings, endpoint="chat", status="error")
         raise HTTPException(
             status_code=500,
             detail=f"ERROR while processing query: {e}",
         )
-        
\ No newline at end of file
+
+
+@app.post("/chat/stream")
+async def process_query_stream(query: Request) -> StreamingResponse:
+    """Streams the recommendation as plain text chunks while the LLM generates it."""
+    rag_ = await _run_blocking(_get_rag)
+    timings = Timings()
+    tokens = rag_.process_query_stream(query.query, use_cache=query.use_cache, timings=timings)
+
+    async def stream():
+        status = "ok"
+        pending = None
+        try:
+            # Retrieval and every llama.cpp step run in the executor, not on the event loop
+            while True:
+                pending = _executor.submit(next, tokens, None)
+                token = await asyncio.wrap_future(pending)
+                if token is None:
+                    break
+                yield token
+        except Exception as e:
+            status = "error"
+            yield f"\nERROR while processing query: {e}"
+        finally:
+            try:
+                _close_when_idle(tokens, pending)
+            finally:
+                metrics.observe(timings, endpoint="chat_stream", status=status)
+
+    return StreamingResponse(stream(), media_type="text/plain; charset=utf-8")
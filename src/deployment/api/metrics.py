@@ -0,0 +1,54 @@
+import os
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# With several API worker processes (see serve.py) PROMETHEUS_MULTIPROC_DIR is set and
+# every worker writes its samples there; /metrics of any worker aggregates all of them.
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0)
+TOKEN_BUCKETS = (8, 16, 32, 64, 128, 256, 512, 1024, 2048, 4096)
+SPEED_BUCKETS = (1, 2, 4, 6, 8, 10, 15, 20, 30, 50, 100)
+
+STAGE_SECONDS = Histogram("rag_stage_seconds", "Time spent in a RAG pipeline stage per request",
+                          ["stage"], buckets=LATENCY_BUCKETS)
+REQUESTS = Counter("rag_requests_total", "Processed RAG requests",
+                   ["endpoint", "search_type", "cache_hit", "status"])
+LLM_TOKENS = Histogram("rag_llm_tokens", "Tokens per LLM call", ["task", "kind"], buckets=TOKEN_BUCKETS)
+LLM_TOKENS_PER_SECOND = Histogram("rag_llm_tokens_per_second", "Completion tokens per second of an LLM call",
+                                  ["task"], buckets=SPEED_BUCKETS)
+LLM_FIRST_TOKEN_SECONDS = Histogram("rag_llm_first_token_seconds", "Time to the first streamed token",
+                                    ["task"], buckets=LATENCY_BUCKETS)
+
+
+def observe(timings, endpoint: str, status: str = "ok"):
+    """Records stage spans and LLM usage of one request (a src.timings.Timings)."""
+    for stage, seconds in timings.stages.items():
+        STAGE_SECONDS.labels(stage=stage).observe(seconds)
+    for call in timings.llm_calls:
+        LLM_TOKENS.labels(task=call["task"], kind="prompt").observe(call["prompt_tokens"])
+        LLM_TOKENS.labels(task=call["task"], kind="completion").observe(call["completion_tokens"])
+        if call["completion_tokens"]:
+            LLM_TOKENS_PER_SECOND.labels(task=call["task"]).observe(call["tokens_per_second"])
+        if call.get("first_token_seconds") is not None:
+            LLM_FIRST_TOKEN_SECONDS.labels(task=call["task"]).observe(call["first_token_seconds"])
+    REQUESTS.labels(
+        endpoint=endpoint,
+        search_type=timings.labels.get("search_type", "none"),
+        cache_hit=str(timings.labels.get("cache_hit", False)).lower(),
+        status=status,
+    ).inc()
+
+
+def mark_process_dead():
+    """Drops live-gauge samples of this worker from the shared directory (called when it exits)."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def render() -> tuple[bytes, str]:
+    """Exposition text of all metrics and its content type."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
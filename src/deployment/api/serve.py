@@ -0,0 +1,38 @@
+import os
+import glob
+import shutil
+import argparse
+import tempfile
+import yaml
+import uvicorn
+
+if __name__ == "__main__":
+    with open("config/config.yaml", "r") as f:
+        serving_config = yaml.safe_load(f)["serving"]
+
+    parser = argparse.ArgumentParser(description="Runs RAG API with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=serving_config["workers"], help="Number of worker processes (default: serving.workers from config)")
+    args = parser.parse_args()
+
+    # Every worker loads its own LLM; FAISS/BM25 indexes and the film store are
+    # memory-mapped read-only (serving.mmap_indexes), so their pages are shared
+    # between workers through the OS page cache instead of being copied.
+    # Prometheus metrics of all workers are collected through files in a shared directory.
+    # Samples left in a given directory by a previous run are removed (they would be counted again),
+    # a temporary one is removed on exit; every worker marks itself dead on shutdown (api.py)
+    metrics_dir = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    own_metrics_dir = args.workers > 1 and not metrics_dir
+    if own_metrics_dir:
+        metrics_dir = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="rag-metrics-")
+    elif metrics_dir:
+        os.makedirs(metrics_dir, exist_ok=True)
+        for path in glob.glob(os.path.join(metrics_dir, "*.db")):
+            os.remove(path)
+
+    try:
+        uvicorn.run("src.deployment.api.api:app", host=args.host, port=args.port, workers=args.workers)
+    finally:
+        if own_metrics_dir:
+            shutil.rmtree(metrics_dir, ignore_errors=True)
@@ -1,4 +1,5 @@
 import os
+import itertools
 
 import streamlit as st
 import requests
@@ -6,6 +7,7 @@ from datetime import datetime
 
 API_BASE = os.environ.get("API_BASE", "http://localhost:8000")
 CHAT_URL = f"{API_BASE}/chat"
+CHAT_STREAM_URL = f"{API_BASE}/chat/stream"
 RELOAD_URL = f"{API_BASE}/reload"
 
 st.set_page_config(
@@ -16,6 +18,16 @@ st.set_page_config(
 
 st.title("Movie Recommendation System")
 
+def stream_answer(prompt: str):
+    """Yields answer chunks from the streaming endpoint as they arrive."""
+    with requests.post(CHAT_STREAM_URL, json={"query": prompt}, stream=True, timeout=300) as response:
+        if response.status_code != 200:
+            yield f"Server error: {response.status_code} ({response.text})"
+            return
+        for chunk in response.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk:
+                yield chunk
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
@@ -32,23 +44,16 @@ if prompt := st.chat_input("You can watch..."):
 
     # Показываем индикатор "думает"
     with st.chat_message("assistant"):
-        with st.spinner("Searching for films..."):
-            try:
-                response = requests.post(CHAT_URL, json={"query": prompt}, timeout=300)
-                
-                if response.status_code == 200:
-                    payload = response.json()
-                    if isinstance(payload, dict) and "recommendation" in payload:
-                        answer = payload["recommendation"]
-                    else:
-                        answer = str(payload)
-                else:
-                    answer = f"Server error: {response.status_code} ({response.text})"
-                    
-            except requests.exceptions.RequestException as e:
-                answer = f"Server is unreachable: {str(e)}"
+        try:
+            # Ждём первый токен под спиннером, дальше выводим ответ по мере генерации
+            with st.spinner("Searching for films..."):
+                chunks = stream_answer(prompt)
+                first_chunk = next(chunks, "")
+            answer = st.write_stream(itertools.chain([first_chunk], chunks))
 
-        st.markdown(answer)
+        except requests.exceptions.RequestException as e:
+            answer = f"Server is unreachable: {str(e)}"
+            st.markdown(answer)
     
     # Сохраняем ответ ассистента
     st.session_state.messages.append({"role": "assistant", "content": answer})
@@ -63,9 +68,9 @@ with col1:
 with col2:
     if st.button("Reload RAG system"):
         try:
-            r = requests.post(RELOAD_URL, timeout=300)
+            r = requests.post(RELOAD_URL, params={"wait": True}, timeout=300)
             if r.status_code == 200:
-                st.success("RAG system reloaded")
+                st.success(f"RAG system reloaded: {r.json().get('changed') or 'no changes'}")
             else:
                 st.error(f"Unable to reload RAG system: {r.status_code} ({r.text})")
         except Exception as e:
@@ -1,69 +1,183 @@
+import os
+import time
+import yaml
+import hashlib
+import threading
 import numpy as np
 
 try:
     from src.dataset.index import FaissIndex
+    from src.dataset.meta_parser import MetaQueryParser
     from src.models.base_llm import BaseLLMModel
+    from src.models.stub_llm import StubLLMModel
+    from src.cache import QueryCache
+    from src.dataset.index_versions import fingerprint
+    from src.timings import Timings, span
 except ImportError:
     from dataset.index import FaissIndex
+    from dataset.meta_parser import MetaQueryParser
     from models.base_llm import BaseLLMModel
+    from models.stub_llm import StubLLMModel
+    from cache import QueryCache
+    from dataset.index_versions import fingerprint
+    from timings import Timings, span
+
+#Example queries the routing centroids are built from
+PLOT_ROUTING_QUERIES = [
+    "I'm looking for something like Inception with a mind-bending plot",
+    "recommend a feel-good romantic comedy for tonight",
+    "something funny and lighthearted like Wedding Crashers",
+    "scary horror movie with great atmosphere like The Shining",
+    "cult classic with absurdist humor like The Room",
+    "dark psychological thriller with complex characters",
+    "something like Gone Girl with a shocking twist ending",
+    "survival thriller set in a remote isolated location",
+    "emotional coming of age story about friendship",
+    "sci-fi about loneliness and identity crisis",
+    "war movie focused on human drama not action",
+    "beautiful slow-burn drama with deep storytelling",
+    "heist film with clever twists and an unexpected ending",
+    "action film with great tense scenes like Mission Impossible",
+    "something mysterious and suspenseful",
+]
+META_ROUTING_QUERIES = [
+    "movies directed by Christopher Nolan",
+    "films starring Leonardo DiCaprio released after 2010",
+    "best rated sci-fi movies of 2023",
+    "Oscar winning films between 2018 and 2022",
+    "movies produced by A24 studio",
+    "animated films released after 2020",
+    "horror films rated R from the last decade",
+    "action movies from the 1990s",
+    "movies with runtime under 90 minutes",
+    "films featuring Meryl Streep with high ratings",
+    "movies by director Denis Villeneuve",
+    "films starring Jeff Goldblum",
+]
+
 
 class RAG:
-    def __init__(self):
+    def __init__(self, lazy: bool | None = None, stub: bool | None = None):
+        """
+        With lazy=True (default: serving.lazy_load) nothing heavy is loaded here: the query encoder,
+        indexes, routing centroids and LLM are loaded on first use or by warm_up().
+
+        With stub=True (default: benchmark.stub_models) model-free stand-ins replace the embedding
+        model and the LLM, so retrieval and serving can be benchmarked without downloading models.
+        """
         print(f"Initializing RAG system...\n{'_' * 50}")
-        self.index = FaissIndex()
-        self.llm = BaseLLMModel()
-        self._plot_centroid, self._meta_centroid = self._build_classifier_centroids()
+        with open("config/config.yaml", "r") as f:
+            self.config = yaml.safe_load(f)
+        lazy = self.config["serving"]["lazy_load"] if lazy is None else lazy
+        stub = self.config["benchmark"]["stub_models"] if stub is None else stub
+
+        self.index = FaissIndex(lazy=lazy, stub=stub)
+        self.llm = StubLLMModel(lazy=lazy) if stub else BaseLLMModel(lazy=lazy)
+        self._centroids = None
+        self._centroids_lock = threading.Lock()
+        if not lazy:
+            self._classifier_centroids()
+        # Queries this close to both centroids are searched in both indexes
+        self.hybrid_margin = self.config["routing"]["hybrid_margin"]
+        # Deterministic meta query parser: LLM rewrite is only needed when it is not confident.
+        # Its gazetteer is loaded with the first meta query (or by warm_up)
+        self.meta_parser_enabled = self.config["meta_parser"]["enabled"]
+        self._meta_parser = None
+        self._meta_parser_lock = threading.Lock()
+        if not lazy:
+            self._load_meta_parser()
+
+        # Caches for final recommendations (exact + semantic for plot queries) and for LLM rewrites
+        # (exact only: rewrites hinge on names/years, which embeddings of near-identical queries blur)
+        cache_cfg = self.config["cache"]
+        self.response_cache = None
+        self.rewrite_cache = None
+        if cache_cfg["enabled"]:
+            self.response_cache = QueryCache(
+                max_size=cache_cfg["max_size"],
+                ttl_seconds=cache_cfg["ttl_seconds"],
+                semantic=cache_cfg["semantic"],
+                semantic_threshold=cache_cfg["semantic_threshold"],
+            )
+            self.rewrite_cache = QueryCache(
+                max_size=cache_cfg["max_size"],
+                ttl_seconds=cache_cfg["ttl_seconds"],
+                semantic=False,
+            )
         print("RAG system is ready!!!")
 
+    def _load_meta_parser(self) -> MetaQueryParser | None:
+        """Meta query parser of the current index version, loaded on first use (None if disabled)."""
+        if self.meta_parser_enabled and self._meta_parser is None:
+            with self._meta_parser_lock:
+                if self._meta_parser is None:
+                    self._meta_parser = MetaQueryParser(self.index.GAZETTEER_PATH)
+        return self._meta_parser
+
     def _build_classifier_centroids(self):
-        plot_queries = [
-            "I'm looking for something like Inception with a mind-bending plot",
-            "recommend a feel-good romantic comedy for tonight",
-            "something funny and lighthearted like Wedding Crashers",
-            "scary horror movie with great atmosphere like The Shining",
-            "cult classic with absurdist humor like The Room",
-            "dark psychological thriller with complex characters",
-            "something like Gone Girl with a shocking twist ending",
-            "survival thriller set in a remote isolated location",
-            "emotional coming of age story about friendship",
-            "sci-fi about loneliness and identity crisis",
-            "war movie focused on human drama not action",
-            "beautiful slow-burn drama with deep storytelling",
-            "heist film with clever twists and an unexpected ending",
-            "action film with great tense scenes like Mission Impossible",
-            "something mysterious and suspenseful",
-        ]
-        meta_queries = [
-            "movies directed by Christopher Nolan",
-            "films starring Leonardo DiCaprio released after 2010",
-            "best rated sci-fi movies of 2023",
-            "Oscar winning films between 2018 and 2022",
-            "movies produced by A24 studio",
-            "animated films released after 2020",
-            "horror films rated R from the last decade",
-            "action movies from the 1990s",
-            "movies with runtime under 90 minutes",
-            "films featuring Meryl Streep with high ratings",
-            "movies by director Denis Villeneuve",
-            "films starring Jeff Goldblum",
-        ]
-        em = self.index.embed_model
-        plot_vecs = em.encode(plot_queries, normalize_embeddings=True)
-        meta_vecs = em.encode(meta_queries, normalize_embeddings=True)
+        em = self.index.query_model
+        plot_vecs = em.encode(PLOT_ROUTING_QUERIES, normalize_embeddings=True)
+        meta_vecs = em.encode(META_ROUTING_QUERIES, normalize_embeddings=True)
         plot_c = plot_vecs.mean(axis=0); plot_c /= np.linalg.norm(plot_c)
         meta_c = meta_vecs.mean(axis=0); meta_c /= np.linalg.norm(meta_c)
         return plot_c, meta_c
 
-    def classify_query(self, query: str) -> str:
+    def _centroids_key(self) -> str:
+        """Centroids depend on the embedding model, query encoder backend and routing queries."""
+        # Loading the query model settles the backend actually used (a configured one may fall back to torch)
+        self.index.query_model
+        h = hashlib.blake2b(digest_size=16)
+        for part in (self.index.embed_model_name, self.index.query_backend, *PLOT_ROUTING_QUERIES, "", *META_ROUTING_QUERIES):
+            h.update(part.encode("utf-8") + b"\x00")
+        return h.hexdigest()
+
+    def _load_classifier_centroids(self):
+        """Reads routing centroids from paths.routing_centroids; computes and saves them if missing or stale."""
+        path = self.config["paths"]["routing_centroids"]
+        key = self._centroids_key()
+        if os.path.exists(path):
+            with np.load(path) as saved:
+                if str(saved["key"]) == key:
+                    print(f"Loaded routing centroids: {path}")
+                    return saved["plot"], saved["meta"]
+
+        plot_c, meta_c = self._build_classifier_centroids()
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "wb") as f:
+                np.savez(f, plot=plot_c, meta=meta_c, key=np.array(key))
+            os.replace(path + ".tmp", path)
+            print(f"Saved routing centroids: {path}")
+        except OSError as e:
+            print(f"WARNING: routing centroids are not saved ({e})")
+        return plot_c, meta_c
+
+    def _classifier_centroids(self):
+        """(plot, meta) routing centroids, loaded on first use."""
+        if self._centroids is None:
+            with self._centroids_lock:
+                if self._centroids is None:
+                    self._centroids = self._load_classifier_centroids()
+        return self._centroids
+
+    @staticmethod
+    def _has_meta_keywords(query: str) -> bool:
         META_KEYWORDS = (
             "directed by", "starring", "director", "cast:",
             "genre:", "released in", "rated", "produced by",
             "studio", "year:", "runtime", "rating:"
         )
-        if any(kw in query.lower() for kw in META_KEYWORDS):
+        return any(kw in query.lower() for kw in META_KEYWORDS)
+
+    def classify_query(self, query: str, query_emb: np.ndarray | None = None) -> str:
+        if self._has_meta_keywords(query):
             return "meta"
-        vec = self.index.embed_model.encode([query], normalize_embeddings=True)[0]
-        return "meta" if np.dot(vec, self._meta_centroid) > np.dot(vec, self._plot_centroid) else "plot"
+        vec = query_emb if query_emb is not None else self.index.encode_queries([query])[0]
+        plot_centroid, meta_centroid = self._classifier_centroids()
+        meta_sim, plot_sim = np.dot(vec, meta_centroid), np.dot(vec, plot_centroid)
+        if abs(meta_sim - plot_sim) < self.hybrid_margin:
+            return "hybrid"
+        return "meta" if meta_sim > plot_sim else "plot"
 
     @staticmethod
     def _filter_results(results: list, top_k: int = 5, max_unknowns: int = 2) -> list:
@@ -77,25 +191,227 @@ class RAG:
                 break
         return filtered if filtered else results[:top_k]
 
-    def process_query(self, query: str):
-        search_type = self.classify_query(query)
+    def _rewrite(self, query: str, use_cache: bool = True, timings: Timings | None = None,
+                 llm: BaseLLMModel | None = None) -> str:
+        labels = timings.labels if timings is not None else {}
+        meta_parser = self._load_meta_parser()
+        if meta_parser is not None:
+            parsed = meta_parser.rewrite(query)
+            if parsed is not None:
+                print(f"Rewritten by parser (LLM bypassed): {meta_parser.stats()}")
+                labels["rewrite_by"] = "parser"
+                return parsed
+
+        use_cache = use_cache and self.rewrite_cache is not None
+        if use_cache:
+            cached = self.rewrite_cache.get(query)
+            if cached is not None:
+                labels["rewrite_by"] = "cache"
+                return cached
+
+        usage = {}
+        rewritten = (llm or self.llm).rewrite_query(query, usage=usage)
+        labels["rewrite_by"] = "llm"
+        if timings is not None:
+            timings.add_llm_call("rewrite", usage)
+        if use_cache:
+            self.rewrite_cache.put(query, rewritten)
+        return rewritten
+
+    def _plan_search(self, query: str, query_emb: np.ndarray | None = None, use_cache: bool = True,
+                     timings: Timings | None = None, llm: BaseLLMModel | None = None) -> dict:
+        """
+        Routes the query and, for meta search, rewrites it and splits it into structured filters + text.
+        The rewrite uses llm if given (e.g. an instance of a pool), self.llm otherwise.
+        """
+        # Query is encoded once: the same vector is used for routing and for plot search
+        if query_emb is None and not self._has_meta_keywords(query):
+            with span(timings, "encode"):
+                query_emb = self.index.encode_queries([query])[0]
+        with span(timings, "classify"):
+            search_type = self.classify_query(query, query_emb=query_emb)
         print(f"{'_'*20}\nSearch type: {search_type}\n{'_'*20}")
+        if timings is not None:
+            timings.labels["search_type"] = search_type
 
+        plan = {"search_type": search_type, "rewritten": "", "search_query": query, "filters": None, "query_emb": query_emb}
         if search_type == "meta":
-            rewritten = self.llm.rewrite_query(query)
+            with span(timings, "rewrite"):
+                rewritten = self._rewrite(query, use_cache=use_cache, timings=timings, llm=llm)
             print(f"Rewritten query: {rewritten}")
-            search_query = rewritten
-        else:
-            search_query = query
+            plan["rewritten"] = plan["search_query"] = rewritten
+            if self.index.filter_store is not None:
+                with span(timings, "parse_filters"):
+                    plan["filters"], plan["search_query"] = self.index.filter_store.parse(rewritten)
+                print(f"Filters: {plan['filters']} | Text query: {plan['search_query']!r}")
+        return plan
 
-        candidates = self.index.search(type=search_type, query=search_query, top_k=20)
-        results = self._filter_results(candidates, top_k=5)
+    def _search(self, plan: dict, timings: Timings | None = None) -> list:
+        legs = {}
+        with span(timings, "search"):
+            candidates = self.index.search(type=plan["search_type"], query=plan["search_query"], top_k=20,
+                                           query_emb=plan["query_emb"], filters=plan["filters"], timings=legs)
+        if legs:
+            print("Hybrid search: " + ", ".join(f"{leg} {seconds * 1000:.1f} ms" for leg, seconds in legs.items()))
+            if timings is not None:
+                for leg, seconds in legs.items():
+                    timings.add(f"search_{leg}", seconds)
+        with span(timings, "filter_results"):
+            return self._filter_results(candidates, top_k=5)
+
+    def _search_batch(self, plans: list[dict]) -> list[list]:
+        """
+        _search for many plans: unfiltered plans of one search type share a single batched
+        index call (one FAISS search / BM25 retrieve); plans with filters are searched one by one.
+        """
+        results = [None] * len(plans)
+        groups = {}
+        for i, plan in enumerate(plans):
+            if plan["filters"]:
+                results[i] = self._search(plan)
+            else:
+                groups.setdefault(plan["search_type"], []).append(i)
+
+        for search_type, ids in groups.items():
+            embs = [plans[i]["query_emb"] for i in ids]
+            query_embs = np.stack(embs) if search_type != "meta" and all(e is not None for e in embs) else None
+            candidates = self.index.search_batch(type=search_type, queries=[plans[i]["search_query"] for i in ids],
+                                                 top_k=20, query_embs=query_embs)
+            for i, c in zip(ids, candidates):
+                results[i] = self._filter_results(c, top_k=5)
+        return results
+
+    def _retrieve(self, query: str, query_emb: np.ndarray | None = None, use_cache: bool = True,
+                  timings: Timings | None = None) -> tuple[dict, list]:
+        """Routes the query, rewrites it if needed and returns the search plan and filtered search results."""
+        plan = self._plan_search(query, query_emb=query_emb, use_cache=use_cache, timings=timings)
+        results = self._search(plan, timings=timings)
         print("Search results:")
         for r in results:
             print(r)
+        return plan, results
+
+    @staticmethod
+    def _semantic_key(plan: dict) -> np.ndarray | None:
+        """
+        Embedding an answer is cached under for semantic lookups. Only plot-routed queries get one:
+        meta queries differing in a name or year ("movies by X" / "movies by Y") embed almost identically.
+        """
+        return plan["query_emb"] if plan["search_type"] == "plot" else None
+
+    def _cached_response(self, query: str, timings: Timings | None = None) -> tuple[str | None, np.ndarray | None]:
+        """Looks the query up in the response cache. Returns (cached response, query embedding)."""
+        # Semantic level needs the query vector; it is reused later for routing and plot search
+        query_emb = semantic_emb = None
+        if self.response_cache.semantic and not self._has_meta_keywords(query):
+            with span(timings, "encode"):
+                query_emb = self.index.encode_queries([query])[0]
+            # Semantic hits only for plot queries (see _semantic_key)
+            with span(timings, "classify"):
+                if self.classify_query(query, query_emb=query_emb) == "plot":
+                    semantic_emb = query_emb
+        with span(timings, "cache_lookup"):
+            cached = self.response_cache.get(query, semantic_emb)
+        if timings is not None:
+            timings.labels["cache_hit"] = cached is not None
+        if cached is not None:
+            print(f"Cache hit: {self.response_cache.stats()}")
+        return cached, query_emb
+
+    def process_query(self, query: str, use_cache: bool = True, timings: Timings | None = None):
+        """
+        Answers the query. If timings is given, it receives seconds per stage (encode, cache_lookup,
+        classify, rewrite, parse_filters, search and its legs, filter_results, generate, total) and LLM token usage.
+        """
+        with span(timings, "total"):
+            use_cache = use_cache and self.response_cache is not None
+            query_emb = None
+            if use_cache:
+                cached, query_emb = self._cached_response(query, timings=timings)
+                if cached is not None:
+                    return cached
+
+            plan, results = self._retrieve(query, query_emb=query_emb, use_cache=use_cache, timings=timings)
+            usage = {}
+            with span(timings, "generate"):
+                response = self.llm.generate_with_context(query, results, usage=usage)
+            if timings is not None:
+                timings.add_llm_call("recommend", usage)
+            if use_cache and response:
+                self.response_cache.put(query, response, self._semantic_key(plan))
+            return response
+
+    def process_query_stream(self, query: str, use_cache: bool = True, timings: Timings | None = None):
+        """Yields the recommendation piece by piece as the LLM generates it (timings as in process_query)."""
+        with span(timings, "total"):
+            use_cache = use_cache and self.response_cache is not None
+            query_emb = None
+            if use_cache:
+                cached, query_emb = self._cached_response(query, timings=timings)
+                if cached is not None:
+                    yield cached
+                    return
+
+            plan, results = self._retrieve(query, query_emb=query_emb, use_cache=use_cache, timings=timings)
+            pieces, usage = [], {}
+            try:
+                with span(timings, "generate"):
+                    for piece in self.llm.generate_with_context_stream(query, results, usage=usage):
+                        pieces.append(piece)
+                        yield piece
+            finally:
+                if timings is not None:
+                    timings.add_llm_call("recommend", usage)
+            # Only fully streamed answers are cached
+            if use_cache and pieces:
+                self.response_cache.put(query, "".join(pieces), self._semantic_key(plan))
+
+    def reload_indexes(self) -> list[str]:
+        """
+        Hot-swaps index components changed in the current index version; the LLM and
+        the embedding model stay loaded. Cached answers are dropped if anything changed.
+        """
+        gazetteer_before = fingerprint([self.index.GAZETTEER_PATH])
+        changed = self.index.reload()
+        if self._meta_parser is not None and fingerprint([self.index.GAZETTEER_PATH]) != gazetteer_before:
+            # Reloaded from the new version with the next meta query
+            with self._meta_parser_lock:
+                self._meta_parser = None
+            changed.append("meta_parser")
+
+        if changed and self.response_cache is not None:
+            self.response_cache.clear()
+            self.rewrite_cache.clear()
+        return changed
+
+    def components(self) -> dict[str, bool]:
+        """Which components are loaded (all of them once the system is ready to answer without load delays)."""
+        return {
+            **self.index.loaded_components(),
+            "routing_centroids": self._centroids is not None,
+            "meta_parser": self._meta_parser is not None or not self.meta_parser_enabled,
+            "llm": self.llm.llm is not None,
+        }
+
+    def ready(self) -> bool:
+        return all(self.components().values())
+
+    def warm_up(self):
+        """Loads every component that is not loaded yet."""
+        start = time.perf_counter()
+        self.index.ensure_loaded()
+        self._classifier_centroids()
+        self._load_meta_parser()
+        self.llm.ensure_loaded()
+        print(f"RAG warm-up done in {time.perf_counter() - start:.1f} s")
+
+    def meta_parser_stats(self) -> dict | None:
+        return self._meta_parser.stats() if self._meta_parser is not None else None
 
-        response = self.llm.generate_with_context(query, results)
-        return response
+    def cache_stats(self) -> dict | None:
+        if self.response_cache is None:
+            return None
+        return {"responses": self.response_cache.stats(), "rewrites": self.rewrite_cache.stats()}
 
     def terminal_cli(self):
         terminate = False
@@ -1,12 +1,62 @@
 import os
+import time
 import yaml
+import queue
+import threading
 import argparse
-from huggingface_hub import hf_hub_download
-from llama_cpp import Llama
+
+# Static system prompts: they are identical across calls, so their evaluated KV state is reused
+REWRITE_SYSTEM_PROMPT = """You rewrite movie search queries into a structured format. There are two indexes:
+- Plot Index: for story, mood, atmosphere, themes, "movies like X"
+- Meta Index: for facts — specific person names (actors/directors), years, genres as filters, ratings, studios
+
+PRIORITY RULES (apply in order):
+1. Query mentions a SPECIFIC PERSON'S NAME (actor or director) → ALWAYS use Cast: or Directors:
+2. Query mentions a SPECIFIC YEAR or DECADE → use Release_info:
+3. Query mentions a SPECIFIC RATING (high rated, Oscar-winning, etc.) → use Rating:
+4. Query mentions a GENRE as a hard filter (not as mood/vibe) → use Genres:
+5. Everything else (vibes, moods, "like X movie", story themes, atmosphere) → use Plot:
+
+Output formats:
+- Plot: "Plot: [natural language query]"
+- Meta: "Directors: X" or "Cast: X" or "Genres: X | Release_info: Y" — only include relevant fields, separated by " | "
+
+Examples:
+User: "Movies by Christopher Nolan" → Directors: Christopher Nolan
+User: "Films with Jeff Goldblum" → Cast: Jeff Goldblum
+User: "Jeff Goldblum movies" → Cast: Jeff Goldblum
+User: "Leonardo DiCaprio after 2010 with high rating" → Cast: Leonardo DiCaprio | Release_info: after 2010 | Rating: high
+User: "Animated films released after 2020" → Genres: Animation | Release_info: after 2020
+User: "Sci-fi movies of 2023" → Genres: sci-fi | Release_info: 2023
+User: "Something like Interstellar but more emotional" → Plot: emotional space drama like Interstellar
+User: "Funny movie like Wedding Crashers" → Plot: comedy like Wedding Crashers
+User: "Cult classic like The Room" → Plot: cult classic absurdist like The Room
+User: "Dark psychological thriller" → Plot: dark psychological thriller
+User: "Good thriller with a twist ending" → Plot: thriller with twist ending
+
+Return ONLY the rewritten query. No explanation, no extra text."""
+
+RECOMMEND_SYSTEM_PROMPT = (
+    "You are a movie recommendation assistant.\n"
+    "The user's message lists films from the database that may match the user's request, followed by the request itself.\n"
+    "Do NOT recommend films the user has already mentioned in their message.\n\n"
+    "Rules:\n"
+    "1. First, check the database films listed in the user's message. If 1-2 of them are a good fit, recommend those.\n"
+    "2. If the database films are a weak or partial match, recommend the best one from the list AND supplement with 1 film from your own knowledge that fits better.\n"
+    "3. If none of the database films are relevant, ignore the list entirely and recommend 1-2 films from your own knowledge.\n"
+    "4. Decide how many films to recommend based on the request: recommend 1 film if the request is very specific (exact mood, niche genre, or 'something like X'), recommend 2-3 films if the request is broad or open-ended (e.g. 'good action movies', 'comedies to watch tonight').\n"
+    "5. For each recommendation give the exact title and 1-2 sentences on why it fits the request.\n"
+    "6. Present all recommendations as a single unified list. Do NOT separate or label films by source (do not write 'from the database', 'from my knowledge', 'I also recommend', etc.).\n"
+    "7. Never apologize for results or say you cannot find a match."
+)
 
 
 class BaseLLMModel:
-    def __init__(self):
+    def __init__(self, lazy: bool = False, n_threads: int | None = None):
+        """
+        With lazy=True the GGUF is downloaded and loaded on first generation (or by ensure_loaded).
+        n_threads overrides llm_params.n_threads (e.g. when several instances share the CPU).
+        """
         with open("config/config.yaml", "r") as f:
             self.config = yaml.safe_load(f)
 
@@ -17,31 +67,52 @@ class BaseLLMModel:
 
         # LLM params
         self.n_ctx = self.config["llm_params"]["n_ctx"]
-        self.n_threads = self.config["llm_params"]["n_threads"]
+        self.n_threads = n_threads or self.config["llm_params"]["n_threads"]
         self.temperature = self.config["llm_params"]["temperature"]
         self.max_tokens = self.config["llm_params"]["max_tokens"]
+        self.prompt_cache = self.config["llm_params"]["prompt_cache"]
+        self.max_prompt_states = self.config["llm_params"]["max_prompt_states"]
 
         self.model_path = None
         self.llm = None
+        # llama.cpp context is not thread-safe: one generation at a time per instance
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Saved llama.cpp states with the evaluated static system prompt, per prompt template
+        self._prompt_states = {}
+        self._active_prompt = None
 
         print("Created LLM instance:")
         print(f"  repo: {self.model_repo}")
         print(f"  file: {self.model_filename}")
         print(f"  ctx: {self.n_ctx}")
         print(f"  threads: {self.n_threads}")
+        print(f"  lazy loading: {lazy}")
 
-        self._load_model()
+        if not lazy:
+            self._load_model()
 
         print("_" * 50)
 
-    def _load_model(self):
+    def ensure_loaded(self):
+        """Loads the model if it is not loaded yet (thread-safe)."""
+        if self.llm is None:
+            with self._load_lock:
+                if self.llm is None:
+                    self._load_model()
+
+    def _create_llm(self):
+        # Imported here, so constructing a lazy instance stays cheap
+        from huggingface_hub import hf_hub_download
+        from llama_cpp import Llama
+
         # Download or load cached model
         self.model_path = hf_hub_download(
             repo_id=self.model_repo,
             filename=self.model_filename
         )
 
-        self.llm = Llama(
+        return Llama(
             model_path=self.model_path,
             chat_format=self.chat_format,
             n_ctx=self.n_ctx,
@@ -49,65 +120,169 @@ class BaseLLMModel:
             verbose=False
         )
 
+    def _load_model(self):
+        self.llm = self._create_llm()
+
         print("LLM loaded successfully.")
 
-    def generate(self, query: str, system_prompt: str = None, temperature: float = None):
+        if self.prompt_cache:
+            with self._lock:
+                for system_prompt in (REWRITE_SYSTEM_PROMPT, RECOMMEND_SYSTEM_PROMPT):
+                    self._restore_prompt_state(system_prompt)
+            print(f"Prompt cache warmed: {len(self._prompt_states)} templates")
+
+    @staticmethod
+    def _build_messages(query: str, system_prompt: str = None, context: str = None) -> list[dict]:
+        """
+        Static system prompt goes first as its own message, so every call with the same
+        template starts with identical tokens; per-request context and query follow it.
+        """
         messages = []
+        if system_prompt:
+            messages.append({"role": "system", "content": system_prompt})
+            query = f"User request:{query}"
+        if context:
+            query = f"{context}\n\n{query}"
 
+        messages.append({"role": "user", "content": query})
+        return messages
+
+    def _restore_prompt_state(self, system_prompt: str = None):
+        """
+        Makes the KV cache start with the evaluated system prompt (call under self._lock).
+
+        llama.cpp only prefills tokens after the longest common prefix with its current
+        context, so restoring the template's saved state leaves just the user-specific
+        suffix to evaluate. States are created once per template on first use.
+        """
+        if not self.prompt_cache:
+            return
+        if not system_prompt:
+            # Context no longer starts with any saved template
+            self._active_prompt = None
+            return
+        if self._active_prompt == system_prompt:
+            return
+
+        state = self._prompt_states.get(system_prompt)
+        if state is None:
+            # Evaluating the system message alone; the state is saved right after it
+            self.llm.reset()
+            self.llm.create_chat_completion(
+                messages=[{"role": "system", "content": system_prompt}],
+                temperature=0.0,
+                max_tokens=1
+            )
+            state = self.llm.save_state()
+            if len(self._prompt_states) >= self.max_prompt_states:
+                self._prompt_states.pop(next(iter(self._prompt_states)))
+            self._prompt_states[system_prompt] = state
+        else:
+            self.llm.load_state(state)
+
+        self._active_prompt = system_prompt
+
+    @staticmethod
+    def _fill_usage(usage: dict | None, prompt_tokens: int, completion_tokens: int, seconds: float, **extra):
+        """Token counts and speed of one call (seconds from prompt restore to the last token)."""
+        if usage is None:
+            return
+        usage.update(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, seconds=seconds,
+                     tokens_per_second=completion_tokens / seconds if seconds > 0 else 0.0, **extra)
+
+    def generate(self, query: str, system_prompt: str = None, temperature: float = None, context: str = None,
+                 usage: dict | None = None):
+        """Returns the answer text; token usage from the llama.cpp response is written into usage if given."""
         if temperature == None:
             temperature = self.temperature
 
-        if system_prompt:
-            query = f"{system_prompt}\n\nUser request:{query}"
-
-        messages.append({"role": "user", "content": query})
+        messages = self._build_messages(query, system_prompt, context)
+
+        self.ensure_loaded()
+        with self._lock:
+            start = time.perf_counter()
+            self._restore_prompt_state(system_prompt)
+            response = self.llm.create_chat_completion(
+                messages=messages,
+                temperature=temperature,
+                max_tokens=self.max_tokens
+            )
+            seconds = time.perf_counter() - start
+
+        response_usage = response.get("usage") or {}
+        self._fill_usage(usage, response_usage.get("prompt_tokens", 0), response_usage.get("completion_tokens", 0), seconds)
+        return response["choices"][0]["message"]["content"]
 
-        response = self.llm.create_chat_completion(
-            messages=messages,
-            temperature=temperature,
-            max_tokens=self.max_tokens
-        )
+    def generate_stream(self, query: str, system_prompt: str = None, temperature: float = None, context: str = None,
+                        usage: dict | None = None):
+        """
+        Same as generate, but yields text pieces as llama.cpp produces them. Stream chunks carry
+        no usage: completion tokens are counted per chunk, prompt tokens from the context size.
+        """
+        if temperature == None:
+            temperature = self.temperature
 
-        return response["choices"][0]["message"]["content"]
+        messages = self._build_messages(query, system_prompt, context)
+
+        self.ensure_loaded()
+        # llama.cpp runs under the lock on its own thread and hands chunks over through a queue:
+        # the lock is never held across a yield, so a slow or stalled consumer (e.g. waiting for
+        # a free executor thread) can't block other generations, and they can't block its next step
+        chunks = queue.Queue()
+        stop = threading.Event()
+
+        def produce():
+            start = time.perf_counter()
+            first_token_seconds = None
+            completion_tokens = 0
+            try:
+                with self._lock:
+                    try:
+                        self._restore_prompt_state(system_prompt)
+                        for chunk in self.llm.create_chat_completion(
+                            messages=messages,
+                            temperature=temperature,
+                            max_tokens=self.max_tokens,
+                            stream=True
+                        ):
+                            if stop.is_set():
+                                break
+                            content = chunk["choices"][0]["delta"].get("content")
+                            if content:
+                                completion_tokens += 1
+                                if first_token_seconds is None:
+                                    first_token_seconds = time.perf_counter() - start
+                                chunks.put(content)
+                    finally:
+                        self._fill_usage(usage, max(self.llm.n_tokens - completion_tokens, 0), completion_tokens,
+                                         time.perf_counter() - start, first_token_seconds=first_token_seconds)
+            except Exception as e:
+                chunks.put(e)
+            finally:
+                chunks.put(None)
+
+        producer = threading.Thread(target=produce, name="llm-stream", daemon=True)
+        producer.start()
+        try:
+            while (item := chunks.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # Closed early: generation stops at the next chunk; usage is filled once it has
+            stop.set()
+            producer.join()
 
-    def rewrite_query(self, query: str) -> str:
+    def rewrite_query(self, query: str, usage: dict | None = None) -> str:
 
         q = (query or "").strip()
         if not q:
             return ""
 
-        system_prompt = """You rewrite movie search queries into a structured format. There are two indexes:
-- Plot Index: for story, mood, atmosphere, themes, "movies like X"
-- Meta Index: for facts — specific person names (actors/directors), years, genres as filters, ratings, studios
-
-PRIORITY RULES (apply in order):
-1. Query mentions a SPECIFIC PERSON'S NAME (actor or director) → ALWAYS use Cast: or Directors:
-2. Query mentions a SPECIFIC YEAR or DECADE → use Release_info:
-3. Query mentions a SPECIFIC RATING (high rated, Oscar-winning, etc.) → use Rating:
-4. Query mentions a GENRE as a hard filter (not as mood/vibe) → use Genres:
-5. Everything else (vibes, moods, "like X movie", story themes, atmosphere) → use Plot:
-
-Output formats:
-- Plot: "Plot: [natural language query]"
-- Meta: "Directors: X" or "Cast: X" or "Genres: X | Release_info: Y" — only include relevant fields, separated by " | "
-
-Examples:
-User: "Movies by Christopher Nolan" → Directors: Christopher Nolan
-User: "Films with Jeff Goldblum" → Cast: Jeff Goldblum
-User: "Jeff Goldblum movies" → Cast: Jeff Goldblum
-User: "Leonardo DiCaprio after 2010 with high rating" → Cast: Leonardo DiCaprio | Release_info: after 2010 | Rating: high
-User: "Animated films released after 2020" → Genres: Animation | Release_info: after 2020
-User: "Sci-fi movies of 2023" → Genres: sci-fi | Release_info: 2023
-User: "Something like Interstellar but more emotional" → Plot: emotional space drama like Interstellar
-User: "Funny movie like Wedding Crashers" → Plot: comedy like Wedding Crashers
-User: "Cult classic like The Room" → Plot: cult classic absurdist like The Room
-User: "Dark psychological thriller" → Plot: dark psychological thriller
-User: "Good thriller with a twist ending" → Plot: thriller with twist ending
-
-Return ONLY the rewritten query. No explanation, no extra text."""
+        system_prompt = REWRITE_SYSTEM_PROMPT
 
         try:
-            out = self.generate(q, system_prompt, temperature=0.0)
+            out = self.generate(q, system_prompt, temperature=0.0, usage=usage)
             if not isinstance(out, str):
                 return q
             out = out.replace("\r", " ").replace("\n", " ").strip()
@@ -124,8 +299,9 @@ Return ONLY the rewritten query. No explanation, no extra text."""
             print(f"ERROR while rewriting user query: {e}")
             return q
 
-    def generate_with_context(self, query: str, films: list):
-
+    @staticmethod
+    def _films_context(films: list) -> str:
+        """Per-request part of the recommendation prompt (goes after the static system prompt)."""
         context_parts = []
         for i, film in enumerate(films, 1):
             title = film.get("title", "Unknown")
@@ -137,23 +313,19 @@ Return ONLY the rewritten query. No explanation, no extra text."""
         film_titles = [film["title"] for film in films if film.get("title")]
         titles_list = ", ".join(f'"{t}"' for t in film_titles)
 
-        system_prompt = (
-            f"You are a movie recommendation assistant.\n"
-            f"You have {len(films)} films from the database that may match the user's request: {titles_list}.\n"
-            f"Do NOT recommend films the user has already mentioned in their message.\n\n"
-            "Rules:\n"
-            "1. First, check the database films below. If 1-2 of them are a good fit, recommend those.\n"
-            "2. If the database films are a weak or partial match, recommend the best one from the list AND supplement with 1 film from your own knowledge that fits better.\n"
-            "3. If none of the database films are relevant, ignore the list entirely and recommend 1-2 films from your own knowledge.\n"
-            "4. Decide how many films to recommend based on the request: recommend 1 film if the request is very specific (exact mood, niche genre, or 'something like X'), recommend 2-3 films if the request is broad or open-ended (e.g. 'good action movies', 'comedies to watch tonight').\n"
-            "5. For each recommendation give the exact title and 1-2 sentences on why it fits the request.\n"
-            "6. Present all recommendations as a single unified list. Do NOT separate or label films by source (do not write 'from the database', 'from my knowledge', 'I also recommend', etc.).\n"
-            "7. Never apologize for results or say you cannot find a match.\n\n"
+        return (
+            f"You have {len(films)} films from the database that may match the user's request: {titles_list}.\n\n"
             f"Database film details:\n{context_text}"
         )
 
-        return self.generate(query, system_prompt=system_prompt, temperature=0.1)
+    def generate_with_context(self, query: str, films: list, usage: dict | None = None):
+        context = self._films_context(films)
+        return self.generate(query, system_prompt=RECOMMEND_SYSTEM_PROMPT, temperature=0.1, context=context, usage=usage)
 
+    def generate_with_context_stream(self, query: str, films: list, usage: dict | None = None):
+        context = self._films_context(films)
+        yield from self.generate_stream(query, system_prompt=RECOMMEND_SYSTEM_PROMPT, temperature=0.1, context=context,
+                                        usage=usage)
 
 if __name__ == "__main__":
     llm_model = BaseLLMModel()
@@ -0,0 +1,70 @@
+import re
+import time
+
+try:
+    from .base_llm import BaseLLMModel, REWRITE_SYSTEM_PROMPT
+except ImportError:
+    from base_llm import BaseLLMModel, REWRITE_SYSTEM_PROMPT
+
+
+class StubLlama:
+    """
+    Stand-in for llama_cpp.Llama for benchmarks and CI (nothing is downloaded).
+
+    Query rewrites become "Plot: <request>", recommendations list the first database films
+    of the prompt. Whitespace-separated words count as tokens; every generated token takes
+    token_ms milliseconds, so decoding cost can be simulated.
+    """
+    def __init__(self, token_ms: float = 0.0):
+        self.token_ms = token_ms
+        self.n_tokens = 0
+
+    def reset(self):
+        self.n_tokens = 0
+
+    def save_state(self):
+        return self.n_tokens
+
+    def load_state(self, state):
+        self.n_tokens = state
+
+    @staticmethod
+    def _answer(messages: list[dict]) -> str:
+        system = next((m["content"] for m in messages if m["role"] == "system"), "")
+        user = messages[-1]["content"] if messages[-1]["role"] == "user" else ""
+        request = user.rsplit("User request:", 1)[-1].strip()
+        if system == REWRITE_SYSTEM_PROMPT:
+            return f"Plot: {request}"
+        titles = re.findall(r"^Film \d+: (.+)$", user, flags=re.MULTILINE)
+        if titles:
+            return "\n".join(f'{i}. {title} - fits the request "{request}".' for i, title in enumerate(titles[:3], 1))
+        return request
+
+    def _stream(self, prompt_tokens: int, words: list[str]):
+        self.n_tokens = prompt_tokens
+        for i, word in enumerate(words):
+            time.sleep(self.token_ms / 1000)
+            self.n_tokens += 1
+            yield {"choices": [{"delta": {"content": word if i == 0 else f" {word}"}}]}
+
+    def create_chat_completion(self, messages: list[dict], temperature: float = 0.0, max_tokens: int = 512,
+                               stream: bool = False):
+        prompt_tokens = sum(len(m["content"].split()) for m in messages)
+        words = self._answer(messages).split(" ")[:max_tokens]
+        if stream:
+            return self._stream(prompt_tokens, words)
+
+        time.sleep(self.token_ms * len(words) / 1000)
+        self.n_tokens = prompt_tokens + len(words)
+        return {
+            "choices": [{"message": {"role": "assistant", "content": " ".join(words)}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                      "total_tokens": prompt_tokens + len(words)},
+        }
+
+
+class StubLLMModel(BaseLLMModel):
+    """BaseLLMModel over StubLlama: locking, prompt cache and usage accounting run unchanged."""
+    def _create_llm(self):
+        self.model_path = None
+        return StubLlama(token_ms=self.config["benchmark"]["stub_token_ms"])
@@ -0,0 +1,41 @@
+import time
+from contextlib import contextmanager, nullcontext
+
+
+class Timings:
+    """
+    Timing spans of one request: seconds per pipeline stage, token usage of every LLM call
+    and request labels (search type, cache hit). Spans of the same stage add up.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.llm_calls = []
+        self.labels = {}
+
+    @contextmanager
+    def span(self, stage: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start)
+
+    def add(self, stage: str, seconds: float):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_llm_call(self, task: str, usage: dict):
+        """usage as filled by BaseLLMModel: prompt/completion tokens, seconds and tokens_per_second."""
+        if usage:
+            self.llm_calls.append({"task": task, **usage})
+
+    def as_dict(self) -> dict:
+        """Per-request breakdown (milliseconds) as returned by the API."""
+        return {
+            **self.labels,
+            "stages_ms": {stage: seconds * 1000 for stage, seconds in self.stages.items()},
+            "llm": self.llm_calls,
+        }
+
+def span(timings: Timings | None, stage: str):
+    """Timings.span, or a no-op when no timings are collected."""
+    return timings.span(stage) if timings is not None else nullcontext()
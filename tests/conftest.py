@@ -0,0 +1,36 @@
+import os
+import sys
+import pytest
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#(title, release_info, overview, genres, directors, cast, vote_average, vote_count)
+FILMS = [
+    ("Heat", "1995", "A detective hunts a crew of professional bank robbers in Los Angeles.", ["Crime", "Thriller"], ["Michael Mann"], ["Al Pacino", "Robert De Niro"], 8.2, 6000),
+    ("Collateral", "2004", "A cab driver is forced to drive a hitman around Los Angeles for one night.", ["Crime", "Thriller"], ["Michael Mann"], ["Tom Cruise", "Jamie Foxx"], 7.5, 5000),
+    ("Interstellar", "2014", "Astronauts travel through a wormhole to find a new home for humanity.", ["Science Fiction", "Drama"], ["Christopher Nolan"], ["Matthew McConaughey", "Anne Hathaway"], 8.4, 30000),
+    ("Inception", "2010", "A thief steals secrets by entering the dreams of his targets.", ["Science Fiction", "Action"], ["Christopher Nolan"], ["Leonardo DiCaprio", "Tom Hardy"], 8.4, 34000),
+    ("Gravity", "2013", "Two astronauts are stranded in space after debris destroys their shuttle.", ["Science Fiction", "Thriller"], ["Alfonso Cuaron"], ["Sandra Bullock", "George Clooney"], 7.2, 14000),
+    ("Amelie", "2001", "A shy waitress in Paris decides to change the lives of the people around her.", ["Comedy", "Romance"], ["Jean-Pierre Jeunet"], ["Audrey Tautou"], 7.9, 11000),
+]
+
+
+def film_data() -> pd.DataFrame:
+    rows = []
+    for title, year, overview, genres, directors, cast, vote_average, vote_count in FILMS:
+        meta = f"Directors: {', '.join(directors)} | Cast: {', '.join(cast)} | Genres: {', '.join(genres)} | Release_info: {year}"
+        rows.append({
+            "title": title, "release_info": year, "overview": overview, "vote_average": vote_average,
+            "vote_count": float(vote_count), "popularity": 1.0, "runtime": 120.0, "genres": genres,
+            "directors": directors, "cast": cast, "production_countries": None, "production_companies": None,
+            "keywords": None, "title_plot": f"{title}: {overview}", "title_meta": f"{title}: {meta}",
+        })
+    return pd.DataFrame(rows)
+
+
+@pytest.fixture(autouse=True)
+def project_root(monkeypatch):
+    """Modules read config/config.yaml relative to the working directory."""
+    monkeypatch.chdir(ROOT)
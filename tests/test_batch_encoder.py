@@ -0,0 +1,97 @@
+import threading
+import numpy as np
+import pytest
+
+from src.dataset.batch_encoder import BatchEncoder
+
+
+class RecordingModel:
+    """Encodes a sentence as [its number, its length]; records the batches it was called with."""
+    def __init__(self, delay: threading.Event | None = None):
+        self.batches = []
+        self.delay = delay
+
+    def encode(self, sentences, **kwargs):
+        if self.delay is not None:
+            self.delay.wait(timeout=5)
+        self.batches.append(list(sentences))
+        return np.asarray([[float(s.split()[-1]), len(s)] for s in sentences], dtype="float32")
+
+class FailingModel:
+    def encode(self, sentences, **kwargs):
+        raise RuntimeError("encoder failed")
+
+
+def test_single_request_keeps_sentence_order():
+    model = RecordingModel()
+    encoder = BatchEncoder(model, max_wait_ms=0)
+    embeddings = encoder.encode(["query 3", "query 1", "query 2"])
+    assert embeddings[:, 0].tolist() == [3.0, 1.0, 2.0]
+    assert model.batches == [["query 3", "query 1", "query 2"]]
+
+def test_concurrent_requests_are_coalesced():
+    release = threading.Event()
+    model = RecordingModel(delay=release)
+    encoder = BatchEncoder(model, max_batch_size=64, max_wait_ms=200)
+
+    # The first request blocks the worker, the others queue up and are coalesced into one batch
+    results = {}
+    def run(i):
+        results[i] = encoder.encode([f"query {i * 10 + j}" for j in range(i + 1)])
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(5)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    for i in range(5):
+        assert results[i][:, 0].tolist() == [float(i * 10 + j) for j in range(i + 1)]
+    stats = encoder.stats()
+    assert stats["requests"] == 5
+    assert stats["sentences"] == 15
+    assert stats["batches"] == len(model.batches) < 5
+
+def test_batches_are_capped_at_max_batch_size():
+    release = threading.Event()
+    model = RecordingModel(delay=release)
+    encoder = BatchEncoder(model, max_batch_size=4, max_wait_ms=200)
+
+    threads = [threading.Thread(target=encoder.encode, args=([f"query {i}", f"query {i}"],)) for i in range(6)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    # A batch stops collecting once it reaches max_batch_size sentences
+    assert all(len(batch) <= 4 for batch in model.batches)
+    assert sum(map(len, model.batches)) == 12
+
+@pytest.mark.parametrize("sizes", [[3, 3, 3, 3], [1, 4, 2, 3, 1], [6, 1, 1]])
+def test_no_batch_exceeds_max_batch_size(sizes):
+    release = threading.Event()
+    model = RecordingModel(delay=release)
+    encoder = BatchEncoder(model, max_batch_size=4, max_wait_ms=200)
+
+    results = {}
+    def run(i, size):
+        results[i] = encoder.encode([f"query {i * 10 + j}" for j in range(size)])
+    threads = [threading.Thread(target=run, args=(i, size)) for i, size in enumerate(sizes)]
+    for thread in threads:
+        thread.start()
+    release.set()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    # Only a request larger than max_batch_size, encoded on its own, may exceed it
+    oversized = [size for size in sizes if size > 4]
+    assert all(len(batch) <= 4 or len(batch) in oversized for batch in model.batches)
+    assert sum(map(len, model.batches)) == sum(sizes)
+    for i, size in enumerate(sizes):
+        assert results[i][:, 0].tolist() == [float(i * 10 + j) for j in range(size)]
+
+def test_errors_are_raised_in_every_caller():
+    encoder = BatchEncoder(FailingModel(), max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="encoder failed"):
+        encoder.encode(["query 1"])
+    assert encoder.stats()["batches"] == 0
@@ -0,0 +1,57 @@
+import faiss
+import numpy as np
+
+from src.dataset.binary_index import BinaryRescoreIndex, BinarySearchParameters
+
+
+def bitmap_selector(ids, n_total: int):
+    """Same selector FaissIndex._plot_id_selector builds."""
+    bits = np.zeros(n_total, dtype=bool)
+    bits[ids] = True
+    bitmap = np.packbits(bits, bitorder="little")
+    sel = faiss.IDSelectorBitmap(len(bitmap), faiss.swig_ptr(bitmap))
+    sel.referenced_objects = [bitmap]
+    sel.bitmap_array = bitmap
+    return sel
+
+def make_index(n: int = 2000, d: int = 32, seed: int = 0) -> tuple[BinaryRescoreIndex, np.ndarray]:
+    x = np.random.default_rng(seed).standard_normal((n, d)).astype(np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    index = BinaryRescoreIndex(d, rescore_factor=2)
+    index.add_with_ids(x, np.arange(n))
+    return index, x
+
+
+def test_unfiltered_search_returns_rescored_top_k():
+    index, x = make_index()
+    scores, labels = index.search(x[:5], 3)
+    assert labels[:, 0].tolist() == [0, 1, 2, 3, 4]
+    assert np.allclose(scores[:, 0], 1.0, atol=1e-2)
+    assert (np.diff(scores, axis=1) <= 0).all()
+
+def test_selective_filter_returns_all_allowed_rows():
+    index, x = make_index()
+    allowed = [7, 512, 1999]
+    _, labels = index.search(x[:2], 5, params=BinarySearchParameters(sel=bitmap_selector(allowed, 2000)))
+    for row in labels:
+        assert sorted(row[row != -1].tolist()) == allowed
+
+def test_filtered_shortlist_only_returns_members():
+    index, x = make_index()
+    allowed = np.arange(0, 2000, 2)
+    # faiss.SearchParameters loses bitmap_array, membership falls back to sel.is_member
+    for params in (BinarySearchParameters(sel=bitmap_selector(allowed, 2000)),
+                   faiss.SearchParameters(sel=bitmap_selector(allowed, 2000))):
+        _, labels = index.search(x[:4], 10, params=params)
+        assert (labels != -1).all()
+        assert (labels % 2 == 0).all()
+        assert labels[0, 0] == 0 and labels[2, 0] == 2
+
+def test_members_matches_is_member():
+    allowed = [0, 9, 17, 63]
+    sel = bitmap_selector(allowed, 64)
+    ids = np.array([0, 1, 9, 17, 62, 63, 64, 1000])
+    expected = [sel.is_member(int(i)) for i in ids]
+    assert BinaryRescoreIndex._members(sel, ids).tolist() == expected
+    del sel.bitmap_array
+    assert BinaryRescoreIndex._members(sel, ids).tolist() == expected
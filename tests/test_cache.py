@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from src import cache as cache_module
+from src.cache import QueryCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now[0])
+    return now
+
+def unit(*values) -> np.ndarray:
+    v = np.asarray(values, dtype="float32")
+    return v / np.linalg.norm(v)
+
+
+def test_exact_hit_uses_normalized_query():
+    cache = QueryCache(semantic=False)
+    cache.put("Dark psychological thriller", "answer")
+    assert cache.get("  dark   PSYCHOLOGICAL thriller?! ") == "answer"
+    assert cache.get("light comedy") is None
+    stats = cache.stats()
+    assert (stats["hits_exact"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+def test_lru_evicts_least_recently_used():
+    cache = QueryCache(max_size=2, semantic=False)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    assert cache.get("a") == 1  # "b" is now the least recently used
+    cache.put("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+def test_entries_expire_after_ttl(clock):
+    cache = QueryCache(ttl_seconds=10, semantic=True)
+    cache.put("a", 1, unit(1, 0))
+    clock[0] += 10
+    assert cache.get("a") == 1
+    clock[0] += 0.1
+    assert cache.get("a") is None
+    assert cache.get("b", unit(1, 0)) is None
+    assert cache.stats()["size"] == 0
+
+def test_semantic_threshold():
+    cache = QueryCache(semantic=True, semantic_threshold=0.95)
+    cache.put("space drama about loneliness", "answer", unit(1, 0, 0))
+    assert cache.get("lonely space drama", unit(1, 0.2, 0)) == "answer"  # cosine 0.98
+    assert cache.get("space war epic", unit(1, 0.5, 0)) is None  # cosine 0.89
+    assert cache.get("lonely space drama", None) is None
+    stats = cache.stats()
+    assert (stats["hits_semantic"], stats["misses"]) == (1, 2)
+
+def test_semantic_level_off_and_entries_without_embedding():
+    cache = QueryCache(semantic=False)
+    cache.put("a", 1, unit(1, 0))
+    assert cache.get("b", unit(1, 0)) is None
+
+    cache = QueryCache(semantic=True)
+    cache.put("movies by christopher nolan", 1)  # meta queries are cached without embedding
+    assert cache.get("movies by denis villeneuve", unit(1, 0)) is None
+
+def test_clear():
+    cache = QueryCache()
+    cache.put("a", 1, unit(1, 0))
+    cache.clear()
+    assert cache.get("a", unit(1, 0)) is None
@@ -0,0 +1,53 @@
+import numpy as np
+
+from src.dataset.film_store import FilmStore
+
+
+def columns(titles: list[str]) -> dict[str, list[str]]:
+    return {
+        "title": titles,
+        "plot_text": [f"{t}: plot" for t in titles],
+        "meta_text": [f"{t}: meta" for t in titles],
+    }
+
+
+def test_write_and_read(tmp_path):
+    FilmStore.write(str(tmp_path), columns(["Heat", "Amélie", ""]))
+    store = FilmStore(str(tmp_path))
+    assert len(store) == 3
+    assert store.row(0) == ("Heat", "Heat: plot", "Heat: meta")
+    assert store.get("title", 1) == "Amélie"  # offsets are in bytes of UTF-8
+    assert store.get("title", 2) == ""
+    assert store.column("plot_text") == ["Heat: plot", "Amélie: plot", ": plot"]
+
+def test_none_values_are_empty_strings(tmp_path):
+    FilmStore.write(str(tmp_path), {"title": ["Heat", None]})
+    assert FilmStore(str(tmp_path)).column("title") == ["Heat", ""]
+
+def test_append(tmp_path):
+    FilmStore.write(str(tmp_path), columns(["Heat"]))
+    before = FilmStore(str(tmp_path))
+    FilmStore.append(str(tmp_path), columns(["Collateral", "Ran"]))
+
+    store = FilmStore(str(tmp_path))
+    assert len(store) == 3
+    assert store.column("title") == ["Heat", "Collateral", "Ran"]
+    assert store.row(2) == ("Ran", "Ran: plot", "Ran: meta")
+    # A store opened before the append still sees its own rows
+    assert len(before) == 1 and before.row(0) == ("Heat", "Heat: plot", "Heat: meta")
+
+def test_append_drops_bytes_of_an_interrupted_append(tmp_path):
+    FilmStore.write(str(tmp_path), columns(["Heat"]))
+    with open(tmp_path / "title.bin", "ab") as f:
+        f.write(b"garbage")
+    FilmStore.append(str(tmp_path), columns(["Ran"]))
+    store = FilmStore(str(tmp_path))
+    assert store.column("title") == ["Heat", "Ran"]
+    assert np.load(tmp_path / "title_offsets.npy").tolist() == [0, 4, 7]
+
+def test_empty_column(tmp_path):
+    FilmStore.write(str(tmp_path), {"title": ["", ""]})
+    store = FilmStore(str(tmp_path))
+    assert store.column("title") == ["", ""]
+    FilmStore.append(str(tmp_path), {"title": ["Heat"]})
+    assert FilmStore(str(tmp_path)).column("title") == ["", "", "Heat"]
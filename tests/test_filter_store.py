@@ -0,0 +1,78 @@
+import datetime
+import numpy as np
+import pytest
+
+from conftest import FILMS, film_data
+from src.dataset.filter_store import FilterStore
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    path = tmp_path_factory.mktemp("filter_store")
+    FilterStore.build_from_data(film_data(), str(path), high_rating=8.0, low_rating=7.5, min_votes=1000)
+    return FilterStore(str(path))
+
+def titles(mask: np.ndarray) -> list[str]:
+    return [FILMS[row][0] for row in np.flatnonzero(mask)]
+
+
+def test_build(store):
+    assert len(store) == len(FILMS)
+    assert (store.high_rating, store.low_rating, store.min_votes) == (8.0, 7.5, 1000)
+    assert {"crime", "thriller", "science fiction"} <= set(store.genre_vocab)
+    assert set(store.director_vocab) == {"michael mann", "christopher nolan", "alfonso cuaron", "jean-pierre jeunet"}
+
+@pytest.mark.parametrize("value, years", [
+    ("after 2010", (2011, None)),
+    ("since 2010", (2011, None)),
+    ("before 2000", (None, 1999)),
+    ("between 1990 and 2005", (1990, 2005)),
+    ("1990s", (1990, 1999)),
+    ("2004", (2004, 2004)),
+    ("in 2004", (2004, 2004)),
+    ("sometime soon", None),
+])
+def test_parse_years(value, years):
+    assert FilterStore._parse_years(value) == years
+
+def test_parse_relative_years():
+    this_year = datetime.date.today().year
+    assert FilterStore._parse_years("last decade") == (this_year - 10, this_year)
+    assert FilterStore._parse_years("recent") == (this_year - 3, this_year)
+
+def test_parse_maps_known_fields_to_filters(store):
+    filters, residual = store.parse("Directors: Michael Mann | Genres: Sci-Fi, Crime | Release_info: after 2000 | Rating: high")
+    assert filters == {"directors": ["Michael Mann"], "genres": ["Science Fiction", "Crime"],
+                       "year_min": 2001, "year_max": None, "min_rating": 8.0, "min_votes": 1000}
+    assert residual == ""
+
+def test_parse_keeps_unknown_values_in_residual(store):
+    filters, residual = store.parse("Cast: Tom Cruise, Nobody Known | Genres: Western | Release_info: someday | Keywords: heist")
+    assert filters == {"cast": ["Tom Cruise"]}
+    assert residual == "Cast: Nobody Known | Genres: Western | Release_info: someday | Keywords: heist"
+
+def test_parse_low_rating(store):
+    filters, _ = store.parse("Rating: low")
+    assert filters == {"max_rating": 7.5, "min_votes": 1000}
+
+def test_mask_years_and_ratings(store):
+    assert titles(store.mask({})) == [film[0] for film in FILMS]
+    assert titles(store.mask({"year_min": 2005, "year_max": 2013})) == ["Inception", "Gravity"]
+    assert titles(store.mask({"min_rating": 8.0, "min_votes": 10000})) == ["Interstellar", "Inception"]
+    assert titles(store.mask({"max_rating": 7.5})) == ["Collateral", "Gravity"]
+
+def test_mask_genres_and_people(store):
+    # All listed genres must match
+    assert titles(store.mask({"genres": ["Science Fiction", "Thriller"]})) == ["Gravity"]
+    assert titles(store.mask({"directors": ["Michael Mann"]})) == ["Heat", "Collateral"]
+    assert titles(store.mask({"directors": ["michael mann"], "cast": ["Tom Cruise"]})) == ["Collateral"]
+    assert titles(store.mask({"cast": ["Nobody Known"]})) == []
+
+def test_parse_then_mask(store):
+    filters, _ = store.parse("Genres: Crime | Release_info: 1990s")
+    assert titles(store.mask(filters)) == ["Heat"]
+
+def test_top_rows(store):
+    rows, scores = store.top_rows(store.mask({"genres": ["Science Fiction"]}), top_k=2)
+    assert [FILMS[row][0] for row in rows] == ["Inception", "Interstellar"]
+    assert scores[0] >= scores[1]
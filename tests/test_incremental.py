@@ -0,0 +1,65 @@
+import numpy as np
+
+from src.dataset.incremental import IndexManifest, film_keys, text_hashes
+
+
+def manifest(titles: list[str], plots: list[str]) -> IndexManifest:
+    keys = film_keys(titles, ["2000"] * len(titles))
+    return IndexManifest(keys, text_hashes(plots, [""] * len(plots)), np.zeros(len(keys), dtype=bool))
+
+
+def test_film_keys_are_unique():
+    keys = film_keys(["Heat", " heat ", "Heat", "Ran"], ["1995", "1995", None, "1985"])
+    assert keys == ["heat|1995", "heat|1995#1", "heat|", "ran|1985"]
+
+def test_text_hashes_change_with_either_text():
+    base = text_hashes(["plot"], ["meta"])
+    assert base == text_hashes(["plot"], ["meta"])
+    assert base != text_hashes(["plot 2"], ["meta"])
+    assert base != text_hashes(["plot"], ["meta 2"])
+
+def test_diff_and_apply():
+    indexed = manifest(["Heat", "Ran", "Alien"], ["heist", "war", "space"])
+    # Ran is deleted, Alien changes, Heat is unchanged, Up is new
+    titles, plots = ["Alien", "Heat", "Up"], ["space horror", "heist", "balloons"]
+    keys = film_keys(titles, ["2000"] * 3)
+    hashes = text_hashes(plots, [""] * 3)
+
+    data_rows, new_positions, deleted_rows = indexed.diff(keys, hashes)
+    assert data_rows.tolist() == [-1, 0, -1]
+    assert new_positions.tolist() == [0, 2]
+    assert deleted_rows.tolist() == [1, 2]
+
+    data_rows = indexed.apply(data_rows, new_positions, deleted_rows, keys, hashes)
+    # Existing rows keep their row_idx, changed and new films are appended
+    assert data_rows.tolist() == [3, 0, 4]
+    assert indexed.keys == ["heat|2000", "ran|2000", "alien|2000", "alien|2000", "up|2000"]
+    assert indexed.deleted.tolist() == [False, True, True, False, False]
+
+    # Diffing the same data again finds nothing to do
+    data_rows, new_positions, deleted_rows = indexed.diff(keys, hashes)
+    assert data_rows.tolist() == [3, 0, 4]
+    assert len(new_positions) == len(deleted_rows) == 0
+
+def test_deleted_film_can_come_back():
+    indexed = manifest(["Heat"], ["heist"])
+    keys, hashes = indexed.keys[:], indexed.hashes[:]
+    indexed.apply(*indexed.diff([], []), [], [])
+    assert indexed.deleted.tolist() == [True]
+
+    data_rows, new_positions, _ = indexed.diff(keys, hashes)
+    assert new_positions.tolist() == [0]
+    assert indexed.apply(data_rows, new_positions, np.empty(0, dtype=np.int64), keys, hashes).tolist() == [1]
+
+def test_save_and_load(tmp_path):
+    indexed = manifest(["Heat", "Ran"], ["heist", "war"])
+    indexed.deleted[1] = True
+    assert not IndexManifest.exists(str(tmp_path))
+    assert IndexManifest.load_deleted(str(tmp_path)) is None
+
+    indexed.save(str(tmp_path))
+    loaded = IndexManifest.load(str(tmp_path))
+    assert IndexManifest.exists(str(tmp_path))
+    assert (loaded.keys, loaded.hashes) == (indexed.keys, indexed.hashes)
+    assert loaded.deleted.tolist() == [False, True]
+    assert IndexManifest.load_deleted(str(tmp_path)).tolist() == [False, True]
@@ -0,0 +1,103 @@
+import os
+import json
+import types
+import pickle
+import yaml
+import pytest
+
+from conftest import ROOT, FILMS, film_data
+from src.dataset.film_data import write_film_data_part
+from src.dataset.index import FaissIndex, _index_paths
+
+
+@pytest.fixture
+def index(tmp_path, monkeypatch):
+    """Flat index over FILMS built with the stub embedder in a project copy under tmp_path."""
+    with open(os.path.join(ROOT, "config", "config.yaml"), "r") as f:
+        config = yaml.safe_load(f)
+    config["benchmark"]["stub_models"] = True
+    config["benchmark"]["stub_embed_dim"] = 64
+    config["query_encoder"]["batching"] = False
+    config["serving"]["mmap_indexes"] = False
+    config["index_versions"]["enabled"] = False
+    os.makedirs(tmp_path / "config")
+    with open(tmp_path / "config" / "config.yaml", "w") as f:
+        yaml.safe_dump(config, f)
+    os.makedirs(tmp_path / config["paths"]["film_data"])
+    write_film_data_part(film_data(), str(tmp_path / config["paths"]["film_data"] / "part-00000.parquet"))
+
+    monkeypatch.chdir(tmp_path)
+    index = FaissIndex(lazy=True)
+    index.build(index_types=["Flat"])
+    return FaissIndex()
+
+
+@pytest.mark.parametrize("search_type", ["meta", "plot", "hybrid"])
+def test_search_batch_matches_search(index, search_type):
+    queries = ["Michael Mann crime", "Christopher Nolan science fiction", "Sandra Bullock thriller"]
+    batch = index.search_batch(search_type, queries, top_k=3)
+    assert len(batch) == len(queries)
+    for query, results in zip(queries, batch):
+        single = index.search(search_type, query, top_k=3)
+        assert [r["row_idx"] for r in results] == [r["row_idx"] for r in single]
+        assert 0 < len(results) <= 3
+        for r in results:
+            assert set(r) == set(single[0])
+            assert r["title"] == FILMS[r["row_idx"]][0]
+
+def test_build_creates_the_person_gazetteer(index):
+    with open(index.GAZETTEER_PATH, "rb") as f:
+        gazetteer = pickle.load(f)
+    assert set(gazetteer) == {"michael mann", "christopher nolan"}
+
+def test_stub_indexes_live_apart_from_real_ones(index):
+    config = {"paths": {"index_root": "indexes", "faiss_index": "indexes/index", "film_store": "indexes/film_store",
+                        "filter_store": "indexes/filter_store", "bm25_index": "indexes/bm25_meta",
+                        "person_gazetteer": "indexes/person_gazetteer.pkl", "index_manifest": "indexes/manifest",
+                        "film_data": "data/prep/film_data"}}
+    assert _index_paths(config) == config["paths"]
+    stub_paths = _index_paths(config, stub=True)
+    assert stub_paths["index_root"] == "indexes_stub"
+    assert stub_paths["film_store"] == os.path.join("indexes_stub", "film_store")
+    assert stub_paths["film_data"] == "data/prep/film_data"
+    assert index.FILM_STORE_PATH == os.path.join("indexes_stub", "film_store")
+
+def test_stub_build_refuses_to_overwrite_real_indexes(index):
+    info_path = index._plot_index_path("Flat") + ".json"
+    with open(info_path, "r") as f:
+        info = json.load(f)
+    assert info["stub"] is True
+    info.pop("stub")
+    with open(info_path, "w") as f:
+        json.dump(info, f)
+    with pytest.raises(RuntimeError, match="refusing to overwrite"):
+        index.build(index_types=["Flat"])
+    assert os.path.exists(index._plot_index_path("Flat"))
+
+def test_search_batch_with_filters(index):
+    filters, _ = index.filter_store.parse("Directors: Michael Mann")
+    for results in index.search_batch("plot", ["a night in the city", "space travel"], top_k=5, filters=filters):
+        assert sorted(r["title"] for r in results) == ["Collateral", "Heat"]
+
+
+def fuse(params: dict, bm25: list[tuple[int, float]], plot: list[tuple[int, float]], top_k: int = 10) -> list[tuple[int, float]]:
+    index = types.SimpleNamespace(hybrid_params={"rrf_k": 60, "bm25_weight": 1.0, "plot_weight": 1.0, **params})
+    to_results = lambda pairs: [{"row_idx": row, "score": score, "title": str(row)} for row, score in pairs]
+    return [(r["row_idx"], r["score"]) for r in FaissIndex._fuse(index, to_results(bm25), to_results(plot), top_k)]
+
+def test_rrf_fusion():
+    fused = fuse({"fusion": "rrf"}, bm25=[(1, 20.0), (2, 10.0)], plot=[(2, 0.9), (3, 0.8)])
+    assert [row for row, _ in fused] == [2, 1, 3]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 61)
+    assert fused[1][1] == pytest.approx(1 / 61)
+    assert fuse({"fusion": "rrf"}, bm25=[(1, 20.0), (2, 10.0)], plot=[(2, 0.9), (3, 0.8)], top_k=1) == fused[:1]
+
+def test_weighted_fusion():
+    params = {"fusion": "weighted", "bm25_weight": 0.3, "plot_weight": 0.7}
+    fused = dict(fuse(params, bm25=[(1, 20.0), (2, 10.0), (3, 0.0)], plot=[(3, 0.9), (1, 0.5)]))
+    # Scores are min-max normalized per leg before weighting
+    assert fused == pytest.approx({1: 0.3 * 1.0 + 0.7 * 0.0, 2: 0.3 * 0.5, 3: 0.3 * 0.0 + 0.7 * 1.0})
+
+def test_fusion_with_an_empty_leg():
+    assert fuse({"fusion": "rrf"}, bm25=[], plot=[(5, 0.9)]) == [(5, pytest.approx(1 / 61))]
+    assert fuse({"fusion": "weighted"}, bm25=[(4, 3.0)], plot=[]) == [(4, 1.0)]
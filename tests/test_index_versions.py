@@ -0,0 +1,130 @@
+import os
+import time
+import threading
+import pytest
+
+from src.dataset import index_versions as index_versions_module
+from src.dataset.index_versions import IndexVersions, RWLock, fingerprint
+
+
+@pytest.fixture
+def versions(tmp_path, monkeypatch):
+    # Version names come from a fake clock, one second apart
+    now = [time.mktime((2026, 1, 1, 0, 0, 0, 0, 0, -1))]
+    real_strftime = time.strftime
+    def strftime(fmt):
+        now[0] += 1
+        return real_strftime(fmt, time.localtime(now[0]))
+    monkeypatch.setattr(index_versions_module.time, "strftime", strftime)
+
+    root = tmp_path / "indexes"
+    (root / "film_store").mkdir(parents=True)
+    (root / "film_store" / "title.bin").write_bytes(b"Heat")
+    (root / "index_FlatIP_plot.ivf").write_bytes(b"faiss")
+    return IndexVersions(str(root), keep=2)
+
+
+def test_first_version_clones_the_flat_layout(versions):
+    assert versions.current() is None
+    version_dir = versions.create()
+    assert sorted(os.listdir(version_dir)) == ["film_store", "index_FlatIP_plot.ivf"]
+    # Index files are hard-linked, the append-only film store is copied
+    assert os.path.samefile(os.path.join(version_dir, "index_FlatIP_plot.ivf"), os.path.join(versions.root, "index_FlatIP_plot.ivf"))
+    assert not os.path.samefile(os.path.join(version_dir, "film_store", "title.bin"), os.path.join(versions.root, "film_store", "title.bin"))
+
+def test_publish_switches_current(versions):
+    first = versions.create()
+    versions.publish(first)
+    assert os.path.samefile(versions.current(), first)
+    assert os.readlink(versions.current_path) == os.path.relpath(first, versions.root)
+
+    # The next version is cloned from the current one, not from the flat layout
+    with open(os.path.join(first, "bm25_meta"), "w") as f:
+        f.write("bm25")
+    second = versions.create()
+    assert "bm25_meta" in os.listdir(second)
+    assert os.path.samefile(versions.current(), first)
+    versions.publish(second)
+    assert os.path.samefile(versions.current(), second)
+
+def test_resolve(versions):
+    version_dir = versions.create()
+    root = versions.root
+    assert versions.resolve(os.path.join(root, "film_store"), version_dir) == os.path.join(version_dir, "film_store")
+    assert versions.resolve("data/prep/film_data", version_dir) == "data/prep/film_data"
+    assert versions.resolve(os.path.join(root, "film_store"), None) == os.path.join(root, "film_store")
+
+def test_prune_keeps_newest_and_current(versions):
+    created = [versions.create() for _ in range(3)]
+    versions.publish(created[0])
+    versions.prune()
+    # keep=2: the oldest one survives because it is current
+    assert sorted(os.listdir(versions.versions_path)) == sorted(os.path.basename(v) for v in created)
+
+    versions.publish(created[2])
+    assert sorted(os.listdir(versions.versions_path)) == sorted(os.path.basename(v) for v in created[1:])
+
+def test_fingerprint_detects_replaced_files(versions):
+    first = versions.create()
+    second = versions.create()
+    paths = lambda version_dir: [os.path.join(version_dir, "index_FlatIP_plot.ivf")]
+    assert fingerprint(paths(first)) == fingerprint(paths(second))
+
+    tmp_path = os.path.join(second, "index_FlatIP_plot.ivf.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(b"rebuilt")
+    os.replace(tmp_path, paths(second)[0])
+    assert fingerprint(paths(first)) != fingerprint(paths(second))
+
+
+def test_rwlock_readers_share():
+    lock = RWLock()
+    inside = threading.Barrier(3, timeout=5)
+    def read():
+        with lock.read():
+            inside.wait()
+    threads = [threading.Thread(target=read) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert not inside.broken
+
+def test_rwlock_writer_waits_for_readers_and_goes_first():
+    lock = RWLock()
+    events = []
+    reading = threading.Event()
+    release_reader = threading.Event()
+
+    def first_reader():
+        with lock.read():
+            reading.set()
+            release_reader.wait(timeout=5)
+            events.append("reader 1 done")
+
+    def writer():
+        with lock.write():
+            events.append("writer")
+
+    def second_reader():
+        with lock.read():
+            events.append("reader 2")
+
+    threads = [threading.Thread(target=first_reader)]
+    threads[0].start()
+    reading.wait(timeout=5)
+    threads.append(threading.Thread(target=writer))
+    threads[1].start()
+    # Wait until the writer is queued, then a new reader must not jump ahead of it
+    deadline = time.monotonic() + 5
+    while not lock._writers_waiting and time.monotonic() < deadline:
+        time.sleep(0.001)
+    threads.append(threading.Thread(target=second_reader))
+    threads[2].start()
+    time.sleep(0.05)
+    assert events == []
+
+    release_reader.set()
+    for thread in threads:
+        thread.join(timeout=5)
+    assert events == ["reader 1 done", "writer", "reader 2"]
@@ -0,0 +1,43 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from src.models.stub_llm import StubLLMModel
+
+FILMS = [{"title": "Heat", "plot_text": "A detective hunts a crew of bank robbers.", "meta_text": "Genres: Crime"}]
+
+
+def test_stream_matches_generate():
+    llm = StubLLMModel(lazy=True)
+    usage_stream, usage = {}, {}
+    streamed = "".join(llm.generate_with_context_stream("heist films", FILMS, usage=usage_stream))
+    assert streamed == llm.generate_with_context("heist films", FILMS, usage=usage)
+    assert usage_stream["completion_tokens"] == usage["completion_tokens"]
+    assert usage_stream["first_token_seconds"] is not None
+
+def test_stream_does_not_hold_the_lock_between_tokens():
+    llm = StubLLMModel(lazy=True)
+    llm.ensure_loaded()
+    llm.llm.token_ms = 5
+    executor = ThreadPoolExecutor(max_workers=2)
+
+    # A started stream and two blocking generations fill the executor; the stream's next step must still run
+    tokens = llm.generate_with_context_stream("heist films", FILMS)
+    first = executor.submit(next, tokens).result(timeout=5)
+    calls = [executor.submit(llm.generate_with_context, "heist films", FILMS) for _ in range(2)]
+    rest = executor.submit(lambda: "".join(tokens))
+    assert first + rest.result(timeout=10) == llm.generate_with_context("heist films", FILMS)
+    for call in calls:
+        call.result(timeout=10)
+    executor.shutdown()
+
+def test_closing_a_stream_early_releases_the_lock():
+    llm = StubLLMModel(lazy=True)
+    usage = {}
+    tokens = llm.generate_with_context_stream("heist films", FILMS, usage=usage)
+    next(tokens)
+    tokens.close()
+    assert usage["completion_tokens"] >= 1
+    acquired = llm._lock.acquire(timeout=5)
+    assert acquired
+    llm._lock.release()
+    assert not any(t.name == "llm-stream" and t.is_alive() for t in threading.enumerate())
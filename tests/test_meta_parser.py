@@ -0,0 +1,71 @@
+import pytest
+
+from conftest import film_data
+from src.dataset.film_data import write_film_data_part
+from src.dataset.meta_parser import MetaQueryParser, build_gazetteer
+
+
+@pytest.fixture(scope="module")
+def parser(tmp_path_factory):
+    path = tmp_path_factory.mktemp("meta_parser")
+    (path / "film_data").mkdir()
+    write_film_data_part(film_data(), str(path / "film_data" / "part-00000.parquet"))
+    build_gazetteer(str(path / "film_data"), str(path / "gazetteer.pkl"), min_person_films=1)
+    return MetaQueryParser(str(path / "gazetteer.pkl"))
+
+
+def test_gazetteer_keeps_people_with_enough_films(tmp_path):
+    (tmp_path / "film_data").mkdir()
+    write_film_data_part(film_data(), str(tmp_path / "film_data" / "part-00000.parquet"))
+    gazetteer = build_gazetteer(str(tmp_path / "film_data"), str(tmp_path / "gazetteer.pkl"), min_person_films=2)
+    assert gazetteer == {
+        "michael mann": ("Michael Mann", "Directors", 2, 0),
+        "christopher nolan": ("Christopher Nolan", "Directors", 2, 0),
+    }
+
+@pytest.mark.parametrize("query, expected", [
+    ("movies directed by Christopher Nolan", "Directors: Christopher Nolan"),
+    ("films with tom hardy", "Cast: Tom Hardy"),
+    ("Michael Mann crime movies starring Al Pacino", "Directors: Michael Mann | Cast: Al Pacino | Genres: Crime"),
+    ("sci-fi thrillers", "Genres: Thriller, Science Fiction"),
+])
+def test_names_and_genres(parser, query, expected):
+    assert parser.parse(query) == (expected, 1.0)
+
+@pytest.mark.parametrize("query, expected", [
+    ("comedies from the 90s", "Genres: Comedy | Release_info: 1990s"),
+    ("comedies from the '00s", "Genres: Comedy | Release_info: 2000s"),
+    ("dramas from the 1970s", "Genres: Drama | Release_info: 1970s"),
+    ("dramas released after 2010", "Genres: Drama | Release_info: after 2010"),
+    ("dramas made before 1980", "Genres: Drama | Release_info: before 1980"),
+    ("dramas between 1990 and 1999", "Genres: Drama | Release_info: between 1990 and 1999"),
+    ("dramas from 2004", "Genres: Drama | Release_info: 2004"),
+])
+def test_release_info(parser, query, expected):
+    assert parser.parse(query) == (expected, 1.0)
+
+@pytest.mark.parametrize("query, rating", [
+    ("best westerns", "high"),
+    ("top rated horror films", "high"),
+    ("award-winning documentaries", "high"),
+    ("worst horror movies", "low"),
+])
+def test_rating_words(parser, query, rating):
+    rewritten, confidence = parser.parse(query)
+    assert rewritten.endswith(f"Rating: {rating}")
+    assert confidence == 1.0
+
+def test_confidence_is_share_of_explained_words(parser):
+    rewritten, confidence = parser.parse("Christopher Nolan movies about dreams and heists")
+    assert rewritten == "Directors: Christopher Nolan"
+    assert confidence == pytest.approx(2 / 4)  # christopher, nolan explained; dreams, heists not
+
+@pytest.mark.parametrize("query", ["", "something like Inception", "movies similar to Heat", "a quiet story about grief"])
+def test_plot_like_queries_are_not_parsed(parser, query):
+    assert parser.parse(query) == ("", 0.0)
+
+def test_rewrite_bypasses_the_llm_only_when_confident(parser):
+    parser.n_queries = parser.n_bypassed = 0
+    assert parser.rewrite("best sci-fi by Christopher Nolan") == "Directors: Christopher Nolan | Genres: Science Fiction | Rating: high"
+    assert parser.rewrite("Christopher Nolan movies about dreams and heists") is None
+    assert parser.stats() == {"queries": 2, "bypassed": 1, "bypass_rate": 0.5}
@@ -0,0 +1,25 @@
+import os
+import json
+
+from src.dataset import query_encoder
+from src.dataset.query_encoder import EXPORT_INFO, export_dir, load_query_encoder
+
+
+def test_missing_runtime_falls_back_to_torch_with_a_warning(tmp_path, monkeypatch, capsys):
+    path = export_dir(str(tmp_path), "openvino")
+    os.makedirs(path)
+    with open(os.path.join(path, EXPORT_INFO), "w") as f:
+        json.dump({"parity": {"min_cosine": 0.999}}, f)
+
+    def missing_runtime(*args, **kwargs):
+        raise ModuleNotFoundError("No module named 'openvino'")
+    monkeypatch.setattr(query_encoder, "ExportedQueryEncoder", missing_runtime)
+
+    assert load_query_encoder(str(tmp_path), "openvino", min_cosine=0.98) is None
+    out = capsys.readouterr().out
+    assert "openvino runtime is not installed" in out
+    assert "pip install openvino" in out
+
+def test_missing_export_falls_back_to_torch(tmp_path, capsys):
+    assert load_query_encoder(str(tmp_path), "onnx", min_cosine=0.98) is None
+    assert "no exported onnx query encoder" in capsys.readouterr().out
@@ -0,0 +1,23 @@
+import types
+
+from src.main import RAG
+
+
+class FallbackIndex:
+    """Configured for onnx; loading the query model falls back to torch."""
+    embed_model_name = "Snowflake/snowflake-arctic-embed-m"
+
+    def __init__(self):
+        self.query_backend = "onnx"
+
+    @property
+    def query_model(self):
+        self.query_backend = "torch"
+        return object()
+
+
+def test_centroids_key_uses_the_effective_query_backend():
+    loaded = FallbackIndex()
+    loaded.query_backend = "torch"
+    key = RAG._centroids_key(types.SimpleNamespace(index=FallbackIndex()))
+    assert key == RAG._centroids_key(types.SimpleNamespace(index=loaded))